@@ -36,11 +36,63 @@ class Settings:
     itad_base_url: str = os.getenv("ITAD_BASE_URL", "https://api.isthereanydeal.com")
     itad_country: str = os.getenv("ITAD_COUNTRY", "US")
     itad_history_since: str = os.getenv("ITAD_HISTORY_SINCE", "2022-01-01T00:00:00Z")
+    # Cada juego hace un refresh completo (desde ITAD_HISTORY_SINCE) una vez cada
+    # N días, repartidos por hash del game_id. 0 = solo incremental.
+    sync_full_refresh_days: int = int(os.getenv("SYNC_FULL_REFRESH_DAYS", "30"))
+
+    # Precios actuales (prices/v3): TTL del cache en memoria y micro-batching
+    current_price_ttl_seconds: float = float(os.getenv("CURRENT_PRICE_TTL_SECONDS", "300"))
+    current_price_batch_window_ms: float = float(os.getenv("CURRENT_PRICE_BATCH_WINDOW_MS", "50"))
+    current_price_batch_max: int = int(os.getenv("CURRENT_PRICE_BATCH_MAX", "200"))
+
+    # Sweep de precios actuales: ids por POST a prices/v3 e intervalo del loop (0 = solo manual)
+    price_sweep_batch_size: int = int(os.getenv("PRICE_SWEEP_BATCH_SIZE", "200"))
+    price_sweep_interval_minutes: int = int(os.getenv("PRICE_SWEEP_INTERVAL_MINUTES", "0"))
+
+    # Catálogo SteamSpy (catalog_apps): páginas de `all`, antigüedad máxima y
+    # separación mínima entre requests a SteamSpy. `request=all` tiene un
+    # límite propio mucho más estricto (SteamSpy pide 1 por minuto)
+    catalog_max_pages: int = int(os.getenv("CATALOG_MAX_PAGES", "10"))
+    catalog_max_age_hours: int = int(os.getenv("CATALOG_MAX_AGE_HOURS", "24"))
+    steamspy_min_interval: float = float(os.getenv("STEAMSPY_MIN_INTERVAL", "1.0"))
+    steamspy_all_min_interval: float = float(os.getenv("STEAMSPY_ALL_MIN_INTERVAL", "60"))
+
+    # Scheduler de refresh por prioridad (demanda + volatilidad + antigüedad)
+    scheduler_enabled: bool = os.getenv("SCHEDULER_ENABLED", "0") == "1"
+    scheduler_budget_per_hour: int = int(os.getenv("SCHEDULER_BUDGET_PER_HOUR", "120"))
+    scheduler_tick_seconds: int = int(os.getenv("SCHEDULER_TICK_SECONDS", "60"))
+    refresh_min_hours: float = float(os.getenv("REFRESH_MIN_HOURS", "6"))
+    refresh_max_hours: float = float(os.getenv("REFRESH_MAX_HOURS", "168"))
 
     # ── DuckDB ──────────────────────────────────────────────────
     duckdb_path: str = os.getenv("DUCKDB_PATH", "./data/steamsense.duckdb")
     duckdb_memory_limit: str = os.getenv("DUCKDB_MEMORY_LIMIT", "512MB")
     duckdb_threads: int = int(os.getenv("DUCKDB_THREADS", "2"))
+    # Snapshots Parquet (src/tools/snapshot.py); con SNAPSHOT_RESTORE_ON_START una DB
+    # vacía se reconstruye desde el último snapshot al arrancar
+    snapshot_dir: str = os.getenv(
+        "SNAPSHOT_DIR", os.path.join(os.path.dirname(duckdb_path), "snapshots"))
+    snapshot_restore_on_start: bool = os.getenv("SNAPSHOT_RESTORE_ON_START", "0") == "1"
+
+    # ── Modelo ML ───────────────────────────────────────────────
+    # Versiones de artefactos + puntero CURRENT (src/ml/registry.py); se
+    # conservan las últimas MODEL_KEEP_VERSIONS para rollback
+    model_artifacts_dir: str = os.getenv(
+        "MODEL_ARTIFACTS_DIR", os.path.join(os.path.dirname(__file__), "src", "ml", "artifacts"))
+    model_keep_versions: int = int(os.getenv("MODEL_KEEP_VERSIONS", "5"))
+
+    # ── Cache HTTP en disco (junto al archivo DuckDB) ───────────
+    http_cache_enabled: bool = os.getenv("HTTP_CACHE_ENABLED", "1") == "1"
+    http_cache_path: str = os.getenv(
+        "HTTP_CACHE_PATH", os.path.join(os.path.dirname(duckdb_path), "http_cache.sqlite"))
+    http_cache_max_mb: int = int(os.getenv("HTTP_CACHE_MAX_MB", "64"))
+
+    # ── Circuit breakers (ITAD / Steam) ─────────────────────────
+    circuit_window_seconds: float = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60"))
+    circuit_min_calls: int = int(os.getenv("CIRCUIT_MIN_CALLS", "10"))
+    circuit_error_rate: float = float(os.getenv("CIRCUIT_ERROR_RATE", "0.5"))
+    circuit_slow_call_seconds: float = float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "5"))
+    circuit_open_seconds: float = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
 
     # ── API ─────────────────────────────────────────────────────
     api_host: str = os.getenv("API_HOST", "0.0.0.0")
@@ -53,6 +105,24 @@ class Settings:
     top_n_games: int = int(os.getenv("TOP_N_GAMES", "200"))
     request_batch_size: int = int(os.getenv("REQUEST_BATCH_SIZE", "10"))
     request_delay: float = float(os.getenv("REQUEST_DELAY", "0.5"))
+    # Lookups concurrentes a ITAD al reparar juegos huérfanos
+    repair_concurrency: int = int(os.getenv("REPAIR_CONCURRENCY", "8"))
+    # Edad máxima de una predicción aunque sus precios no cambien (features
+    # que dependen de la fecha: días desde la última oferta, temporada)
+    prediction_max_age_hours: int = int(os.getenv("PREDICTION_MAX_AGE_HOURS", "24"))
+    # Predicciones servidas desde memoria (LRU delante de predictions_cache; 0 = sin LRU)
+    prediction_lru_size: int = int(os.getenv("PREDICTION_LRU_SIZE", "10000"))
+    # Juegos de una wishlist sincronizados en paralelo (job "wishlist")
+    wishlist_sync_concurrency: int = int(os.getenv("WISHLIST_SYNC_CONCURRENCY", "4"))
+    # Pipeline de sync: concurrencia por etapa, tamaño de las colas entre etapas
+    # y filas por escritura batch en DuckDB
+    sync_lookup_concurrency: int = int(os.getenv("SYNC_LOOKUP_CONCURRENCY", "10"))
+    sync_history_concurrency: int = int(os.getenv("SYNC_HISTORY_CONCURRENCY", "4"))
+    sync_parse_concurrency: int = int(os.getenv("SYNC_PARSE_CONCURRENCY", "2"))
+    sync_queue_size: int = int(os.getenv("SYNC_QUEUE_SIZE", "50"))
+    sync_write_batch_rows: int = int(os.getenv("SYNC_WRITE_BATCH_ROWS", "5000"))
+    # Elementos por chunk al parsear en streaming respuestas grandes (history, librerías, SteamSpy)
+    stream_chunk_size: int = int(os.getenv("STREAM_CHUNK_SIZE", "500"))
 
     @property
     def cors_origins_list(self) -> list[str]:
@@ -1,6 +1,7 @@
 """
 main.py — SteamSense API entry point.
 """
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
@@ -11,7 +12,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from config import get_settings
 from src.db.connection import init_db, get_db, close_db
 from src.db.models import create_all_tables, create_user_tables
-from src.ml.model import get_model
+from src.api.http_cache import get_cache
+from src.api import circuit, singleflight
+from src.services import job_service, refresh_scheduler, sync_pipeline
+from src.services.current_price_service import get_current_price_service
+from src.services.predict_service import get_prediction_lru
+from src.ml.model import get_model, model_status
 
 logging.basicConfig(
     level=logging.INFO,
@@ -32,6 +38,9 @@ async def lifespan(app: FastAPI):
     con = get_db()      # abre la conexión del main thread
     create_all_tables(con)
     create_user_tables(con)
+    if settings.snapshot_restore_on_start:
+        from src.tools.snapshot import restore_if_empty
+        restore_if_empty(con, settings.snapshot_dir)
     logger.info("DuckDB listo")
 
     get_model()
@@ -42,9 +51,26 @@ async def lifespan(app: FastAPI):
     if not settings.steam_api_key:
         logger.warning("STEAM_API_KEY no configurada — login con Steam deshabilitado")
 
+    job_service.start_worker()
+
+    sweep_task = None
+    if settings.price_sweep_interval_minutes > 0 and settings.itad_api_key:
+        from src.services.sync_service import run_price_sweep_loop
+        sweep_task = asyncio.create_task(run_price_sweep_loop())
+        logger.info(f"Sweep de precios cada {settings.price_sweep_interval_minutes} min")
+
+    scheduler_task = None
+    if settings.scheduler_enabled and settings.itad_api_key:
+        scheduler_task = asyncio.create_task(refresh_scheduler.run_scheduler_loop())
+
     logger.info(f"SteamSense API lista — modo: {settings.env}")
     yield
 
+    for task in (sweep_task, scheduler_task):
+        if task:
+            task.cancel()
+    refresh_scheduler.flush_views()
+    await job_service.stop_worker()
     close_db()
     logger.info("SteamSense API detenida")
 
@@ -90,13 +116,19 @@ def health():
     except Exception:
         db_status = "error"
 
-    model = get_model()
-    model_status = "trained" if model._model is not None else "heuristic"
+    cache = get_cache()
 
     return {
         "status": "ok",
         "db": db_status,
-        "model": model_status,
+        "model": model_status(),
         "env": settings.env,
         "steam_auth": "enabled" if settings.steam_api_key else "disabled",
+        "http_cache": cache.stats() if cache else "disabled",
+        "single_flight": singleflight.all_stats(),
+        "circuits": circuit.all_status(),
+        "current_prices": get_current_price_service().stats(),
+        "predictions":    get_prediction_lru().stats(),
+        "sync_pipeline": sync_pipeline.pipeline_status(),
+        "scheduler": refresh_scheduler.stats() if settings.scheduler_enabled else "disabled",
     }
\ No newline at end of file
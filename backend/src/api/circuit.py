@@ -0,0 +1,180 @@
+"""
+src/api/circuit.py
+==================
+Circuit breaker por upstream (ITAD, Steam Web API, Steam OpenID).
+
+Cada breaker mantiene una ventana móvil de llamadas recientes con su
+resultado y latencia:
+  - closed    → todo pasa; si en la ventana hay suficientes llamadas y la tasa
+                de errores o de llamadas lentas supera el umbral, se abre
+  - open      → se falla al instante con CircuitOpenError (sin esperar timeouts)
+                durante CIRCUIT_OPEN_SECONDS
+  - half_open → se deja pasar UNA llamada de prueba; si sale bien se cierra,
+                si falla vuelve a abrirse
+
+Los callers deciden qué respuesta degradada dar (cache vencido, datos locales).
+El estado de todos los breakers se expone en /health.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED    = "closed"
+OPEN      = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """El upstream está marcado como caído — no se intentó la llamada."""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuito '{name}' abierto — upstream no disponible")
+        self.name = name
+
+
+class _Call:
+    """Handle de una llamada en curso; permite marcar fallo sin excepción (HTTP 5xx)."""
+
+    def __init__(self):
+        self.failed = False
+
+    def mark_failure(self):
+        self.failed = True
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, window_seconds: float, min_calls: int,
+                 error_rate: float, slow_call_seconds: float, open_seconds: float):
+        self.name = name
+        self._window = window_seconds
+        self._min_calls = min_calls
+        self._error_rate = error_rate
+        self._slow_call = slow_call_seconds
+        self._open_for = open_seconds
+        self._calls: deque = deque()   # (ts, ok, latency)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._rejected = 0
+        self._times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self._open_for:
+            return HALF_OPEN
+        return self._state
+
+    def retry_after(self) -> int:
+        """Segundos hasta que el circuito admita un probe (para el header Retry-After)."""
+        if self._state != OPEN:
+            return 0
+        return max(1, math.ceil(self._open_for - (time.monotonic() - self._opened_at)))
+
+    def allow(self) -> bool:
+        """True si se puede intentar la llamada ahora."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probe_in_flight:
+            self._state = HALF_OPEN
+            self._probe_in_flight = True
+            logger.info(f"Circuito '{self.name}' half-open — enviando probe")
+            return True
+        self._rejected += 1
+        return False
+
+    def record(self, ok: bool, latency: float):
+        now = time.monotonic()
+        if self._state == HALF_OPEN:
+            self._probe_in_flight = False
+            if ok and latency < self._slow_call:
+                self._state = CLOSED
+                self._calls.clear()
+                logger.info(f"Circuito '{self.name}' cerrado — upstream recuperado")
+            else:
+                self._trip(now)
+            return
+
+        self._calls.append((now, ok, latency))
+        while self._calls and now - self._calls[0][0] > self._window:
+            self._calls.popleft()
+        if self._state != CLOSED or len(self._calls) < self._min_calls:
+            return
+        n = len(self._calls)
+        errors = sum(1 for _, good, _ in self._calls if not good)
+        slow   = sum(1 for _, _, lat in self._calls if lat >= self._slow_call)
+        if errors / n >= self._error_rate or slow / n >= self._error_rate:
+            self._trip(now)
+
+    def _trip(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self._times_opened += 1
+        self._calls.clear()
+        logger.warning(f"Circuito '{self.name}' ABIERTO por {self._open_for:.0f}s")
+
+    @asynccontextmanager
+    async def guard(self):
+        """
+        Envuelve una llamada al upstream. Lanza CircuitOpenError sin intentar
+        si el circuito está abierto; registra éxito/fallo y latencia.
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        call = _Call()
+        start = time.monotonic()
+        try:
+            yield call
+        except asyncio.CancelledError:
+            self._probe_in_flight = False   # el caller se fue: no cuenta como fallo
+            raise
+        except Exception:
+            self.record(False, time.monotonic() - start)
+            raise
+        self.record(not call.failed, time.monotonic() - start)
+
+    def status(self) -> dict:
+        n = len(self._calls)
+        return {
+            "state":         self.state,
+            "window_calls":  n,
+            "error_rate":    round(sum(1 for _, ok, _ in self._calls if not ok) / n, 3) if n else 0.0,
+            "slow_rate":     round(sum(1 for *_, lat in self._calls if lat >= self._slow_call) / n, 3) if n else 0.0,
+            "rejected":      self._rejected,
+            "times_opened":  self._times_opened,
+        }
+
+
+# ── Registro ──────────────────────────────────────────────────────────────────
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Breaker compartido por upstream ("itad", "steam", "steam_openid")."""
+    breaker: Optional[CircuitBreaker] = _breakers.get(name)
+    if breaker is None:
+        s = get_settings()
+        breaker = CircuitBreaker(
+            name,
+            window_seconds=s.circuit_window_seconds,
+            min_calls=s.circuit_min_calls,
+            error_rate=s.circuit_error_rate,
+            slow_call_seconds=s.circuit_slow_call_seconds,
+            open_seconds=s.circuit_open_seconds,
+        )
+        _breakers[name] = breaker
+    return breaker
+
+
+def all_status() -> dict:
+    return {name: b.status() for name, b in _breakers.items()}
@@ -9,28 +9,24 @@ Una sola instancia se crea en el lifespan de FastAPI y se reutiliza.
 
 import asyncio
 import logging
-from typing import Optional
+from typing import AsyncIterator, Iterable, Optional
 
 import httpx
+import pandas as pd
 
 from config import get_settings
-from src.api.schemas import ITADLookupResponse, ITADGame, PriceRecord, ITADSearchResult
+from src.api.circuit import CircuitOpenError, get_breaker
+from src.api.history_parser import (  # noqa: F401 — STEAM_* re-exportados
+    STEAM_SHOP_ID, STEAM_SHOP_NAME, empty_history, extract_entries, parse_history,
+)
+from src.api.http_cache import ENDPOINT_TTLS, cached_fetch, make_key
+from src.api.json_stream import iter_json_items
+from src.api.singleflight import get_group
+from src.api.schemas import ITADLookupResponse, ITADGame, ITADSearchResult
 
 logger = logging.getLogger(__name__)
 
-# ── Steam shop ID en ITAD ─────────────────────────────────────────────────────
-# ITAD identifica Steam con shop_id=61 y shop_name="Steam"
-STEAM_SHOP_ID   = 61
-STEAM_SHOP_NAME = "steam"
-
-
-def _is_steam_shop(shop: dict) -> bool:
-    """Retorna True si el shop es Steam."""
-    if not isinstance(shop, dict):
-        return True  # si no hay info de tienda, asumir Steam (comportamiento legacy)
-    shop_id   = shop.get("id")
-    shop_name = (shop.get("name") or "").lower()
-    return shop_id == STEAM_SHOP_ID or "steam" in shop_name
+_flights = get_group("itad")
 
 
 class ITADClient:
@@ -61,12 +57,46 @@ class ITADClient:
         """Agrega la API key a todos los requests."""
         return {"key": self._key, **extra}
 
+    def _http(self) -> httpx.AsyncClient:
+        """
+        Cliente HTTP activo. Si el context manager ya cerró (p.ej. una
+        revalidación del cache en background) usa uno compartido del módulo.
+        """
+        if self._client is not None and not self._client.is_closed:
+            return self._client
+        return _background_http()
+
     async def _get(self, path: str, params: dict, retries: int = 3) -> Optional[dict]:
-        """GET con retry exponencial."""
+        """
+        GET con retry exponencial. Requests idénticos concurrentes comparten
+        una sola llamada (single-flight) y los endpoints lentos de cambiar
+        pasan por el cache en disco. La llamada compartida corre sobre el
+        cliente HTTP del módulo, no sobre el de quien la inició: si ese
+        `async with ITADClient` cierra, los demás que esperan no se enteran.
+        """
+        flight_key = (path, tuple(sorted((k, str(v)) for k, v in params.items())))
+        return await _flights.do(flight_key, lambda: self._get_cached(path, params, retries))
+
+    async def _get_cached(self, path: str, params: dict, retries: int) -> Optional[dict]:
+        endpoint = f"itad:{path}"
+        if endpoint in ENDPOINT_TTLS:
+            key = make_key(endpoint, f"{self._base}{path}", params)
+            return await cached_fetch(endpoint, key, lambda: self._fetch(path, params, retries))
+        return await self._fetch(path, params, retries)
+
+    async def _fetch(self, path: str, params: dict, retries: int = 3) -> Optional[dict]:
+        """
+        Llamada real a ITAD detrás del circuit breaker "itad": con el circuito
+        abierto lanza CircuitOpenError al instante en vez de esperar timeouts.
+        """
         url = f"{self._base}{path}"
+        breaker = get_breaker("itad")
         for attempt in range(retries):
             try:
-                r = await self._client.get(url, params=self._params(params))
+                async with breaker.guard() as call:
+                    r = await _background_http().get(url, params=self._params(params))
+                    if r.status_code >= 500:
+                        call.mark_failure()
                 if r.status_code == 200:
                     return r.json()
                 if r.status_code == 429:
@@ -76,6 +106,8 @@ class ITADClient:
                     continue
                 logger.debug(f"HTTP {r.status_code} en {path}")
                 return None
+            except CircuitOpenError:
+                raise
             except httpx.TimeoutException:
                 logger.warning(f"Timeout en {path} (intento {attempt + 1})")
                 await asyncio.sleep(1)
@@ -84,6 +116,66 @@ class ITADClient:
                 return None
         return None
 
+    async def _stream(
+        self,
+        path: str,
+        params: dict,
+        json_path: Iterable[str] = (),
+        chunk_size: Optional[int] = None,
+        retries: int = 3,
+    ) -> AsyncIterator[list]:
+        """
+        GET en modo streaming: entrega los elementos de `json_path` en chunks
+        sin cargar el body completo. Reintenta timeouts solo antes de recibir
+        datos; como _get, otro error HTTP (conexión, protocolo) sin nada
+        entregado termina vacío. Un error a mitad de body ya entregado se propaga.
+        """
+        url = f"{self._base}{path}"
+        chunk_size = chunk_size or get_settings().stream_chunk_size
+        breaker = get_breaker("itad")
+        for attempt in range(retries):
+            try:
+                # El breaker mide hasta recibir los headers; el body se consume fuera
+                async with breaker.guard() as call:
+                    http = self._http()
+                    request = http.build_request("GET", url, params=self._params(params))
+                    r = await http.send(request, stream=True)
+                    if r.status_code >= 500:
+                        call.mark_failure()
+            except httpx.TimeoutException:
+                logger.warning(f"Timeout en {path} (intento {attempt + 1})")
+                await asyncio.sleep(1)
+                continue
+            except httpx.HTTPError as e:
+                logger.error(f"Error en {path}: {e}")
+                return
+            yielded = False
+            try:
+                if r.status_code == 429:
+                    wait = 2 ** attempt
+                    logger.warning(f"Rate limit hit, esperando {wait}s...")
+                    await asyncio.sleep(wait)
+                    continue
+                if r.status_code != 200:
+                    logger.debug(f"HTTP {r.status_code} en {path}")
+                    return
+                async for chunk in iter_json_items(r, json_path, chunk_size):
+                    yielded = True
+                    yield chunk
+                return
+            except httpx.TimeoutException:
+                if yielded:
+                    raise
+                logger.warning(f"Timeout leyendo {path} (intento {attempt + 1})")
+                await asyncio.sleep(1)
+            except httpx.HTTPError as e:
+                if yielded:
+                    raise
+                logger.error(f"Error leyendo {path}: {e}")
+                return
+            finally:
+                await r.aclose()
+
     # ── Endpoints públicos ────────────────────────────────────────────────────
 
     async def lookup_game(self, appid: int) -> Optional[tuple[str, str, str]]:
@@ -108,10 +200,14 @@ class ITADClient:
         game_id: str,
         appid: Optional[int] = None,
         since: Optional[str] = None,
-    ) -> list[PriceRecord]:
+    ) -> pd.DataFrame:
         """
         Obtiene historial de precios de un juego — SOLO precios de Steam.
         Filtra entradas de otras tiendas (GMG, Fanatical, Humble, etc.).
+        Retorna un DataFrame columnar con el esquema de price_history.
+
+        `since` permite pedir solo lo nuevo desde el high-water mark del juego;
+        sin él se descarga todo desde ITAD_HISTORY_SINCE.
         """
         params = {
             "id": game_id,
@@ -119,74 +215,65 @@ class ITADClient:
             "since": since or get_settings().itad_history_since,
         }
         data = await self._get("/games/history/v2", params)
+        # En modo incremental (since explícito) una respuesta vacía es lo normal
+        log_empty = logger.debug if since else logger.warning
         if not data:
-            logger.warning(f"history/v2 vacío para game_id={game_id}")
-            return []
-
-        # Normalizar estructura de respuesta
-        if isinstance(data, dict):
-            entries = data.get("list") or data.get("prices") or data.get("history") or []
-            if not entries:
-                for v in data.values():
-                    if isinstance(v, list) and v:
-                        entries = v
-                        break
-        elif isinstance(data, list):
-            entries = data
-        else:
-            entries = []
+            log_empty(f"history/v2 vacío para game_id={game_id}")
+            return empty_history()
 
+        entries = extract_entries(data)
         if not entries:
-            logger.warning(f"history/v2 sin entradas para {game_id}. Estructura: {str(data)[:300]}")
-            return []
+            log_empty(f"history/v2 sin entradas para {game_id}. Estructura: {str(data)[:300]}")
+            return empty_history()
 
         logger.info(f"history/v2 → {len(entries)} entradas para {game_id} (filtrando solo Steam)")
+        return parse_history(entries, game_id, appid)
 
-        records = []
-        skipped_other_stores = 0
-
-        for entry in entries:
-            try:
-                if not isinstance(entry, dict):
-                    continue
-
-                deal        = entry.get("deal") or {}
-                price_obj   = deal.get("price") or entry.get("price") or {}
-                regular_obj = deal.get("regular") or entry.get("regular") or {}
-                shop        = deal.get("shop") or entry.get("shop") or {}
-                ts          = entry.get("timestamp")
-
-                if not ts:
-                    continue
-
-                # ── FILTRO: solo Steam ────────────────────────────────────────
-                if shop and not _is_steam_shop(shop):
-                    skipped_other_stores += 1
-                    continue
-
-                price_amount   = price_obj.get("amount", 0) if isinstance(price_obj, dict) else float(price_obj or 0)
-                regular_amount = regular_obj.get("amount", 0) if isinstance(regular_obj, dict) else float(regular_obj or 0)
-                cut            = deal.get("cut") if "cut" in deal else entry.get("cut", 0)
-                shop_id        = shop.get("id") if isinstance(shop, dict) else STEAM_SHOP_ID
-                shop_name      = shop.get("name", "Steam") if isinstance(shop, dict) else "Steam"
-
-                records.append(PriceRecord(
-                    game_id=game_id,
-                    appid=appid,
-                    timestamp=ts,
-                    price_usd=float(price_amount or 0),
-                    regular_usd=float(regular_amount or 0),
-                    cut_pct=int(cut or 0),
-                    shop_id=shop_id,
-                    shop_name=shop_name,
-                ))
-            except Exception as e:
-                logger.debug(f"Entry skip: {e} — {str(entry)[:100]}")
-                continue
-
-        logger.info(f"Parseados {len(records)} registros Steam "
-                    f"({skipped_other_stores} otras tiendas descartadas) para {game_id}")
-        return records
+    async def iter_history_entries(
+        self,
+        game_id: str,
+        since: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+    ) -> AsyncIterator[list]:
+        """
+        Entradas crudas de history/v2 en chunks, sin parsear (todas las tiendas).
+        El pipeline de sync parsea en un stage aparte.
+        """
+        params = {
+            "id": game_id,
+            "country": get_settings().itad_country,
+            "since": since or get_settings().itad_history_since,
+        }
+        async for items in self._stream("/games/history/v2", params, (), chunk_size):
+            # Raíz objeto ({"list": [...]}) → los items son pares (key, value)
+            if items and isinstance(items[0], tuple):
+                items = [e for pair in items for e in extract_entries(dict([pair]))]
+            if items:
+                yield items
+
+    async def iter_price_history(
+        self,
+        game_id: str,
+        appid: Optional[int] = None,
+        since: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+    ) -> AsyncIterator[pd.DataFrame]:
+        """
+        Versión streaming de get_price_history: parsea history/v2 de forma
+        incremental y entrega DataFrames de hasta `chunk_size` entradas.
+        La memoria pico queda acotada al chunk, no al tamaño de la respuesta.
+        """
+        total = 0
+        async for items in self.iter_history_entries(game_id, since, chunk_size):
+            df = parse_history(items, game_id, appid)
+            total += len(items)
+            if not df.empty:
+                yield df
+        if total:
+            logger.info(f"history/v2 (stream) → {total} entradas para {game_id}")
+        else:
+            (logger.debug if since else logger.warning)(
+                f"history/v2 sin entradas para game_id={game_id}")
 
     async def search_games(self, query: str, limit: int = 20) -> list[ITADSearchResult]:
         """Busca juegos por nombre en ITAD."""
@@ -201,16 +288,74 @@ class ITADClient:
                 continue
         return results
 
-    async def get_current_prices(self, game_ids: list[str]) -> dict:
-        """Obtiene precios actuales de múltiples juegos (batch)."""
+    async def _post(self, path: str, params: dict, body, retries: int = 3) -> Optional[list | dict]:
+        """POST JSON con retry, detrás del circuit breaker "itad" (igual que _fetch)."""
+        url = f"{self._base}{path}"
+        breaker = get_breaker("itad")
+        for attempt in range(retries):
+            try:
+                async with breaker.guard() as call:
+                    r = await self._http().post(url, params=self._params(params), json=body)
+                    if r.status_code >= 500:
+                        call.mark_failure()
+                if r.status_code == 200:
+                    return r.json()
+                if r.status_code == 429:
+                    wait = 2 ** attempt
+                    logger.warning(f"Rate limit hit, esperando {wait}s...")
+                    await asyncio.sleep(wait)
+                    continue
+                logger.warning(f"HTTP {r.status_code} en POST {path}: {r.text[:200]}")
+                return None
+            except CircuitOpenError:
+                raise
+            except httpx.TimeoutException:
+                logger.warning(f"Timeout en POST {path} (intento {attempt + 1})")
+                await asyncio.sleep(1)
+            except Exception as e:
+                logger.error(f"Error en POST {path}: {e}")
+                return None
+        return None
+
+    async def get_current_prices(self, game_ids: list[str]) -> dict[str, list[dict]]:
+        """
+        Precios actuales de todas las tiendas para varios juegos en UNA llamada
+        a prices/v3 (acepta la lista de ids en el body).
+        Retorna {game_id: [deal, ...]} ordenado por precio; los ids sin datos
+        quedan con lista vacía. None del upstream → dict vacío.
+        """
         if not game_ids:
             return {}
-        params = {
-            "id": ",".join(game_ids),
-            "country": get_settings().itad_country,
-        }
-        data = await self._get("/games/prices/v3", params)
-        return data or {}
+        data = await self._post("/games/prices/v3",
+                                {"country": get_settings().itad_country}, list(game_ids))
+        if data is None:
+            return {}
+        out: dict[str, list[dict]] = {gid: [] for gid in game_ids}
+        items = data if isinstance(data, list) else data.get("list", [])
+        for item in items:
+            gid = item.get("id")
+            if gid is not None:
+                out[gid] = parse_deals(item)
+        return out
+
+    async def lookup_steam_appids(self, game_ids: list[str]) -> dict[str, int]:
+        """
+        ITAD game_id → Steam appid en bulk (POST /lookup/shop/61/id/v1, hasta
+        200 ids por request). Los juegos sin app en Steam no aparecen.
+        """
+        out: dict[str, int] = {}
+        for i in range(0, len(game_ids), 200):
+            chunk = game_ids[i:i + 200]
+            data = await self._post(f"/lookup/shop/{STEAM_SHOP_ID}/id/v1", {}, chunk)
+            if not isinstance(data, dict):
+                continue
+            for game_id, shop_ids in data.items():
+                for sid in shop_ids or []:
+                    kind, _, num = str(sid).partition("/")
+                    if kind == "app" and num.isdigit():
+                        out[game_id] = int(num)
+                        break
+        return out
 
     async def get_game_info(self, game_id: str) -> Optional[tuple[str, str, str]]:
         """Obtiene título y slug de un juego por su ITAD game_id."""
@@ -229,8 +374,46 @@ class ITADClient:
             return None
 
 
+def parse_deals(item: dict) -> list[dict]:
+    """Deals de un item de prices/v3 → filas planas, ordenadas por precio."""
+    prices = []
+    for deal in item.get("deals", []):
+        shop        = deal.get("shop", {})
+        price_obj   = deal.get("price", {})
+        regular_obj = deal.get("regular", {})
+        prices.append({
+            "shop_name":   shop.get("name", "Unknown"),
+            "shop_id":     shop.get("id"),
+            "price_usd":   price_obj.get("amount", 0),
+            "regular_usd": regular_obj.get("amount", 0),
+            "cut_pct":     deal.get("cut", 0),
+            "url":         deal.get("url", ""),
+            "drm":         deal.get("drm", []),
+            "timestamp":   deal.get("timestamp"),
+        })
+    prices.sort(key=lambda x: x["price_usd"])
+    return prices
+
+
 # ── Factory ───────────────────────────────────────────────────────────────────
 
+_background_client: Optional[httpx.AsyncClient] = None
+
+
+def _background_http() -> httpx.AsyncClient:
+    """
+    Cliente compartido del módulo: GETs coalescidos (single-flight) y requests
+    fuera de un `async with ITADClient`.
+    """
+    global _background_client
+    if _background_client is None or _background_client.is_closed:
+        _background_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _background_client
+
+
 _client_instance: Optional[ITADClient] = None
 
 
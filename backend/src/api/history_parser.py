@@ -0,0 +1,112 @@
+"""
+src/api/history_parser.py
+=========================
+Parser columnar de las respuestas de ITAD history/v2.
+
+Convierte el JSON crudo directamente en un DataFrame con las columnas de
+price_history — sin un PriceRecord por entrada ni model_dump() intermedio.
+El filtro de Steam, el parseo de timestamps y la extracción de montos se
+hacen por columna (pandas/numpy), no entrada por entrada.
+"""
+
+import logging
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# ── Steam shop ID en ITAD ─────────────────────────────────────────────────────
+# ITAD identifica Steam con shop_id=61 y shop_name="Steam"
+STEAM_SHOP_ID   = 61
+STEAM_SHOP_NAME = "steam"
+
+# Mismo orden que las columnas de price_history (sin id)
+PRICE_COLUMNS = ["game_id", "appid", "timestamp", "price_usd",
+                 "regular_usd", "cut_pct", "shop_id", "shop_name"]
+
+
+def empty_history() -> pd.DataFrame:
+    """DataFrame vacío con el esquema de price_history."""
+    return pd.DataFrame({c: pd.Series(dtype=object) for c in PRICE_COLUMNS})
+
+
+def extract_entries(data) -> list:
+    """Normaliza las distintas formas de respuesta de history/v2 a una lista de entradas."""
+    if isinstance(data, list):
+        return data
+    if not isinstance(data, dict):
+        return []
+    entries = data.get("list") or data.get("prices") or data.get("history") or []
+    if not entries:
+        for v in data.values():
+            if isinstance(v, list) and v:
+                return v
+    return entries
+
+
+def _amount(obj) -> object:
+    """Monto de un objeto precio de ITAD ({"amount": ..} o número suelto)."""
+    if isinstance(obj, dict):
+        return obj.get("amount", 0) or 0
+    return obj or 0
+
+
+def parse_history(entries: list, game_id: str, appid: Optional[int] = None) -> pd.DataFrame:
+    """
+    Convierte entradas de history/v2 en un DataFrame listo para upsert_price_records.
+    Descarta entradas de otras tiendas (GMG, Fanatical, Humble, etc.),
+    sin timestamp o con montos inválidos.
+    """
+    entries = [e for e in entries if isinstance(e, dict)]
+    if not entries:
+        return empty_history()
+
+    # ── Columnas crudas (una pasada por campo, sin objetos intermedios) ──────
+    deals  = [e.get("deal") or {} for e in entries]
+    shops  = [d.get("shop") or e.get("shop") or {} for d, e in zip(deals, entries)]
+    ts_raw = [e.get("timestamp") for e in entries]
+    price  = [_amount(d.get("price") or e.get("price")) for d, e in zip(deals, entries)]
+    reg    = [_amount(d.get("regular") or e.get("regular")) for d, e in zip(deals, entries)]
+    cut    = [d.get("cut") if "cut" in d else e.get("cut", 0) for d, e in zip(deals, entries)]
+
+    is_dict   = np.fromiter((isinstance(s, dict) for s in shops), dtype=bool, count=len(shops))
+    has_shop  = np.fromiter((bool(s) for s in shops), dtype=bool, count=len(shops))
+    shop_id   = pd.array([s.get("id") if isinstance(s, dict) else STEAM_SHOP_ID for s in shops],
+                         dtype="Int64")
+    shop_name = pd.Series([s.get("name", "Steam") if isinstance(s, dict) else "Steam"
+                           for s in shops], dtype=object)
+
+    # ── FILTRO: solo Steam ────────────────────────────────────────────────────
+    # Sin info de tienda (o tienda no-dict) se asume Steam (comportamiento legacy)
+    name_is_steam = shop_name.fillna("").astype(str).str.lower().str.contains(STEAM_SHOP_NAME,
+                                                                                  regex=False)
+    id_is_steam   = (shop_id == STEAM_SHOP_ID).fillna(False).to_numpy(dtype=bool)
+    is_steam      = ~has_shop | ~is_dict | id_is_steam | name_is_steam.to_numpy()
+
+    # ── Conversión por columna ───────────────────────────────────────────────
+    timestamp   = pd.to_datetime(pd.Series(ts_raw, dtype=object), utc=True,
+                                 errors="coerce", format="ISO8601").dt.tz_convert(None)
+    price_usd   = pd.to_numeric(pd.Series(price, dtype=object), errors="coerce")
+    regular_usd = pd.to_numeric(pd.Series(reg, dtype=object), errors="coerce")
+    cut_pct     = pd.to_numeric(pd.Series(cut, dtype=object), errors="coerce").fillna(0)
+
+    valid = (is_steam & timestamp.notna().to_numpy()
+             & price_usd.notna().to_numpy() & regular_usd.notna().to_numpy())
+
+    df = pd.DataFrame({
+        "game_id":     game_id,
+        "appid":       pd.array([appid] * len(entries), dtype="Int64"),
+        "timestamp":   timestamp,
+        "price_usd":   price_usd.astype(float),
+        "regular_usd": regular_usd.astype(float),
+        "cut_pct":     cut_pct.astype(int),
+        "shop_id":     shop_id,
+        "shop_name":   shop_name,
+    })[valid].reset_index(drop=True)
+
+    skipped_other_stores = int((~is_steam).sum())
+    logger.info(f"Parseados {len(df)} registros Steam "
+                f"({skipped_other_stores} otras tiendas descartadas) para {game_id}")
+    return df
@@ -0,0 +1,234 @@
+"""
+src/api/http_cache.py
+=====================
+Cache persistente en disco (SQLite) para respuestas de APIs externas que
+cambian poco: ITAD lookup/info/search, Steam GetPlayerSummaries y las listas
+de SteamSpy.
+
+  - Claves content-addressed: sha256 de (endpoint, url, params sin API key)
+  - TTL por endpoint + ventana stale-while-revalidate: una entrada vencida
+    pero dentro de la ventana se sirve al instante y se refresca en background
+  - Límite de tamaño con evicción LRU (por last_access)
+  - Métricas hit/stale/miss por endpoint (expuestas en /health)
+  - Con el circuit breaker del upstream abierto se sirven incluso entradas
+    vencidas, en vez de fallar
+
+Vive junto al archivo DuckDB, así sobrevive a reinicios del contenedor.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+import orjson
+
+from config import get_settings
+from src.api.circuit import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# endpoint → (ttl_segundos, ventana_stale_segundos)
+HOUR = 3600
+DAY  = 24 * HOUR
+ENDPOINT_TTLS: dict[str, tuple[int, int]] = {
+    "itad:/games/lookup/v1":    (7 * DAY,  30 * DAY),
+    "itad:/games/info/v2":      (1 * DAY,  7 * DAY),
+    "itad:/games/search/v1":    (1 * HOUR, 1 * DAY),
+    "steam:GetPlayerSummaries": (1 * HOUR, 1 * DAY),
+    "steamspy:top100forever":   (12 * HOUR, 7 * DAY),
+    "steamspy:top100in2weeks":  (12 * HOUR, 7 * DAY),
+    "steamspy:top100owned":     (12 * HOUR, 7 * DAY),
+    "steamspy:all":             (1 * DAY,  7 * DAY),
+}
+
+# Parámetros que nunca forman parte de la clave (credenciales)
+_SECRET_PARAMS = {"key"}
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    fresh: bool
+
+
+def make_key(endpoint: str, url: str, params: Optional[dict] = None) -> str:
+    """Clave determinística del request, sin credenciales."""
+    clean = sorted((k, str(v)) for k, v in (params or {}).items() if k not in _SECRET_PARAMS)
+    raw = orjson.dumps([endpoint, url, clean])
+    return hashlib.sha256(raw).hexdigest()
+
+
+class ResponseCache:
+    """Cache key/value sobre SQLite, thread-safe, con LRU por tamaño total."""
+
+    def __init__(self, path: str, max_bytes: int):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._con = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key         TEXT PRIMARY KEY,
+                endpoint    TEXT NOT NULL,
+                body        BLOB NOT NULL,
+                size        INTEGER NOT NULL,
+                stored_at   REAL NOT NULL,
+                expires_at  REAL NOT NULL,
+                stale_until REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._con.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries (last_access)")
+        self._metrics: dict[str, dict[str, int]] = defaultdict(
+            lambda: {"hits": 0, "stale": 0, "misses": 0, "stores": 0})
+        self._evictions = 0
+
+    def get(self, endpoint: str, key: str, include_expired: bool = False) -> Optional[CacheEntry]:
+        """
+        Entrada fresca o dentro de la ventana stale. Con include_expired=True
+        también retorna entradas vencidas (fallback con el upstream caído).
+        """
+        now = time.time()
+        with self._lock:
+            row = self._con.execute(
+                "SELECT body, expires_at, stale_until FROM entries WHERE key = ?", [key]
+            ).fetchone()
+            if not row or (row[2] < now and not include_expired):
+                self._metrics[endpoint]["misses"] += 1
+                return None
+            self._con.execute("UPDATE entries SET last_access = ? WHERE key = ?", [now, key])
+            fresh = row[1] >= now
+            self._metrics[endpoint]["hits" if fresh else "stale"] += 1
+        return CacheEntry(value=orjson.loads(zlib.decompress(row[0])), fresh=fresh)
+
+    def set(self, endpoint: str, key: str, value: Any):
+        ttl, swr = ENDPOINT_TTLS.get(endpoint, (HOUR, 0))
+        body = zlib.compress(orjson.dumps(value))
+        now = time.time()
+        with self._lock:
+            self._con.execute("""
+                INSERT OR REPLACE INTO entries
+                    (key, endpoint, body, size, stored_at, expires_at, stale_until, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, [key, endpoint, body, len(body), now, now + ttl, now + ttl + swr, now])
+            self._metrics[endpoint]["stores"] += 1
+            self._evict()
+
+    def _evict(self):
+        """Borra las entradas menos usadas hasta quedar bajo el límite (llamar con lock)."""
+        total = self._con.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self._max_bytes:
+            return
+        # Vencidas primero, luego LRU
+        self._con.execute("DELETE FROM entries WHERE stale_until < ?", [time.time()])
+        rows = self._con.execute("SELECT key, size FROM entries ORDER BY last_access ASC").fetchall()
+        total = sum(size for _, size in rows)
+        victims = []
+        for key, size in rows:
+            if total <= self._max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        if victims:
+            self._con.executemany("DELETE FROM entries WHERE key = ?", victims)
+            self._evictions += len(victims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._con.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            endpoints = {k: dict(v) for k, v in self._metrics.items()}
+        hits   = sum(m["hits"] + m["stale"] for m in endpoints.values())
+        misses = sum(m["misses"] for m in endpoints.values())
+        return {
+            "entries":   entries,
+            "bytes":     size,
+            "max_bytes": self._max_bytes,
+            "evictions": self._evictions,
+            "hit_rate":  round(hits / (hits + misses), 3) if hits + misses else None,
+            "endpoints": endpoints,
+        }
+
+
+# ── Stale-while-revalidate ────────────────────────────────────────────────────
+
+_revalidating: set[str] = set()
+
+
+async def cached_fetch(
+    endpoint: str,
+    key: str,
+    fetch: Callable[[], Awaitable[Any]],
+) -> Any:
+    """
+    Sirve `endpoint` desde cache si hay entrada fresca o stale; en caso
+    contrario llama a `fetch()` y guarda el resultado (None no se cachea).
+    Una entrada stale dispara un refresh en background — `fetch` no debe
+    depender de recursos que el caller cierre al terminar.
+    """
+    cache = get_cache()
+    if cache is None:
+        return await fetch()
+
+    entry = cache.get(endpoint, key)
+    if entry is not None:
+        if not entry.fresh and key not in _revalidating:
+            _revalidating.add(key)
+            asyncio.create_task(_revalidate(cache, endpoint, key, fetch))
+        return entry.value
+
+    try:
+        value = await fetch()
+    except CircuitOpenError:
+        # Upstream caído: mejor una respuesta vieja que ninguna
+        entry = cache.get(endpoint, key, include_expired=True)
+        if entry is None:
+            raise
+        logger.info(f"Circuito abierto — sirviendo {endpoint} vencido desde cache")
+        return entry.value
+    if value is not None:
+        cache.set(endpoint, key, value)
+    return value
+
+
+async def _revalidate(cache: ResponseCache, endpoint: str, key: str,
+                      fetch: Callable[[], Awaitable[Any]]):
+    try:
+        value = await fetch()
+        if value is not None:
+            cache.set(endpoint, key, value)
+    except Exception as e:
+        logger.debug(f"Revalidación fallida para {endpoint}: {e}")
+    finally:
+        _revalidating.discard(key)
+
+
+# ── Singleton ─────────────────────────────────────────────────────────────────
+
+_cache_instance: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """Retorna el cache compartido, o None si está deshabilitado (HTTP_CACHE_ENABLED=0)."""
+    global _cache_instance
+    settings = get_settings()
+    if not settings.http_cache_enabled:
+        return None
+    if _cache_instance is None:
+        with _cache_lock:
+            if _cache_instance is None:
+                _cache_instance = ResponseCache(settings.http_cache_path,
+                                                settings.http_cache_max_mb * 1024 * 1024)
+                logger.info(f"HTTP cache en: {settings.http_cache_path}")
+    return _cache_instance
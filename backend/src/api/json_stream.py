@@ -0,0 +1,166 @@
+"""
+src/api/json_stream.py
+======================
+Parseo incremental de respuestas JSON grandes (sin dependencias externas).
+
+En lugar de cargar todo el body con r.json(), se consume r.aiter_bytes() y se
+emiten los elementos de UN contenedor (array u objeto) a medida que se
+completan. Solo se mantiene en memoria el elemento en curso + el chunk
+pendiente, así que el pico de memoria no depende del tamaño de la respuesta.
+
+Ejemplos de `path`:
+  ()                     → elementos del valor raíz (history/v2, SteamSpy all)
+  ("response", "games")  → response.games de GetOwnedGames
+
+Si el contenedor es un array se emiten sus elementos; si es un objeto se
+emiten tuplas (key, value).
+"""
+
+import codecs
+import json
+import re
+from typing import AsyncIterator, Iterable
+
+import httpx
+
+# Caracteres con significado estructural — todo lo demás se salta en bloque
+_TOKEN_RE  = re.compile(r'[\[\]{}",:]')
+_STRING_RE = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_WS        = " \t\r\n"
+_DELIMS    = _WS + ",]}"
+_DECODER   = json.JSONDecoder()
+
+
+class JsonItemScanner:
+    """
+    Scanner incremental: recibe texto con feed() y retorna los elementos
+    completos del contenedor en `path`, ya parseados.
+
+    Hasta llegar al contenedor se recorren solo los tokens estructurales;
+    dentro de él cada elemento se decodifica con el decoder C de `json`.
+    """
+
+    def __init__(self, path: Iterable[str] = ()):
+        self._path = list(path)
+        self._buf = ""
+        self._pos = 0                # siguiente índice a procesar en _buf
+        self._stack: list[str] = []  # contenedores abiertos ('{' o '[')
+        self._keys: list = []        # key actual de cada objeto abierto
+        self._last_string = None
+        self._target_kind = None     # '{' o '[' una vez encontrado el contenedor
+        self.done = False
+
+    @property
+    def target_kind(self):
+        return self._target_kind
+
+    def feed(self, text: str) -> list:
+        if self.done:
+            return []
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        if self._target_kind is None:
+            self._descend()
+        if self._target_kind is None:
+            return []
+        return self._collect()
+
+    def _descend(self):
+        """Avanza por los tokens estructurales hasta abrir el contenedor `path`."""
+        buf, pos = self._buf, self._pos
+        while True:
+            m = _TOKEN_RE.search(buf, pos)
+            if not m:
+                pos = len(buf)
+                break
+            ch, i = m.group(), m.start()
+            if ch == '"':
+                s = _STRING_RE.match(buf, i)
+                if not s:
+                    pos = i     # string incompleto: esperar más datos
+                    break
+                self._last_string = s.group()
+                pos = s.end()
+                continue
+            pos = i + 1
+            if ch == ":":
+                if self._stack and self._last_string is not None:
+                    self._keys[-1] = _DECODER.decode(self._last_string)
+            elif ch == ",":
+                if self._stack:
+                    self._keys[-1] = None
+            elif ch in "[{":
+                self._stack.append(ch)
+                self._keys.append(None)
+                if self._keys[:-1] == self._path:
+                    self._target_kind = ch
+                    break
+            else:
+                if self._stack:
+                    self._stack.pop()
+                    self._keys.pop()
+                if not self._stack:
+                    self.done = True    # raíz cerrada sin encontrar `path`
+                    break
+        self._pos = pos
+
+    def _collect(self) -> list:
+        """Decodifica los elementos completos del contenedor objetivo."""
+        buf, pos, n = self._buf, self._pos, len(self._buf)
+        items = []
+        while True:
+            while pos < n and (buf[pos] in _WS or buf[pos] == ","):
+                pos += 1
+            if pos >= n:
+                break
+            if buf[pos] in "]}":
+                self.done = True
+                break
+            try:
+                if self._target_kind == "{":
+                    key, p = _DECODER.raw_decode(buf, pos)
+                    while p < n and buf[p] in _WS:
+                        p += 1
+                    if p >= n or buf[p] != ":":
+                        raise ValueError("member incompleto")
+                    p += 1
+                    while p < n and buf[p] in _WS:
+                        p += 1
+                    value, end = _DECODER.raw_decode(buf, p)
+                    item = (key, value)
+                else:
+                    item, end = _DECODER.raw_decode(buf, pos)
+            except ValueError:
+                break           # elemento incompleto: esperar más datos
+            if end >= n or buf[end] not in _DELIMS:
+                # Un número cortado entre chunks ("12." / "1e") decodifica solo
+                # su prefijo: se emite recién cuando le sigue un delimitador
+                break
+            items.append(item)
+            pos = end
+        self._pos = pos
+        return items
+
+
+async def iter_json_items(
+    response: httpx.Response,
+    path: Iterable[str] = (),
+    chunk_size: int = 500,
+) -> AsyncIterator[list]:
+    """
+    Itera un response httpx abierto en modo stream y entrega los elementos
+    del contenedor `path` en listas de hasta `chunk_size`.
+    """
+    scanner = JsonItemScanner(path)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    batch: list = []
+    async for raw in response.aiter_bytes():
+        for item in scanner.feed(decoder.decode(raw)):
+            batch.append(item)
+            if len(batch) >= chunk_size:
+                yield batch
+                batch = []
+        if scanner.done:
+            break
+    if batch:
+        yield batch
@@ -0,0 +1,64 @@
+"""
+src/api/singleflight.py
+=======================
+Coalescing de llamadas concurrentes idénticas ("single-flight").
+
+Si varios callers piden lo mismo al mismo tiempo (mismo endpoint + params,
+o el mismo juego a sincronizar), solo el primero ejecuta el trabajo y el
+resto espera ese mismo resultado. El trabajo corre como task propio: si un
+caller se cancela (cliente HTTP cerrado) los demás no se ven afectados.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._calls = 0
+        self._shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Ejecuta fn() una sola vez por key mientras haya una llamada en vuelo."""
+        self._calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        else:
+            self._shared += 1
+            logger.debug(f"single-flight[{self.name}] compartiendo {key}")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "calls":     self._calls,
+            "coalesced": self._shared,
+            "in_flight": len(self._inflight),
+        }
+
+
+# ── Registro ──────────────────────────────────────────────────────────────────
+
+_groups: dict[str, SingleFlight] = {}
+
+
+def get_group(name: str) -> SingleFlight:
+    """Grupo compartido por nombre (p.ej. "itad", "sync")."""
+    if name not in _groups:
+        _groups[name] = SingleFlight(name)
+    return _groups[name]
+
+
+def all_stats() -> dict:
+    return {name: g.stats() for name, g in _groups.items()}
@@ -14,6 +14,7 @@ from typing import Optional
 
 import httpx
 from config import get_settings
+from src.api.circuit import get_breaker
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -35,10 +36,17 @@ def get_openid_redirect_url(return_url: str) -> str:
 
 
 async def verify_openid_response(params: dict) -> Optional[str]:
+    """
+    Verifica la respuesta OpenID contra Steam. Pasa por el circuit breaker
+    "steam_openid": con Steam caído lanza CircuitOpenError al instante.
+    """
     check_params = {k: v for k, v in params.items()}
     check_params["openid.mode"] = "check_authentication"
     async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.post(STEAM_OPENID, data=check_params)
+        async with get_breaker("steam_openid").guard() as call:
+            r = await client.post(STEAM_OPENID, data=check_params)
+            if r.status_code >= 500:
+                call.mark_failure()
         if "is_valid:true" not in r.text:
             logger.warning("Steam OpenID verification failed")
             return None
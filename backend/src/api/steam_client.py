@@ -5,9 +5,13 @@ Cliente para Steam Web API.
 """
 import logging
 import os
-from typing import Optional
+from typing import AsyncIterator, Optional
 import httpx
 
+from src.api.circuit import CircuitOpenError, get_breaker
+from src.api.http_cache import cached_fetch, make_key
+from src.api.json_stream import iter_json_items
+
 logger = logging.getLogger(__name__)
 
 STEAM_API   = "https://api.steampowered.com"
@@ -26,6 +30,20 @@ def _get_key() -> str:
     return key
 
 
+async def _guarded_send(client: httpx.AsyncClient, request: httpx.Request,
+                        stream: bool = False) -> httpx.Response:
+    """
+    Envía un request detrás del circuit breaker "steam": 5xx, timeouts y
+    errores de red cuentan como fallo; con el circuito abierto lanza
+    CircuitOpenError sin tocar la red.
+    """
+    async with get_breaker("steam").guard() as call:
+        r = await client.send(request, stream=stream)
+        if r.status_code >= 500:
+            call.mark_failure()
+    return r
+
+
 class SteamClient:
     def __init__(self):
         pass  # key se lee en cada llamada para que .env reloads funcionen
@@ -36,28 +54,41 @@ class SteamClient:
         except ValueError as e:
             logger.error(str(e))
             return None
-        async with httpx.AsyncClient(timeout=15) as client:
-            r = await client.get(
-                f"{STEAM_API}/ISteamUser/GetPlayerSummaries/v2/",
-                params={"key": key, "steamids": steam_id}
-            )
-            if r.status_code != 200:
-                logger.warning(f"Steam GetPlayerSummaries HTTP {r.status_code}")
-                return None
-            players = r.json().get("response", {}).get("players", [])
-            p = players[0] if players else None
-            if p:
-                logger.info(f"Perfil Steam obtenido: {p.get('personaname')} ({steam_id})")
-            return p
+        url = f"{STEAM_API}/ISteamUser/GetPlayerSummaries/v2/"
+        params = {"key": key, "steamids": steam_id}
 
-    async def get_owned_games(self, steam_id: str) -> list[dict]:
+        async def fetch() -> Optional[dict]:
+            async with httpx.AsyncClient(timeout=15) as client:
+                r = await _guarded_send(client, client.build_request("GET", url, params=params))
+                if r.status_code != 200:
+                    logger.warning(f"Steam GetPlayerSummaries HTTP {r.status_code}")
+                    return None
+                players = r.json().get("response", {}).get("players", [])
+                return players[0] if players else None
+
+        endpoint = "steam:GetPlayerSummaries"
+        p = await cached_fetch(endpoint, make_key(endpoint, url, params), fetch)
+        if p:
+            logger.info(f"Perfil Steam obtenido: {p.get('personaname')} ({steam_id})")
+        return p
+
+    async def iter_owned_games(self, steam_id: str,
+                               chunk_size: Optional[int] = None) -> AsyncIterator[list[dict]]:
+        """
+        Librería del usuario en chunks, parseando GetOwnedGames en streaming.
+        Librerías enormes no se cargan completas en memoria.
+        """
+        from config import get_settings
         try:
             key = _get_key()
         except ValueError as e:
             logger.error(str(e))
-            return []
+            return
+        chunk_size = chunk_size or get_settings().stream_chunk_size
+        total = 0
         async with httpx.AsyncClient(timeout=30) as client:
-            r = await client.get(
+            request = client.build_request(
+                "GET",
                 f"{STEAM_API}/IPlayerService/GetOwnedGames/v1/",
                 params={
                     "key": key,
@@ -66,18 +97,31 @@ class SteamClient:
                     "include_played_free_games": 1,
                 }
             )
-            if r.status_code != 200:
-                logger.error(f"GetOwnedGames HTTP {r.status_code}: {r.text[:200]}")
-                return []
-            data = r.json().get("response", {})
-            games = data.get("games", [])
-            logger.info(f"Steam librería: {len(games)} juegos para {steam_id}")
-            return [{
-                "appid":         g.get("appid"),
-                "title":         g.get("name", f"App {g.get('appid')}"),
-                "playtime_mins": g.get("playtime_forever", 0),
-                "last_played":   g.get("rtime_last_played"),
-            } for g in games if g.get("appid")]
+            r = await _guarded_send(client, request, stream=True)
+            try:
+                if r.status_code != 200:
+                    body = await r.aread()
+                    logger.error(f"GetOwnedGames HTTP {r.status_code}: {body[:200]!r}")
+                    return
+                async for games in iter_json_items(r, ("response", "games"), chunk_size):
+                    chunk = [{
+                        "appid":         g.get("appid"),
+                        "title":         g.get("name", f"App {g.get('appid')}"),
+                        "playtime_mins": g.get("playtime_forever", 0),
+                        "last_played":   g.get("rtime_last_played"),
+                    } for g in games if isinstance(g, dict) and g.get("appid")]
+                    total += len(chunk)
+                    if chunk:
+                        yield chunk
+            finally:
+                await r.aclose()
+        logger.info(f"Steam librería: {total} juegos para {steam_id}")
+
+    async def get_owned_games(self, steam_id: str) -> list[dict]:
+        games: list[dict] = []
+        async for chunk in self.iter_owned_games(steam_id):
+            games.extend(chunk)
+        return games
 
     async def get_recently_played(self, steam_id: str, count: int = 10) -> list[dict]:
         try:
@@ -86,10 +130,11 @@ class SteamClient:
             logger.error(str(e))
             return []
         async with httpx.AsyncClient(timeout=15) as client:
-            r = await client.get(
+            r = await _guarded_send(client, client.build_request(
+                "GET",
                 f"{STEAM_API}/IPlayerService/GetRecentlyPlayedGames/v1/",
                 params={"key": key, "steamid": steam_id, "count": count}
-            )
+            ))
             if r.status_code != 200:
                 return []
             return r.json().get("response", {}).get("games", [])
@@ -101,13 +146,19 @@ class SteamClient:
         - status "private" only when HTTP 403 (Steam blocks access for private profiles)
         - status "error" when network/parse issues — do NOT assume private
         - status "ok" when we got valid JSON (items may be empty)
+        - status "error" also when Steam's circuit breaker is open (fast-fail)
         """
         async with httpx.AsyncClient(timeout=20, follow_redirects=True) as client:
-            r = await client.get(
-                f"https://store.steampowered.com/wishlist/profiles/{steam_id}/wishlistdata/",
-                params={"p": 0},
-                headers={"Accept": "application/json"},
-            )
+            try:
+                r = await _guarded_send(client, client.build_request(
+                    "GET",
+                    f"https://store.steampowered.com/wishlist/profiles/{steam_id}/wishlistdata/",
+                    params={"p": 0},
+                    headers={"Accept": "application/json"},
+                ))
+            except CircuitOpenError:
+                logger.warning(f"Wishlist: circuito Steam abierto, no se consultó {steam_id}")
+                return {"items": [], "status": "error"}
             if r.status_code == 403:
                 logger.warning(f"Wishlist HTTP 403 para {steam_id} — perfil privado")
                 return {"items": [], "status": "private"}
@@ -58,11 +58,127 @@ def create_all_tables(con: duckdb.DuckDBPyConnection):
             signal      VARCHAR,
             reason      VARCHAR,
             features    JSON,
-            computed_at TIMESTAMP DEFAULT now()
+            computed_at TIMESTAMP DEFAULT now(),
+            data_version BIGINT DEFAULT 0,
+            price_context JSON,
+            model_version VARCHAR
         )
     """)
+    # DBs creadas antes de versionar el cache / de guardar el contexto de precio
+    # y el modelo (filas sin price_context o de otro modelo se recalculan)
+    con.execute("ALTER TABLE predictions_cache ADD COLUMN IF NOT EXISTS data_version BIGINT DEFAULT 0")
+    con.execute("ALTER TABLE predictions_cache ADD COLUMN IF NOT EXISTS price_context JSON")
+    con.execute("ALTER TABLE predictions_cache ADD COLUMN IF NOT EXISTS model_version VARCHAR")
 
-    logger.info("Tablas DuckDB verificadas/creadas: games, price_history, predictions_cache")
+    # ── game_data_versions ────────────────────────────────────────────────────
+    # Versión de los datos de precio de cada juego: sube cada vez que el ingest
+    # inserta filas nuevas. Una predicción es válida mientras su data_version
+    # coincida; los juegos con versión más nueva forman el dirty set.
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS game_data_versions (
+            game_id      VARCHAR PRIMARY KEY,
+            data_version BIGINT DEFAULT 0,
+            changed_at   TIMESTAMP
+        )
+    """)
+    # DBs con historial previo al versionado: todos sus juegos parten sucios
+    if con.execute("SELECT COUNT(*) FROM game_data_versions").fetchone()[0] == 0:
+        con.execute("""
+            INSERT INTO game_data_versions (game_id, data_version, changed_at)
+            SELECT game_id, 1, MAX(timestamp) FROM price_history GROUP BY game_id
+        """)
+
+    # ── game_features ─────────────────────────────────────────────────────────
+    # Feature store: agregados Steam por juego (los de queries.get_feature_anchors)
+    # que solo cambian cuando entran precios nuevos. Lo mantiene el ingest junto
+    # con bump_data_versions; data_version = versión de los datos con que se
+    # calculó. Lo dependiente de la fecha (mes, días desde X) se deriva al leer.
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS game_features (
+            game_id        VARCHAR PRIMARY KEY,
+            total          BIGINT,
+            on_sale        BIGINT,
+            last_price     DOUBLE,
+            last_cut       INTEGER,
+            min_price      DOUBLE,
+            max_price      DOUBLE,
+            avg_price      DOUBLE,
+            max_cut        INTEGER,
+            avg_cut_q4     DOUBLE,
+            avg_cut_summer DOUBLE,
+            last_sale_ts   TIMESTAMP,
+            min_price_ts   TIMESTAMP,
+            trend_slope    DOUBLE,
+            n_pos          BIGINT,
+            data_version   BIGINT DEFAULT 0,
+            updated_at     TIMESTAMP
+        )
+    """)
+    # DBs con historial previo al feature store (o recién restauradas sin él)
+    if con.execute("SELECT COUNT(*) FROM game_features").fetchone()[0] == 0:
+        from src.db.queries import refresh_game_features
+        refresh_game_features(con)
+
+    # ── catalog_apps ──────────────────────────────────────────────────────────
+    # Catálogo de SteamSpy persistido: lo llena el job de refresh y lo leen
+    # /sync/top y /sync/bulk. rank = orden de prioridad del último refresh
+    # (listas curadas primero, luego páginas de `all`); NULL si ya no apareció.
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_apps (
+            appid           INTEGER PRIMARY KEY,
+            name            VARCHAR,
+            owners_estimate BIGINT,
+            ccu             INTEGER,
+            source          VARCHAR,
+            rank            INTEGER,
+            fetched_at      TIMESTAMP DEFAULT now()
+        )
+    """)
+
+    # ── sync_jobs ─────────────────────────────────────────────────────────────
+    # Cola durable de jobs de sync/entrenamiento. checkpoint guarda el cursor
+    # por ítem para retomar tras un reinicio; run_* mide el throughput del
+    # intento actual (no cuenta el tiempo caído entre intentos).
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS sync_jobs (
+            id               VARCHAR PRIMARY KEY,
+            kind             VARCHAR NOT NULL,
+            params           JSON,
+            dedupe_key       VARCHAR NOT NULL,
+            status           VARCHAR NOT NULL DEFAULT 'queued',
+            total            INTEGER,
+            done             INTEGER DEFAULT 0,
+            errors           INTEGER DEFAULT 0,
+            checkpoint       JSON,
+            result           JSON,
+            error            VARCHAR,
+            cancel_requested BOOLEAN DEFAULT FALSE,
+            attempts         INTEGER DEFAULT 0,
+            created_at       TIMESTAMP DEFAULT now(),
+            started_at       TIMESTAMP,
+            run_started_at   TIMESTAMP,
+            run_start_done   INTEGER DEFAULT 0,
+            updated_at       TIMESTAMP,
+            finished_at      TIMESTAMP
+        )
+    """)
+    con.execute("CREATE INDEX IF NOT EXISTS idx_sync_jobs_status ON sync_jobs (status)")
+
+    # ── game_refresh_state ────────────────────────────────────────────────────
+    # Estado del scheduler de refresh: último sync y vistas (con decaimiento
+    # exponencial, se actualiza al hacer flush de los contadores en memoria).
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS game_refresh_state (
+            game_id        VARCHAR PRIMARY KEY,
+            views          DOUBLE DEFAULT 0,
+            last_view_at   TIMESTAMP,
+            last_synced_at TIMESTAMP,
+            last_status    VARCHAR
+        )
+    """)
+
+    logger.info("Tablas DuckDB verificadas/creadas: games, price_history, predictions_cache, "
+                "game_data_versions, game_features, catalog_apps, sync_jobs, game_refresh_state")
 
 
 def create_user_tables(con):
@@ -66,6 +66,15 @@ def get_game(con, game_id: str) -> Optional[dict]:
     return _san(row.iloc[0].to_dict()) if not row.empty else None
 
 
+def get_games_by_ids(con, game_ids: list[str]) -> dict[str, dict]:
+    if not game_ids:
+        return {}
+    rows = con.execute("""
+        SELECT * FROM games WHERE id IN (SELECT UNNEST(?::VARCHAR[]))
+    """, [list(game_ids)]).fetchdf()
+    return {r["id"]: _san(r) for r in rows.to_dict(orient="records")}
+
+
 def get_game_by_appid(con, appid: int) -> Optional[dict]:
     row = con.execute("SELECT * FROM games WHERE appid=?", [appid]).fetchdf()
     return _san(row.iloc[0].to_dict()) if not row.empty else None
@@ -92,15 +101,156 @@ def list_games(con, limit: int = 50, offset: int = 0) -> list[dict]:
     return [_san(r) for r in rows.to_dict(orient="records")]
 
 
-# ── price_history ─────────────────────────────────────────────────────────────
+def list_tracked_games(con) -> list[tuple[str, Optional[int]]]:
+    """(game_id, appid) de todos los juegos con appid — el catálogo que se mantiene fresco."""
+    return con.execute("""
+        SELECT id, appid FROM games
+        WHERE appid IS NOT NULL
+        ORDER BY id
+    """).fetchall()
+
+
+def get_orphaned_games(con, limit: Optional[int] = None) -> list[dict]:
+    """
+    Juegos sin título real o sin appid, con el appid candidato ya resuelto
+    desde price_history cuando games no lo tiene (una sola query).
+    """
+    rows = con.execute("""
+        SELECT g.id, g.title,
+               COALESCE(g.appid, ph.appid) AS appid,
+               g.title = g.id              AS needs_title,
+               g.appid IS NULL             AS needs_appid
+        FROM games g
+        LEFT JOIN (
+            SELECT game_id, ANY_VALUE(appid) AS appid
+            FROM price_history
+            WHERE appid IS NOT NULL
+            GROUP BY game_id
+        ) ph ON ph.game_id = g.id
+        WHERE g.title = g.id OR g.appid IS NULL
+        ORDER BY g.id
+        LIMIT ?
+    """, [limit]).fetchall()   # LIMIT NULL = sin límite
+    return [{"id": r[0], "title": r[1], "appid": r[2], "needs_title": r[3], "needs_appid": r[4]}
+            for r in rows]
+
+
+def apply_game_repairs(con, fixes: list[dict]) -> int:
+    """
+    Aplica títulos/slugs/appids resueltos en un solo UPDATE desde una relación
+    temporal. Un appid existente nunca se pisa.
+    """
+    import pandas as pd
+
+    if not fixes:
+        return 0
+    df = pd.DataFrame(fixes, columns=["id", "title", "slug", "appid"])
+    df["appid"] = df["appid"].astype("Int64")
+    try:
+        con.register("_repairs", df)
+        con.execute("""
+            UPDATE games SET
+                title = COALESCE(r.title, games.title),
+                slug  = COALESCE(r.slug, games.slug),
+                appid = COALESCE(games.appid, r.appid)
+            FROM _repairs r
+            WHERE games.id = r.id
+        """)
+    finally:
+        con.unregister("_repairs")
+    return len(df)
+
+
+def search_games_local(con, query: str, limit: int = 20) -> list[dict]:
+    """Búsqueda por título en la DB local (fallback cuando ITAD no responde)."""
+    rows = con.execute("""
+        SELECT id, slug, title, appid
+        FROM games
+        WHERE title ILIKE '%' || ? || '%'
+          AND title != id
+        ORDER BY LENGTH(title), title
+        LIMIT ?
+    """, [query, limit]).fetchdf()
+    return [_san(r) for r in rows.to_dict(orient="records")]
+
+
+# ── catalog_apps ──────────────────────────────────────────────────────────────
 
-def upsert_price_records(con, records: list[dict]) -> int:
-    if not records:
+def upsert_catalog_apps(con, apps: list[dict], fetched_at: dt.datetime,
+                        prune: bool = True) -> int:
+    """
+    Inserta/actualiza apps del catálogo de SteamSpy en un solo statement.
+    Con prune=True (refresh completo) las apps que no aparecieron pierden su rank.
+    """
+    import pandas as pd
+
+    if not apps:
         return 0
+    df = pd.DataFrame(apps, columns=["appid", "name", "owners_estimate", "ccu", "source", "rank"])
+    df["fetched_at"] = fetched_at
+    try:
+        con.register("_catalog_batch", df)
+        con.execute("""
+            INSERT INTO catalog_apps
+                (appid, name, owners_estimate, ccu, source, rank, fetched_at)
+            SELECT appid, name, owners_estimate, ccu, source, rank, fetched_at
+            FROM _catalog_batch
+            ON CONFLICT (appid) DO UPDATE SET
+                name            = excluded.name,
+                owners_estimate = excluded.owners_estimate,
+                ccu             = excluded.ccu,
+                source          = excluded.source,
+                rank            = excluded.rank,
+                fetched_at      = excluded.fetched_at
+        """)
+        if prune:
+            con.execute("UPDATE catalog_apps SET rank = NULL WHERE fetched_at < ?", [fetched_at])
+    finally:
+        con.unregister("_catalog_batch")
+    return len(df)
+
 
+def get_catalog_appids(con, limit: int, source: Optional[str] = None) -> list[int]:
+    """Appids del catálogo en orden de prioridad, opcionalmente de una sola lista."""
+    if source:
+        rows = con.execute("""
+            SELECT appid FROM catalog_apps
+            WHERE source = ? AND rank IS NOT NULL
+            ORDER BY rank LIMIT ?
+        """, [source, limit]).fetchall()
+    else:
+        rows = con.execute("""
+            SELECT appid FROM catalog_apps
+            WHERE rank IS NOT NULL
+            ORDER BY rank LIMIT ?
+        """, [limit]).fetchall()
+    return [r[0] for r in rows]
+
+
+def get_catalog_status(con) -> dict:
+    row = con.execute("""
+        SELECT COUNT(*) FILTER (WHERE rank IS NOT NULL), COUNT(*), MAX(fetched_at)
+        FROM catalog_apps
+    """).fetchone()
+    return {"ranked": row[0], "total": row[1], "fetched_at": row[2]}
+
+
+# ── price_history ─────────────────────────────────────────────────────────────
+
+def upsert_price_records(con, records, refresh_features: bool = True) -> int:
+    """
+    Inserta registros de precio ignorando duplicados.
+    Acepta el DataFrame columnar de history_parser (camino normal del sync)
+    o una lista de dicts.
+    Con refresh_features=False no recalcula game_features: el caller que
+    escribe un juego en varios chunks lo hace una vez al final.
+    """
     import pandas as pd
 
-    df = pd.DataFrame(records)
+    if records is None or len(records) == 0:
+        return 0
+
+    df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
     df = df.drop(columns=["id"], errors="ignore")
 
     if "shop_id" in df.columns:
@@ -114,27 +264,28 @@ def upsert_price_records(con, records: list[dict]) -> int:
     if df.empty:
         return 0
 
-    before = con.execute("SELECT COUNT(*) FROM price_history").fetchone()[0]
-
+    # RETURNING trae solo las filas realmente insertadas (no los duplicados)
+    new_ids: list[str] = []
     try:
         con.register("_price_batch", df)
         cols = ", ".join(df.columns)
-        con.execute(f"""
+        new_ids = [r[0] for r in con.execute(f"""
             INSERT INTO price_history ({cols})
             SELECT {cols} FROM _price_batch
             ON CONFLICT (game_id, timestamp, shop_id) DO NOTHING
-        """)
+            RETURNING game_id
+        """).fetchall()]
     except Exception as e:
         logger.error(f"upsert_price_records batch error: {e}")
         cols = ", ".join(df.columns)
         placeholders = ", ".join(["?"] * len(df.columns))
         for _, row in df.iterrows():
             try:
-                con.execute(
+                new_ids += [r[0] for r in con.execute(
                     f"INSERT INTO price_history ({cols}) VALUES ({placeholders})"
-                    " ON CONFLICT (game_id, timestamp, shop_id) DO NOTHING",
+                    " ON CONFLICT (game_id, timestamp, shop_id) DO NOTHING RETURNING game_id",
                     list(row)
-                )
+                ).fetchall()]
             except Exception:
                 pass
     finally:
@@ -143,10 +294,136 @@ def upsert_price_records(con, records: list[dict]) -> int:
         except Exception:
             pass
 
-    after = con.execute("SELECT COUNT(*) FROM price_history").fetchone()[0]
-    inserted = after - before
-    logger.debug(f"upsert_price_records: {inserted}/{len(df)} insertados")
-    return inserted
+    bump_data_versions(con, set(new_ids))
+    if refresh_features:
+        refresh_game_features(con, set(new_ids))
+    logger.debug(f"upsert_price_records: {len(new_ids)}/{len(df)} insertados")
+    return len(new_ids)
+
+
+def bump_data_versions(con, game_ids) -> None:
+    """Sube la data_version de los juegos que recibieron filas nuevas."""
+    if not game_ids:
+        return
+    con.execute("""
+        INSERT INTO game_data_versions (game_id, data_version, changed_at)
+        SELECT UNNEST(?::VARCHAR[]), 1, ?
+        ON CONFLICT (game_id) DO UPDATE SET
+            data_version = game_data_versions.data_version + 1,
+            changed_at   = excluded.changed_at
+    """, [list(game_ids), _now()])
+
+
+def import_staged_prices(con, staging: str) -> dict:
+    """
+    Vuelca una tabla staging ya normalizada (columnas de price_history más
+    title/slug opcionales) a games y price_history con SQL set-based:
+    un INSERT por tabla, sin pasar filas por Python. Lo usa src.tools.import.
+    """
+    con.execute(f"""
+        INSERT INTO games (id, slug, title, appid)
+        SELECT game_id,
+               COALESCE(ANY_VALUE(slug), game_id),
+               COALESCE(ANY_VALUE(title), game_id),
+               MAX(appid)
+        FROM {staging}
+        GROUP BY game_id
+        ON CONFLICT (id) DO UPDATE SET
+            slug  = CASE WHEN excluded.slug  <> excluded.id THEN excluded.slug  ELSE games.slug  END,
+            title = CASE WHEN excluded.title <> excluded.id THEN excluded.title ELSE games.title END,
+            appid = COALESCE(games.appid, excluded.appid)
+    """)
+    games = con.execute(f"SELECT COUNT(DISTINCT game_id) FROM {staging}").fetchone()[0]
+
+    # Filas nuevas: sin duplicados dentro del dump ni contra lo que ya hay
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE _import_new AS
+        SELECT s.game_id, s.appid, s.timestamp, s.price_usd,
+               s.regular_usd, s.cut_pct, s.shop_id, s.shop_name
+        FROM {staging} s
+        ANTI JOIN price_history ph
+          ON ph.game_id = s.game_id AND ph.timestamp = s.timestamp AND ph.shop_id = s.shop_id
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY s.game_id, s.timestamp, s.shop_id) = 1
+    """)
+    try:
+        con.execute("""
+            INSERT INTO price_history
+                (game_id, appid, timestamp, price_usd, regular_usd, cut_pct, shop_id, shop_name)
+            SELECT * FROM _import_new
+            ON CONFLICT (game_id, timestamp, shop_id) DO NOTHING
+        """)
+        inserted = con.execute("SELECT COUNT(*) FROM _import_new").fetchone()[0]
+        con.execute("""
+            INSERT INTO game_data_versions (game_id, data_version, changed_at)
+            SELECT DISTINCT game_id, 1, ? FROM _import_new
+            ON CONFLICT (game_id) DO UPDATE SET
+                data_version = game_data_versions.data_version + 1,
+                changed_at   = excluded.changed_at
+        """, [_now()])
+        refresh_game_features(con, [r[0] for r in con.execute(
+            "SELECT DISTINCT game_id FROM _import_new").fetchall()])
+    finally:
+        con.execute("DROP TABLE IF EXISTS _import_new")
+    return {"games": games, "inserted": inserted}
+
+
+def get_latest_timestamps(con, game_ids: list[str]) -> dict[str, dt.datetime]:
+    """
+    High-water mark por juego: MAX(timestamp) en price_history.
+    Una sola query para todo el batch — los juegos sin historial no aparecen.
+    """
+    if not game_ids:
+        return {}
+    rows = con.execute("""
+        SELECT game_id, MAX(timestamp) AS last_ts
+        FROM price_history
+        WHERE game_id IN (SELECT UNNEST(?::VARCHAR[]))
+        GROUP BY game_id
+    """, [list(game_ids)]).fetchall()
+    return {game_id: ts for game_id, ts in rows if ts is not None}
+
+
+def get_latest_timestamps_by_appid(con, appids: list[int]) -> dict[str, dt.datetime]:
+    """
+    High-water marks (por game_id) de los juegos de un batch de appids, antes
+    de resolver sus game_id en ITAD: por price_history.appid o games.appid.
+    Una sola query por batch — los juegos sin historial no aparecen.
+    """
+    if not appids:
+        return {}
+    rows = con.execute("""
+        SELECT game_id, MAX(timestamp) AS last_ts
+        FROM price_history
+        WHERE appid IN (SELECT UNNEST(?::INTEGER[]))
+           OR game_id IN (SELECT id FROM games WHERE appid IN (SELECT UNNEST(?::INTEGER[])))
+        GROUP BY game_id
+    """, [list(appids), list(appids)]).fetchall()
+    return {game_id: ts for game_id, ts in rows if ts is not None}
+
+
+def get_latest_steam_prices(con, game_ids: list[str]) -> dict[str, dict]:
+    """
+    Último precio de Steam por juego (price_usd, regular_usd, cut_pct, timestamp),
+    en una sola query para todo el batch.
+    """
+    if not game_ids:
+        return {}
+    rows = con.execute("""
+        SELECT game_id, price_usd, regular_usd, cut_pct, timestamp
+        FROM price_history
+        WHERE game_id IN (SELECT UNNEST(?::VARCHAR[]))
+          AND (shop_id = 61 OR LOWER(shop_name) LIKE '%steam%')
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY game_id ORDER BY timestamp DESC) = 1
+    """, [list(game_ids)]).fetchall()
+    return {
+        game_id: {
+            "price_usd":   float(price) if price is not None else None,
+            "regular_usd": float(regular) if regular is not None else None,
+            "cut_pct":     cut,
+            "timestamp":   ts,
+        }
+        for game_id, price, regular, cut, ts in rows
+    }
 
 
 def get_price_history(con, game_id: str,
@@ -246,32 +523,562 @@ def get_seasonal_patterns(con, game_id: str) -> list[dict]:
     return [_san(r) for r in rows.to_dict(orient="records")]
 
 
+def _feature_anchors_sql(game_ids: Optional[list[str]], min_records: int) -> tuple[str, list]:
+    """
+    Agregados por juego desde price_history (Steam): último precio, stats,
+    timestamp del mínimo, última rebaja y pendiente de precios (regr_slope).
+    Mismas definiciones que get_price_stats + get_price_history + build_features.
+    """
+    where = "AND game_id IN (SELECT UNNEST(?::VARCHAR[]))" if game_ids is not None else ""
+    params = [list(game_ids)] if game_ids is not None else []
+    return f"""
+        WITH h AS (
+            SELECT game_id, timestamp, CAST(price_usd AS DOUBLE) AS price, cut_pct,
+                   ROW_NUMBER() OVER (PARTITION BY game_id ORDER BY timestamp, id) AS rn
+            FROM price_history
+            WHERE (shop_id = 61 OR LOWER(shop_name) LIKE '%steam%') {where}
+        ),
+        agg AS (
+            SELECT game_id,
+                   COUNT(*)                                   AS total,
+                   COUNT(*) FILTER (WHERE cut_pct > 0)        AS on_sale,
+                   ARG_MAX(price, rn)                         AS last_price,
+                   ARG_MAX(cut_pct, rn)                       AS last_cut,
+                   MIN(price)                                 AS min_price,
+                   MAX(price)                                 AS max_price,
+                   AVG(price)                                 AS avg_price,
+                   MAX(cut_pct)                               AS max_cut,
+                   AVG(cut_pct) FILTER (WHERE MONTH(timestamp) IN (10,11,12) AND cut_pct > 0) AS avg_cut_q4,
+                   AVG(cut_pct) FILTER (WHERE MONTH(timestamp) IN (6,7,8)    AND cut_pct > 0) AS avg_cut_summer,
+                   MAX(timestamp) FILTER (WHERE cut_pct > 0)  AS last_sale_ts
+            FROM h
+            GROUP BY game_id
+            HAVING COUNT(*) >= ?
+        ),
+        min_ts AS (
+            SELECT h.game_id, MAX(h.timestamp) AS min_price_ts
+            FROM h JOIN agg ON agg.game_id = h.game_id AND h.price = agg.min_price
+            GROUP BY h.game_id
+        ),
+        trend AS (
+            SELECT game_id, REGR_SLOPE(price, x) AS trend_slope, COUNT(*) AS n_pos
+            FROM (
+                SELECT game_id, price, ROW_NUMBER() OVER (PARTITION BY game_id ORDER BY rn) AS x
+                FROM h WHERE price > 0
+            )
+            GROUP BY game_id
+        )
+        SELECT agg.*, min_ts.min_price_ts,
+               COALESCE(trend.trend_slope, 0) AS trend_slope,
+               COALESCE(trend.n_pos, 0)       AS n_pos
+        FROM agg
+        LEFT JOIN min_ts USING (game_id)
+        LEFT JOIN trend  USING (game_id)
+    """, params + [min_records]
+
+
+# Columnas de game_features que vienen de _feature_anchors_sql
+FEATURE_ANCHOR_COLUMNS = [
+    "total", "on_sale", "last_price", "last_cut", "min_price", "max_price", "avg_price",
+    "max_cut", "avg_cut_q4", "avg_cut_summer", "last_sale_ts", "min_price_ts",
+    "trend_slope", "n_pos",
+]
+
+
+def compute_feature_anchors(con, game_ids: Optional[list[str]] = None, min_records: int = 3):
+    """Agregados calculados desde el historial crudo (referencia / verificación del store)."""
+    sql, params = _feature_anchors_sql(game_ids, min_records)
+    return con.execute(sql, params).fetchdf()
+
+
+def refresh_game_features(con, game_ids: Optional[list[str]] = None) -> None:
+    """
+    Recalcula game_features de los juegos dados (o de todo el catálogo) desde
+    price_history, en un solo INSERT ... ON CONFLICT. Lo llama el ingest
+    después de bump_data_versions: solo se recalculan los juegos que
+    recibieron filas nuevas.
+    """
+    if game_ids is not None:
+        game_ids = list(game_ids)
+        if not game_ids:
+            return
+    sql, params = _feature_anchors_sql(game_ids, min_records=1)
+    cols = ", ".join(FEATURE_ANCHOR_COLUMNS)
+    updates = ",\n                ".join(
+        f"{c} = excluded.{c}" for c in FEATURE_ANCHOR_COLUMNS + ["data_version", "updated_at"])
+    con.execute(f"""
+        INSERT INTO game_features (game_id, {cols}, data_version, updated_at)
+        SELECT a.game_id, {", ".join("a." + c for c in FEATURE_ANCHOR_COLUMNS)},
+               COALESCE(v.data_version, 0), ?
+        FROM ({sql}) a
+        LEFT JOIN game_data_versions v ON v.game_id = a.game_id
+        ON CONFLICT (game_id) DO UPDATE SET
+                {updates}
+    """, [_now()] + params)
+
+
+def get_feature_anchors(con, game_ids: Optional[list[str]] = None, min_records: int = 3):
+    """
+    Agregados por juego para src.ml.features.features_from_anchors, leídos del
+    feature store (game_features): costo independiente del largo del historial.
+    Incluye data_version, la versión de los datos con que se calcularon.
+    """
+    where = "AND game_id IN (SELECT UNNEST(?::VARCHAR[]))" if game_ids is not None else ""
+    params = [list(game_ids)] if game_ids is not None else []
+    return con.execute(f"""
+        SELECT game_id, {", ".join(FEATURE_ANCHOR_COLUMNS)}, data_version
+        FROM game_features
+        WHERE total >= ? {where}
+    """, [min_records] + params).fetchdf()
+
+
+def get_training_anchors(con, interval_days: int, horizon_days: int, min_records: int = 3):
+    """
+    Anchors point-in-time para el dataset de entrenamiento (src.ml.dataset):
+    una fila por (juego, as_of) cada `interval_days`, con los mismos agregados
+    que get_feature_anchors calculados SOLO con el historial hasta as_of
+    (ventanas acumuladas + ASOF JOIN), más el mínimo precio y el máximo
+    descuento de los `horizon_days` siguientes para el label.
+    Solo se muestrean fechas con el horizonte completo dentro de los datos.
+    """
+    return con.execute("""
+        WITH h AS (
+            SELECT game_id, timestamp, CAST(price_usd AS DOUBLE) AS price, cut_pct,
+                   ROW_NUMBER() OVER (PARTITION BY game_id ORDER BY timestamp, id) AS rn
+            FROM price_history
+            WHERE (shop_id = 61 OR LOWER(shop_name) LIKE '%steam%')
+        ),
+        c1 AS (
+            SELECT *,
+                   COUNT(*)                                   OVER w AS total,
+                   SUM(CASE WHEN cut_pct > 0 THEN 1 ELSE 0 END) OVER w AS on_sale,
+                   MIN(price)                                 OVER w AS min_price,
+                   MAX(price)                                 OVER w AS max_price,
+                   AVG(price)                                 OVER w AS avg_price,
+                   MAX(cut_pct)                               OVER w AS max_cut,
+                   AVG(CASE WHEN MONTH(timestamp) IN (10,11,12) AND cut_pct > 0 THEN cut_pct END) OVER w AS avg_cut_q4,
+                   AVG(CASE WHEN MONTH(timestamp) IN (6,7,8)    AND cut_pct > 0 THEN cut_pct END) OVER w AS avg_cut_summer,
+                   MAX(CASE WHEN cut_pct > 0 THEN timestamp END) OVER w AS last_sale_ts,
+                   SUM(CASE WHEN price > 0 THEN 1 ELSE 0 END) OVER w AS n_pos
+            FROM h
+            WINDOW w AS (PARTITION BY game_id ORDER BY rn ROWS UNBOUNDED PRECEDING)
+        ),
+        c2 AS (
+            -- El último registro que igualó el mínimo acumulado es el timestamp del mínimo;
+            -- la pendiente sale de sumas acumuladas sobre los precios > 0 (x = su índice)
+            SELECT *,
+                   MAX(CASE WHEN price <= min_price THEN timestamp END) OVER w AS min_price_ts,
+                   SUM(CASE WHEN price > 0 THEN n_pos END)             OVER w AS sx,
+                   SUM(CASE WHEN price > 0 THEN price END)             OVER w AS sy,
+                   SUM(CASE WHEN price > 0 THEN n_pos * price END)     OVER w AS sxy,
+                   SUM(CASE WHEN price > 0 THEN n_pos * n_pos END)     OVER w AS sxx
+            FROM c1
+            WINDOW w AS (PARTITION BY game_id ORDER BY rn ROWS UNBOUNDED PRECEDING)
+        ),
+        samples AS (
+            SELECT game_id,
+                   UNNEST(generate_series(first_ts, data_end - to_days(?), to_days(?))) AS as_of
+            FROM (
+                SELECT game_id, MIN(timestamp) AS first_ts,
+                       (SELECT MAX(timestamp) FROM h) AS data_end
+                FROM h GROUP BY game_id
+            )
+            WHERE first_ts <= data_end - to_days(?)
+        ),
+        future AS (
+            SELECT s.game_id, s.as_of,
+                   MIN(h.price)   AS future_min_price,
+                   MAX(h.cut_pct) AS future_max_cut
+            FROM samples s
+            JOIN h ON h.game_id = s.game_id
+                  AND h.timestamp > s.as_of
+                  AND h.timestamp <= s.as_of + to_days(?)
+            GROUP BY s.game_id, s.as_of
+        )
+        SELECT s.game_id, s.as_of,
+               c.total, c.on_sale,
+               c.price   AS last_price,
+               c.cut_pct AS last_cut,
+               c.min_price, c.max_price, c.avg_price, c.max_cut,
+               c.avg_cut_q4, c.avg_cut_summer, c.last_sale_ts, c.min_price_ts,
+               CASE WHEN c.n_pos >= 2 AND c.n_pos * c.sxx - c.sx * c.sx <> 0
+                    THEN (c.n_pos * c.sxy - c.sx * c.sy) / (c.n_pos * c.sxx - c.sx * c.sx)
+                    ELSE 0 END AS trend_slope,
+               c.n_pos,
+               f.future_min_price, f.future_max_cut
+        FROM samples s
+        ASOF JOIN c2 c ON c.game_id = s.game_id AND s.as_of >= c.timestamp
+        LEFT JOIN future f ON f.game_id = s.game_id AND f.as_of = s.as_of
+        WHERE c.total >= ?
+        ORDER BY s.game_id, s.as_of
+    """, [horizon_days, interval_days, horizon_days, horizon_days, min_records]).fetchdf()
+
+
 # ── predictions_cache ─────────────────────────────────────────────────────────
 
-def get_cached_prediction(con, game_id: str, max_age_hours: int = 6) -> Optional[dict]:
+def get_cached_prediction(con, game_id: str, max_age_hours: int = 24,
+                          model_version: Optional[str] = None) -> Optional[dict]:
+    """
+    Predicción cacheada si sigue vigente: misma data_version que los precios del
+    juego, calculada por model_version (la versión activa) y hace menos de
+    max_age_hours (features que dependen de la fecha).
+    Trae también title/appid del juego y el price_context con que se calculó,
+    así un hit no lee games ni price_history aparte. Filas previas a
+    price_context cuentan como miss.
+    """
     cutoff = _now() - dt.timedelta(hours=max_age_hours)
     row = con.execute("""
-        SELECT score, signal, reason, features, computed_at
-        FROM predictions_cache
-        WHERE game_id = ?
-          AND computed_at > ?
-    """, [game_id, cutoff]).fetchdf()
-    return _san(row.iloc[0].to_dict()) if not row.empty else None
+        SELECT g.title, g.appid, pc.score, pc.signal, pc.reason, pc.price_context,
+               pc.computed_at, COALESCE(pc.data_version, 0) AS data_version, pc.model_version
+        FROM predictions_cache pc
+        JOIN games g ON g.id = pc.game_id
+        LEFT JOIN game_data_versions v ON v.game_id = pc.game_id
+        WHERE pc.game_id = ?
+          AND pc.computed_at > ?
+          AND pc.price_context IS NOT NULL
+          AND pc.model_version IS NOT DISTINCT FROM ?
+          AND COALESCE(pc.data_version, 0) >= COALESCE(v.data_version, 0)
+    """, [game_id, cutoff, model_version]).fetchone()
+    if row is None:
+        return None
+    cols = ("title", "appid", "score", "signal", "reason", "price_context",
+            "computed_at", "data_version", "model_version")
+    cached = dict(zip(cols, row))
+    cached["price_context"] = json.loads(cached["price_context"])
+    return cached
+
+
+def get_data_version(con, game_id: str) -> int:
+    """data_version actual de un juego (lookup por PK; 0 si nunca tuvo precios)."""
+    row = con.execute(
+        "SELECT data_version FROM game_data_versions WHERE game_id = ?", [game_id]).fetchone()
+    return int(row[0]) if row else 0
 
 
 def upsert_prediction(con, game_id: str, score: float, signal: str,
-                      reason: str, features: dict):
+                      reason: str, features: dict, data_version: int = 0):
     now = _now()
     con.execute("""
-        INSERT INTO predictions_cache (game_id, score, signal, reason, features, computed_at)
-        VALUES (?, ?, ?, ?, ?, ?)
+        INSERT INTO predictions_cache (game_id, score, signal, reason, features, computed_at, data_version)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
         ON CONFLICT (game_id) DO UPDATE SET
-            score       = excluded.score,
-            signal      = excluded.signal,
-            reason      = excluded.reason,
-            features    = excluded.features,
-            computed_at = excluded.computed_at
-    """, [game_id, score, signal, reason, json.dumps(features), now])
+            score        = excluded.score,
+            signal       = excluded.signal,
+            reason       = excluded.reason,
+            features     = excluded.features,
+            computed_at  = excluded.computed_at,
+            data_version = excluded.data_version
+    """, [game_id, score, signal, reason, json.dumps(features), now, data_version])
+
+
+def upsert_predictions(con, rows) -> int:
+    """
+    Upsert en bloque de predicciones: DataFrame con game_id, score, signal,
+    reason, features y price_context (JSON serializado), data_version y
+    model_version. Un solo INSERT.
+    """
+    if rows is None or len(rows) == 0:
+        return 0
+    df = rows.assign(computed_at=_now())
+    try:
+        con.register("_pred_batch", df)
+        con.execute("""
+            INSERT INTO predictions_cache
+                (game_id, score, signal, reason, features, computed_at, data_version,
+                 price_context, model_version)
+            SELECT game_id, score, signal, reason, features, computed_at, data_version,
+                   price_context, model_version
+            FROM _pred_batch
+            ON CONFLICT (game_id) DO UPDATE SET
+                score         = excluded.score,
+                signal        = excluded.signal,
+                reason        = excluded.reason,
+                features      = excluded.features,
+                computed_at   = excluded.computed_at,
+                data_version  = excluded.data_version,
+                price_context = excluded.price_context,
+                model_version = excluded.model_version
+        """)
+    finally:
+        con.unregister("_pred_batch")
+    return len(df)
+
+
+def get_dirty_prediction_games(con, max_age_hours: int, limit: Optional[int] = None,
+                               model_version: Optional[str] = None) -> list[str]:
+    """
+    Dirty set de predicciones: juegos con precios nuevos desde la última
+    predicción (o sin predicción), más los que superan max_age_hours o
+    fueron calculados por otro modelo que model_version (el activo).
+    Solo juegos con historial Steam suficiente (>= 3 registros, según
+    game_features); los cambiados más recientemente primero.
+    """
+    cutoff = _now() - dt.timedelta(hours=max_age_hours)
+    rows = con.execute("""
+        WITH dirty AS (
+            SELECT v.game_id, v.changed_at
+            FROM game_data_versions v
+            LEFT JOIN predictions_cache pc ON pc.game_id = v.game_id
+            WHERE pc.game_id IS NULL
+               OR COALESCE(pc.data_version, 0) < v.data_version
+               OR pc.computed_at <= ?
+            UNION
+            SELECT pc.game_id, NULL AS changed_at
+            FROM predictions_cache pc
+            WHERE pc.computed_at <= ?
+               OR pc.model_version IS DISTINCT FROM ?
+        )
+        SELECT d.game_id
+        FROM dirty d
+        JOIN game_features f ON f.game_id = d.game_id
+        WHERE f.total >= 3
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY d.game_id ORDER BY d.changed_at DESC NULLS LAST) = 1
+        ORDER BY d.changed_at DESC NULLS LAST, d.game_id
+        LIMIT ?
+    """, [cutoff, cutoff, model_version, limit]).fetchall()
+    return [r[0] for r in rows]
+
+
+# ── sync_jobs ─────────────────────────────────────────────────────────────────
+
+_JOB_ACTIVE = ('queued', 'running')
+
+
+def _job_row(row: Optional[dict]) -> Optional[dict]:
+    if row is None:
+        return None
+    for key in ("params", "checkpoint", "result"):
+        if isinstance(row.get(key), str):
+            row[key] = json.loads(row[key])
+    return row
+
+
+def _job_fetch(con, sql: str, params: list) -> list[dict]:
+    cur = con.execute(sql, params)
+    cols = [d[0] for d in cur.description]
+    return [_job_row(dict(zip(cols, r))) for r in cur.fetchall()]
+
+
+def insert_job(con, job_id: str, kind: str, params: dict, dedupe_key: str) -> dict:
+    return _job_fetch(con, """
+        INSERT INTO sync_jobs (id, kind, params, dedupe_key, status, created_at)
+        VALUES (?, ?, ?, ?, 'queued', ?)
+        RETURNING *
+    """, [job_id, kind, json.dumps(params), dedupe_key, _now()])[0]
+
+
+def find_active_job(con, dedupe_key: str) -> Optional[dict]:
+    """Job idéntico aún en cola o corriendo (para dedupe)."""
+    rows = _job_fetch(con, f"""
+        SELECT * FROM sync_jobs
+        WHERE dedupe_key = ? AND status IN {_JOB_ACTIVE}
+        ORDER BY created_at LIMIT 1
+    """, [dedupe_key])
+    return rows[0] if rows else None
+
+
+def get_latest_job(con, dedupe_key: str) -> Optional[dict]:
+    """Último job (en cualquier estado) con esa clave."""
+    rows = _job_fetch(con, """
+        SELECT * FROM sync_jobs WHERE dedupe_key = ?
+        ORDER BY created_at DESC LIMIT 1
+    """, [dedupe_key])
+    return rows[0] if rows else None
+
+
+def get_job(con, job_id: str) -> Optional[dict]:
+    rows = _job_fetch(con, "SELECT * FROM sync_jobs WHERE id = ?", [job_id])
+    return rows[0] if rows else None
+
+
+def list_jobs(con, limit: int = 20, status: Optional[str] = None) -> list[dict]:
+    if status:
+        return _job_fetch(con, """
+            SELECT * FROM sync_jobs WHERE status = ?
+            ORDER BY created_at DESC LIMIT ?
+        """, [status, limit])
+    return _job_fetch(con, "SELECT * FROM sync_jobs ORDER BY created_at DESC LIMIT ?", [limit])
+
+
+def claim_next_job(con, kinds: Optional[list[str]] = None,
+                   exclude: Optional[list[str]] = None) -> Optional[dict]:
+    """
+    Pasa el job en cola más antiguo a 'running' y lo retorna. kinds/exclude
+    acotan los tipos (cada carril del worker reclama solo los suyos).
+    """
+    now = _now()
+    where, params = "", []
+    if kinds is not None:
+        where += " AND kind IN (SELECT UNNEST(?::VARCHAR[]))"
+        params.append(list(kinds))
+    if exclude:
+        where += " AND kind NOT IN (SELECT UNNEST(?::VARCHAR[]))"
+        params.append(list(exclude))
+    rows = _job_fetch(con, f"""
+        UPDATE sync_jobs SET
+            status         = 'running',
+            attempts       = attempts + 1,
+            started_at     = COALESCE(started_at, ?),
+            run_started_at = ?,
+            run_start_done = COALESCE(done, 0),
+            updated_at     = ?
+        WHERE id = (
+            SELECT id FROM sync_jobs WHERE status = 'queued'{where}
+            ORDER BY created_at LIMIT 1
+        )
+        RETURNING *
+    """, [now, now, now] + params)
+    return rows[0] if rows else None
+
+
+def update_job_progress(con, job_id: str, done: int, total: Optional[int],
+                        errors: int, checkpoint: Optional[dict]) -> bool:
+    """Guarda progreso y checkpoint. Retorna True si se pidió cancelar el job."""
+    row = con.execute("""
+        UPDATE sync_jobs SET
+            done       = ?,
+            total      = COALESCE(?, total),
+            errors     = ?,
+            checkpoint = COALESCE(?, checkpoint),
+            updated_at = ?
+        WHERE id = ?
+        RETURNING cancel_requested
+    """, [done, total, errors,
+          json.dumps(checkpoint) if checkpoint is not None else None,
+          _now(), job_id]).fetchone()
+    return bool(row and row[0])
+
+
+def finish_job(con, job_id: str, status: str,
+               result: Optional[dict] = None, error: Optional[str] = None):
+    now = _now()
+    con.execute("""
+        UPDATE sync_jobs SET
+            status      = ?,
+            result      = ?,
+            error       = ?,
+            updated_at  = ?,
+            finished_at = CASE WHEN ? = 'queued' THEN NULL ELSE ? END
+        WHERE id = ?
+    """, [status, json.dumps(result, default=str) if result is not None else None,
+          error, now, status, now, job_id])
+
+
+def request_job_cancel(con, job_id: str) -> Optional[dict]:
+    """Cancela un job en cola al instante; uno corriendo se marca y para en su próximo checkpoint."""
+    now = _now()
+    con.execute("""
+        UPDATE sync_jobs SET
+            status      = CASE WHEN status = 'queued' THEN 'cancelled' ELSE status END,
+            finished_at = CASE WHEN status = 'queued' THEN ? ELSE finished_at END,
+            cancel_requested = TRUE,
+            updated_at  = ?
+        WHERE id = ? AND status IN ('queued', 'running')
+    """, [now, now, job_id])
+    return get_job(con, job_id)
+
+
+def requeue_running_jobs(con) -> int:
+    """Al arrancar: los jobs que quedaron 'running' (proceso caído) vuelven a la cola."""
+    rows = con.execute("""
+        UPDATE sync_jobs SET status = 'queued', updated_at = ?
+        WHERE status = 'running'
+        RETURNING id
+    """, [_now()]).fetchall()
+    return len(rows)
+
+
+# ── game_refresh_state (scheduler) ────────────────────────────────────────────
+
+def add_game_views(con, counts: dict[str, int], half_life_days: float = 7.0):
+    """
+    Suma vistas acumuladas en memoria. El contador decae exponencialmente
+    (vida media `half_life_days`) para que la demanda vieja pese menos.
+    """
+    if not counts:
+        return
+    now = _now()
+    ids, views = zip(*counts.items())
+    con.execute("""
+        INSERT INTO game_refresh_state (game_id, views, last_view_at)
+        SELECT UNNEST(?::VARCHAR[]), UNNEST(?::DOUBLE[]), ?
+        ON CONFLICT (game_id) DO UPDATE SET
+            views = game_refresh_state.views * POW(0.5,
+                        COALESCE(EPOCH(excluded.last_view_at) - EPOCH(game_refresh_state.last_view_at), 0)
+                        / (86400.0 * ?))
+                    + excluded.views,
+            last_view_at = excluded.last_view_at
+    """, [list(ids), list(views), now, half_life_days])
+
+
+def mark_games_synced(con, game_ids: list[str], status: str = "ok"):
+    if not game_ids:
+        return
+    con.execute("""
+        INSERT INTO game_refresh_state (game_id, last_synced_at, last_status)
+        SELECT UNNEST(?::VARCHAR[]), ?, ?
+        ON CONFLICT (game_id) DO UPDATE SET
+            last_synced_at = excluded.last_synced_at,
+            last_status    = excluded.last_status
+    """, [list(game_ids), _now(), status])
+
+
+def get_refresh_schedule(con, limit: int, min_hours: float, max_hours: float,
+                         overdue_only: bool = True) -> list[dict]:
+    """
+    Juegos trackeados ordenados por atraso respecto a su próximo refresh.
+
+    demanda     = 3·wishlists + 1·librerías + vistas (decaídas)
+    volatilidad = cambios de precio Steam en los últimos 90 días
+    intervalo   = max_hours / (1 + ln(1 + demanda + 2·volatilidad)), acotado a [min_hours, max_hours]
+    próximo     = último sync + intervalo (nunca sincronizado → epoch, máxima prioridad)
+    """
+    now = _now()
+    cur = con.execute(f"""
+        WITH wish AS (
+            SELECT appid, COUNT(*) AS n FROM user_wishlist GROUP BY appid
+        ),
+        lib AS (
+            SELECT appid, COUNT(*) AS n FROM user_games GROUP BY appid
+        ),
+        vol AS (
+            SELECT game_id, COUNT(*) AS n
+            FROM price_history
+            WHERE {STEAM_FILTER_PH} AND timestamp > ?
+            GROUP BY game_id
+        ),
+        scored AS (
+            SELECT
+                g.id AS game_id, g.appid, g.title,
+                COALESCE(w.n, 0)       AS wishlists,
+                COALESCE(l.n, 0)       AS owners,
+                COALESCE(rs.views, 0)  AS views,
+                COALESCE(v.n, 0)       AS changes_90d,
+                rs.last_synced_at,
+                GREATEST(?, LEAST(?, ? / (1 + LN(1 + 3 * COALESCE(w.n, 0) + COALESCE(l.n, 0)
+                                                  + COALESCE(rs.views, 0) + 2 * COALESCE(v.n, 0)))))
+                    AS interval_hours
+            FROM games g
+            LEFT JOIN wish w ON w.appid = g.appid
+            LEFT JOIN lib  l ON l.appid = g.appid
+            LEFT JOIN vol  v ON v.game_id = g.id
+            LEFT JOIN game_refresh_state rs ON rs.game_id = g.id
+            WHERE g.appid IS NOT NULL
+        )
+        SELECT * FROM (
+            SELECT *,
+                   COALESCE(last_synced_at, TIMESTAMP '1970-01-01')
+                       + to_microseconds(CAST(interval_hours * 3600e6 AS BIGINT)) AS next_refresh_at
+            FROM scored
+        )
+        WHERE (NOT ? OR next_refresh_at <= ?)
+        ORDER BY next_refresh_at ASC, wishlists + owners + views DESC
+        LIMIT ?
+    """, [now - dt.timedelta(days=90), min_hours, max_hours, max_hours,
+          overdue_only, now, limit])
+    # fetchall y no fetchdf: pandas convertiría los last_synced_at NULL en NaT
+    cols = [d[0] for d in cur.description]
+    return [_san(dict(zip(cols, row))) for row in cur.fetchall()]
 
 
 # ── Overview ──────────────────────────────────────────────────────────────────
@@ -292,6 +1099,20 @@ def get_overview_stats(con) -> dict:
     }
 
 
+def get_latest_price(con, game_id: str) -> Optional[dict]:
+    """Último precio de Steam registrado para un juego."""
+    row = con.execute("""
+        SELECT shop_id, shop_name, price_usd, regular_usd, cut_pct,
+               CAST(timestamp AS VARCHAR) AS timestamp
+        FROM price_history
+        WHERE game_id = ?
+          AND (shop_id = 61 OR LOWER(shop_name) LIKE '%steam%')
+        ORDER BY timestamp DESC
+        LIMIT 1
+    """, [game_id]).fetchdf()
+    return _san(row.iloc[0].to_dict()) if not row.empty else None
+
+
 def get_top_deals(con, limit: int = 24) -> list[dict]:
     rows = con.execute("""
         WITH latest AS (
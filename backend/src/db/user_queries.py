@@ -186,6 +186,13 @@ def get_user_wishlist_with_prices(con, steam_id: str) -> list[dict]:
     return [_san(r) for r in rows.to_dict(orient="records")]
 
 
+def get_user_wishlist_appids(con, steam_id: str) -> list[int]:
+    rows = con.execute(
+        "SELECT appid FROM user_wishlist WHERE steam_id = ? ORDER BY added_at, appid", [steam_id]
+    ).fetchall()
+    return [r[0] for r in rows]
+
+
 def get_user_owned_appids(con, steam_id: str) -> set:
     rows = con.execute(
         "SELECT appid FROM user_games WHERE steam_id = ?", [steam_id]
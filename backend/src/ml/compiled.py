@@ -0,0 +1,172 @@
+"""
+src/ml/compiled.py
+==================
+Evaluador del GradientBoostingRegressor "compilado" a arrays NumPy planos,
+sin scikit-learn en el proceso de la API.
+
+train.py exporta, junto al joblib, un directorio con:
+
+  feature.npy    (n_trees * max_nodes,) int32    feature del split
+  threshold.npy  (n_trees * max_nodes,) float64  umbral: va a la izquierda si x <= umbral
+  left.npy       (n_trees * max_nodes,) int32    hijo izquierdo (índice global)
+  right.npy      (n_trees * max_nodes,) int32    hijo derecho   (índice global)
+  value.npy      (n_trees * max_nodes,) float64  valor de la hoja
+  scaler_mean.npy / scaler_scale.npy             StandardScaler
+  meta.json      init, learning_rate, max_depth, n_trees, max_nodes, n_features
+
+Cada árbol ocupa max_nodes posiciones (el nodo j del árbol i es i * max_nodes + j)
+y las hojas apuntan a sí mismas, así el recorrido no necesita ramas: la API carga
+los arrays con np.load(mmap_mode='r') y avanza todas las filas × árboles a la vez,
+max_depth pasos de gather vectorizado.
+
+Verificación contra el joblib de la versión activa (requiere scikit-learn):
+  python -m src.ml.compiled --verify [--version V]
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ARRAYS = ("feature", "threshold", "left", "right", "value", "scaler_mean", "scaler_scale")
+
+
+def export_compiled(model, scaler, out_dir: str) -> str:
+    """
+    Aplana el ensemble y el scaler ajustados a arrays .npy en out_dir.
+    Escribe en un directorio temporal y lo reemplaza al final, así un lector
+    nunca ve un export a medias.
+    """
+    trees = [est[0].tree_ for est in model.estimators_]
+    n_trees, max_nodes = len(trees), max(t.node_count for t in trees)
+
+    # Relleno: nodos hoja que apuntan a sí mismos
+    node_ids = np.arange(n_trees * max_nodes, dtype=np.int32).reshape(n_trees, max_nodes)
+    feature = np.zeros((n_trees, max_nodes), dtype=np.int32)
+    threshold = np.zeros((n_trees, max_nodes), dtype=np.float64)
+    left, right = node_ids.copy(), node_ids.copy()
+    value = np.zeros((n_trees, max_nodes), dtype=np.float64)
+    for i, t in enumerate(trees):
+        n, base = t.node_count, i * max_nodes
+        split = t.children_left != -1   # en sklearn las hojas tienen hijos -1
+        feature[i, :n] = np.where(split, t.feature, 0)
+        threshold[i, :n] = np.where(split, t.threshold, 0.0)
+        left[i, :n] = np.where(split, t.children_left + base, node_ids[i, :n])
+        right[i, :n] = np.where(split, t.children_right + base, node_ids[i, :n])
+        value[i, :n] = t.value[:, 0, 0]
+
+    n_features = int(model.n_features_in_)
+    # init_ es un DummyRegressor (la media del target) o "zero"
+    init = 0.0 if model.init_ == "zero" else float(
+        model.init_.predict(np.zeros((1, n_features)))[0])
+    meta = {
+        "init":          init,
+        "learning_rate": float(model.learning_rate),
+        "max_depth":     int(max(t.max_depth for t in trees)),
+        "n_trees":       n_trees,
+        "max_nodes":     max_nodes,
+        "n_features":    n_features,
+    }
+    arrays = {
+        "feature": feature.ravel(), "threshold": threshold.ravel(), "left": left.ravel(),
+        "right": right.ravel(), "value": value.ravel(),
+        "scaler_mean":  np.asarray(scaler.mean_ if scaler is not None else np.zeros(n_features),
+                                   dtype=np.float64),
+        "scaler_scale": np.asarray(scaler.scale_ if scaler is not None else np.ones(n_features),
+                                   dtype=np.float64),
+    }
+
+    tmp = f"{out_dir}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), arr)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    old = f"{out_dir}.old"
+    if os.path.exists(out_dir):
+        shutil.rmtree(old, ignore_errors=True)
+        os.replace(out_dir, old)
+    os.replace(tmp, out_dir)
+    shutil.rmtree(old, ignore_errors=True)
+    logger.info(f"Modelo compilado exportado en: {out_dir} ({n_trees} árboles, {max_nodes} nodos máx.)")
+    return out_dir
+
+
+class CompiledForest:
+    """Ensemble compilado: scaler + suma de árboles, solo NumPy."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        # np.asarray: vista ndarray sobre el mmap (sin copia ni el overhead de np.memmap)
+        a = {name: np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+             for name in ARRAYS}
+        self._feature, self._threshold = a["feature"], a["threshold"]
+        self._left, self._right, self._value = a["left"], a["right"], a["value"]
+        self._mean, self._scale = a["scaler_mean"], a["scaler_scale"]
+        self._init = self.meta["init"]
+        self._lr = self.meta["learning_rate"]
+        self._depth = self.meta["max_depth"]
+        self._roots = np.arange(self.meta["n_trees"], dtype=np.intp) * self.meta["max_nodes"]
+        self._n_features = self.meta["n_features"]
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Scores crudos (sin clip) para una matriz (n, n_features)."""
+        X = np.asarray(X, dtype=np.float64)
+        # sklearn compara en float32 contra umbrales float64: se replica para ser exactos
+        Xs = ((X - self._mean) / self._scale).astype(np.float32).ravel()
+        row_base = (np.arange(len(X), dtype=np.intp) * self._n_features)[:, None]
+        node = np.broadcast_to(self._roots, (len(X), len(self._roots)))
+        for _ in range(self._depth):
+            go_left = Xs.take(row_base + self._feature.take(node)) <= self._threshold.take(node)
+            node = np.where(go_left, self._left.take(node), self._right.take(node))
+        return self._init + self._lr * self._value.take(node).sum(axis=1)
+
+
+def verify(joblib_path: str, compiled_path: str, n: int = 10_000, seed: int = 0) -> float:
+    """Compara el evaluador compilado con sklearn sobre features sintéticas. Retorna el error máx."""
+    import joblib
+
+    artifact = joblib.load(joblib_path)
+    model, scaler = artifact["model"], artifact.get("scaler")
+    forest = CompiledForest(compiled_path)
+    rng = np.random.default_rng(seed)
+    mean, scale = np.asarray(forest._mean), np.asarray(forest._scale)
+    X = mean + scale * rng.standard_normal((n, len(mean))) * 2
+    expected = model.predict(scaler.transform(X) if scaler is not None else X)
+    return float(np.max(np.abs(forest.predict(X) - expected)))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    logger = logging.getLogger("compiled")
+    from src.ml import registry
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--version", help="Versión del modelo (default: la activa)")
+    parser.add_argument("--joblib")
+    parser.add_argument("--compiled")
+    parser.add_argument("--export", action="store_true",
+                        help="Re-exporta los arrays desde el joblib existente")
+    parser.add_argument("--verify", action="store_true",
+                        help="Compara contra sklearn sobre features sintéticas")
+    args = parser.parse_args()
+    version = args.version or registry.current_version()
+    base = registry.version_path(version) if version else registry.artifacts_dir()
+    args.joblib = args.joblib or os.path.join(base, "model.joblib")
+    args.compiled = args.compiled or os.path.join(base, "compiled")
+    if args.export:
+        import joblib
+        artifact = joblib.load(args.joblib)
+        export_compiled(artifact["model"], artifact.get("scaler"), args.compiled)
+    if args.verify:
+        err = verify(args.joblib, args.compiled)
+        logger.info(f"Error máximo vs sklearn: {err:.3e}")
+        if err > 1e-9:
+            raise SystemExit(1)
@@ -0,0 +1,113 @@
+"""
+src/ml/dataset.py
+=================
+Dataset de entrenamiento point-in-time.
+
+Uso:
+  python -m src.ml.dataset --db ./data/steamsense.duckdb --out ./data/dataset
+  python -m src.ml.dataset --out ./data/dataset.parquet --interval-days 14
+
+Para cada juego se toma una muestra cada `interval_days` y las features se
+calculan solo con el historial conocido hasta esa fecha (sin leakage de
+stats del historial completo), en una pasada de ventanas de DuckDB
+(queries.get_training_anchors) + features_from_anchors.
+
+Label (forward-looking, 0–100, mismo sentido que el score del modelo):
+100 × mejor precio de los próximos `horizon_days` / precio actual. 100 = no
+hubo un precio mejor en el horizonte (buen momento para comprar); 50 = en el
+horizonte se pudo comprar a la mitad.
+
+Salida: directorio con X.npy / y.npy (memory-mappable, ver load_dataset) y
+meta.json, o un .parquet con todas las columnas.
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from src.ml.features import FEATURE_ORDER, features_from_anchors
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger("dataset")
+
+DEFAULT_INTERVAL_DAYS = 30
+DEFAULT_HORIZON_DAYS = 90
+
+
+def forward_label(current_price, future_min_price):
+    """Label vectorizado: 100 × min(actual, mínimo futuro) / actual."""
+    current = np.asarray(current_price, dtype=float)
+    future = np.asarray(future_min_price, dtype=float)
+    best = np.fmin(current, future)          # NaN (sin cambios en el horizonte) → actual
+    with np.errstate(divide="ignore", invalid="ignore"):
+        label = np.where(current > 0, 100.0 * best / current, 100.0)
+    return np.round(np.clip(label, 0, 100), 2)
+
+
+def build_dataset(con, interval_days: int = DEFAULT_INTERVAL_DAYS,
+                  horizon_days: int = DEFAULT_HORIZON_DAYS):
+    """
+    DataFrame con game_id, as_of, las columnas FEATURE_ORDER y `label`.
+    """
+    from src.db import queries
+
+    t0 = time.perf_counter()
+    anchors = queries.get_training_anchors(con, interval_days, horizon_days)
+    feats = features_from_anchors(anchors)
+    df = feats[FEATURE_ORDER].reset_index()
+    df.insert(1, "as_of", anchors["as_of"].to_numpy())
+    df["label"] = forward_label(anchors["last_price"], anchors["future_min_price"])
+    logger.info(f"Dataset: {len(df):,} muestras de {df['game_id'].nunique():,} juegos "
+                f"en {time.perf_counter() - t0:.2f}s "
+                f"(cada {interval_days} días, horizonte {horizon_days} días)")
+    return df
+
+
+def save_dataset(df, out: str, interval_days: int, horizon_days: int) -> str:
+    """Guarda en Parquet (si `out` termina en .parquet) o como X.npy/y.npy en un directorio."""
+    if out.endswith(".parquet"):
+        import duckdb
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        mem = duckdb.connect()
+        mem.register("_dataset", df)
+        mem.execute(f"COPY _dataset TO '{out.replace(chr(39), chr(39) * 2)}' (FORMAT parquet)")
+        mem.close()
+        return out
+    os.makedirs(out, exist_ok=True)
+    np.save(os.path.join(out, "X.npy"), df[FEATURE_ORDER].to_numpy(dtype=np.float64))
+    np.save(os.path.join(out, "y.npy"), df["label"].to_numpy(dtype=np.float64))
+    with open(os.path.join(out, "meta.json"), "w") as f:
+        json.dump({"features": FEATURE_ORDER, "samples": len(df),
+                   "interval_days": interval_days, "horizon_days": horizon_days}, f, indent=2)
+    return out
+
+
+def load_dataset(path: str, mmap: bool = True) -> tuple[np.ndarray, np.ndarray]:
+    """(X, y) de un directorio de save_dataset; con mmap no se copia a memoria."""
+    mode = "r" if mmap else None
+    X = np.load(os.path.join(path, "X.npy"), mmap_mode=mode)
+    y = np.load(os.path.join(path, "y.npy"), mmap_mode=mode)
+    return X, y
+
+
+if __name__ == "__main__":
+    import duckdb
+    from config import get_settings
+
+    parser = argparse.ArgumentParser(description="Dataset point-in-time para entrenar")
+    parser.add_argument("--db", default=get_settings().duckdb_path)
+    parser.add_argument("--out", default="./data/dataset")
+    parser.add_argument("--interval-days", type=int, default=DEFAULT_INTERVAL_DAYS)
+    parser.add_argument("--horizon-days", type=int, default=DEFAULT_HORIZON_DAYS)
+    args = parser.parse_args()
+
+    con = duckdb.connect(args.db, read_only=True)
+    try:
+        data = build_dataset(con, args.interval_days, args.horizon_days)
+    finally:
+        con.close()
+    logger.info(f"Guardado en {save_dataset(data, args.out, args.interval_days, args.horizon_days)}")
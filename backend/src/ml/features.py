@@ -14,6 +14,13 @@ Features extraídas:
   - current_month           → mes actual (1–12) para detectar estacionalidad
   - days_since_last_sale    → días desde la última vez que hubo descuento
   - sale_frequency          → proporción de registros que tuvieron descuento
+  - price_trend_slope       → pendiente de la regresión lineal de precios
+
+build_features arma las features de un juego a partir de sus listas de dicts;
+features_from_anchors hace lo mismo para muchos juegos a la vez, vectorizado,
+sobre los agregados del feature store (queries.get_feature_anchors lee la
+tabla game_features, que mantiene el ingest); acá solo se deriva lo que
+depende de la fecha de la predicción (mes, días desde el mínimo/la rebaja).
 """
 
 import logging
@@ -24,6 +31,21 @@ import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Orden del vector que espera el modelo — debe coincidir con el de train.py
+FEATURE_ORDER = [
+    "current_discount_pct",
+    "days_since_min_price",
+    "price_vs_avg_ratio",
+    "max_historical_discount",
+    "avg_discount_q4",
+    "avg_discount_summer",
+    "current_month",
+    "days_since_last_sale",
+    "sale_frequency",
+    "price_trend_slope",
+]
+META_COLUMNS = ["_current_price", "_min_price", "_max_price", "_avg_price"]
+
 
 def build_features(stats: dict, history: list[dict], seasonal: list[dict]) -> Optional[dict]:
     """
@@ -117,16 +139,68 @@ def features_to_vector(features: dict) -> np.ndarray:
     Convierte el dict de features al vector ordenado que espera el modelo.
     El orden debe coincidir exactamente con el que se usó en train.py.
     """
-    FEATURE_ORDER = [
-        "current_discount_pct",
-        "days_since_min_price",
-        "price_vs_avg_ratio",
-        "max_historical_discount",
-        "avg_discount_q4",
-        "avg_discount_summer",
-        "current_month",
-        "days_since_last_sale",
-        "sale_frequency",
-        "price_trend_slope",
-    ]
     return np.array([features.get(k, 0) for k in FEATURE_ORDER], dtype=float)
+
+
+def features_from_anchors(anchors, now: Optional[datetime] = None):
+    """
+    Versión batch de build_features: un DataFrame indexado por game_id con las
+    columnas FEATURE_ORDER + META_COLUMNS, a partir de queries.get_feature_anchors.
+
+    `now` (UTC) es el momento de la predicción; si anchors trae una columna
+    `as_of` (datasets point-in-time) se usa la de cada fila.
+    Replica las particularidades de build_features: stats redondeadas a 4
+    decimales, days_since_min_price=0 se vuelve 365 (el `or 365`), caps de 730.
+    """
+    import pandas as pd
+
+    if anchors is None or anchors.empty:
+        # Índice con nombre también vacío: reset_index() sigue dando game_id
+        return pd.DataFrame(columns=FEATURE_ORDER + META_COLUMNS).rename_axis("game_id")
+
+    a = anchors
+    if "as_of" in a.columns:
+        as_of = pd.to_datetime(a["as_of"])
+    else:
+        now = (now or datetime.now(timezone.utc)).replace(tzinfo=None)
+        as_of = pd.Series(pd.Timestamp(now), index=a.index)
+
+    def num(col, default=0.0):
+        return pd.to_numeric(a[col], errors="coerce").astype(float).fillna(default)
+
+    current_price = num("last_price")
+    min_price = num("min_price").round(4)
+    max_price = num("max_price").round(4)
+    avg_price = num("avg_price").round(4)
+    # `or current_price`: un 0.0 cuenta como faltante
+    max_price = max_price.where(max_price != 0, current_price)
+    avg_price = avg_price.where(avg_price != 0, current_price)
+    price_vs_avg = np.where(avg_price > 0, current_price / avg_price.where(avg_price > 0, 1), 1.0)
+
+    days_since_min = (as_of - pd.to_datetime(a["min_price_ts"])).dt.days.clip(lower=0)
+    days_since_min = days_since_min.fillna(365).replace(0, 365)
+    days_since_sale = (as_of - pd.to_datetime(a["last_sale_ts"])).dt.days.fillna(9999)
+
+    total = num("total")
+    sale_frequency = np.where(total > 0, num("on_sale") / total.where(total > 0, 1), 0.0)
+    trend = np.where(num("n_pos") >= 5, num("trend_slope"), 0.0)
+
+    out = pd.DataFrame({
+        "current_discount_pct":    num("last_cut").astype(int),
+        "days_since_min_price":    np.minimum(days_since_min.astype(float), 730),
+        "price_vs_avg_ratio":      np.round(price_vs_avg, 4),
+        "max_historical_discount": num("max_cut").astype(int).astype(float),
+        "avg_discount_q4":         num("avg_cut_q4").round(4),
+        "avg_discount_summer":     num("avg_cut_summer").round(4),
+        "current_month":           as_of.dt.month.astype(int),
+        "days_since_last_sale":    np.minimum(days_since_sale.astype(int), 730),
+        "sale_frequency":          np.round(sale_frequency, 4),
+        "price_trend_slope":       np.round(trend, 6),
+        "_current_price":          current_price,
+        "_min_price":              min_price,
+        "_max_price":              max_price,
+        "_avg_price":              avg_price,
+    })
+    out.index = a["game_id"].to_numpy()
+    out.index.name = "game_id"
+    return out
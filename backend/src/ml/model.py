@@ -1,23 +1,39 @@
 """
 src/ml/model.py
 ===============
-Carga el modelo ML serializado y expone predict().
+Carga el modelo ML serializado y expone predict() (un juego) y
+predict_many() (matriz de features, una llamada para todo el batch).
 Si no hay modelo entrenado, usa una heurística de fallback
 para que la app funcione desde el día 1.
 
-El modelo entrenado se guarda en src/ml/artifacts/model.joblib
+Los artefactos están versionados (src/ml/registry.py): se carga la versión
+que apunta CURRENT, preferentemente compilada a arrays NumPy
+(src/ml/compiled.py) — la API no importa scikit-learn y una predicción cuesta
+microsegundos. El joblib queda para verificación y como fallback.
+
+Cada SteamPriceModel es una versión cargada y no se modifica: activar otra
+(reentrenamiento, rollback) carga la nueva aparte y recién entonces
+reemplaza la referencia que devuelve get_model(). Una request en curso
+termina con la versión con la que empezó.
 """
 
+import datetime as dt
+import json
 import logging
 import os
+import threading
+import time
 from dataclasses import dataclass
 from typing import Optional
 
 import numpy as np
 
-logger = logging.getLogger(__name__)
+from src.ml import registry
+from src.ml.compiled import CompiledForest
+from src.ml.features import FEATURE_ORDER, features_to_vector
 
-ARTIFACT_PATH = os.path.join(os.path.dirname(__file__), "artifacts", "model.joblib")
+logger = logging.getLogger(__name__)
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_ORDER)}
 
 
 @dataclass
@@ -29,176 +45,231 @@ class PredictionResult:
     features_used: dict   # Features que alimentaron la predicción
 
 
+@dataclass
+class BatchPrediction:
+    scores: np.ndarray    # (n,) 0–100
+    signals: np.ndarray   # (n,) "BUY" | "WAIT"
+    reasons: np.ndarray   # (n,) explicaciones legibles
+    confidence: float     # igual para todo el batch (modelo vs heurística)
+
+
 class SteamPriceModel:
     """
-    Wrapper del modelo ML.
-    Primero intenta cargar el joblib; si no existe, usa la heurística.
+    Wrapper de una versión del modelo ML (directorio `path`).
+    Primero intenta cargar el modelo compilado, luego el joblib; si no
+    existe ninguno, usa la heurística. Con strict=True, en vez de caer a la
+    heurística lanza la excepción (para no activar una versión rota).
     """
 
-    def __init__(self):
+    def __init__(self, path: Optional[str] = None, version: Optional[str] = None,
+                 strict: bool = False):
+        self.path = path
+        self.version = version
+        self.manifest: dict = {}
+        self._compiled: Optional[CompiledForest] = None
         self._model = None
         self._scaler = None
-        self._load()
-
-    def _load(self):
-        if not os.path.exists(ARTIFACT_PATH):
-            logger.warning(
-                f"Modelo no encontrado en {ARTIFACT_PATH}. "
-                "Usando heurística de fallback. Ejecuta train.py para entrenar."
-            )
-            return
-        try:
-            import joblib
-            artifact = joblib.load(ARTIFACT_PATH)
-            self._model = artifact.get("model")
-            self._scaler = artifact.get("scaler")
-            logger.info("Modelo ML cargado correctamente desde artifacts/")
-        except Exception as e:
-            logger.error(f"Error cargando modelo: {e}. Usando heurística.")
+        t0 = time.perf_counter()
+        if path:
+            try:
+                self._load(path)
+            except Exception as e:
+                if strict:
+                    raise
+                logger.error(f"Error cargando modelo desde {path}: {e}. Usando heurística.")
+                self._compiled = self._model = self._scaler = None
+        self.load_seconds = round(time.perf_counter() - t0, 4)
+        self.loaded_at = dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)
+
+    @property
+    def kind(self) -> str:
+        if self._compiled is not None:
+            return "compiled"
+        return "joblib" if self._model is not None else "heuristic"
+
+    def _load(self, path: str):
+        manifest_path = os.path.join(path, registry.MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+            order = self.manifest.get("feature_order")
+            if order and order != FEATURE_ORDER:
+                raise RuntimeError(f"feature_order del artefacto no coincide con FEATURE_ORDER: {order}")
+
+        compiled = os.path.join(path, "compiled")
+        if os.path.exists(os.path.join(compiled, "meta.json")):
+            try:
+                self._compiled = CompiledForest(compiled)
+                logger.info(f"Modelo compilado cargado: {self.version or path}")
+                return
+            except Exception as e:
+                logger.error(f"Error cargando modelo compilado: {e}. Probando joblib.")
+        joblib_path = os.path.join(path, "model.joblib")
+        if not os.path.exists(joblib_path):
+            raise FileNotFoundError(f"Modelo no encontrado en {path}")
+        import joblib
+        artifact = joblib.load(joblib_path)
+        self._model = artifact.get("model")
+        self._scaler = artifact.get("scaler")
+        logger.info(f"Modelo ML (joblib) cargado: {self.version or path}")
 
     def predict(self, features: dict) -> PredictionResult:
         """
         Genera una predicción dado el dict de features.
         Intenta usar el modelo; si falla, usa heurística.
         """
-        from src.ml.features import features_to_vector
-
-        vector = features_to_vector(features)
-
-        if self._model is not None:
-            return self._predict_with_model(vector, features)
-        else:
-            return self._heuristic(features)
-
-    def _predict_with_model(self, vector: np.ndarray, features: dict) -> PredictionResult:
-        try:
-            X = vector.reshape(1, -1)
-            if self._scaler:
-                X = self._scaler.transform(X)
-
-            score_raw = float(self._model.predict(X)[0])
-            score = max(0.0, min(100.0, score_raw))
-            confidence = 0.85  # TODO: calibration
-
-            signal, reason = self._interpret(score, features)
-            return PredictionResult(
-                score=round(score, 1),
-                signal=signal,
-                reason=reason,
-                confidence=confidence,
-                features_used=features,
-            )
-        except Exception as e:
-            logger.error(f"Error en predicción con modelo: {e}. Fallback a heurística.")
-            return self._heuristic(features)
-
-    def _heuristic(self, features: dict) -> PredictionResult:
+        batch = self.predict_many(features_to_vector(features).reshape(1, -1))
+        return PredictionResult(
+            score=float(batch.scores[0]),
+            signal=str(batch.signals[0]),
+            reason=str(batch.reasons[0]),
+            confidence=batch.confidence,
+            features_used=features,
+        )
+
+    def predict_many(self, X: np.ndarray) -> "BatchPrediction":
+        """
+        Predicción vectorizada sobre una matriz (n, len(FEATURE_ORDER)):
+        una sola llamada al scaler/modelo para todo el batch.
+        """
+        X = np.asarray(X, dtype=float)
+        if self._compiled is not None:
+            try:
+                scores = np.clip(self._compiled.predict(X), 0.0, 100.0)
+                return self._batch(scores, X, confidence=0.85)  # TODO: calibration
+            except Exception as e:
+                logger.error(f"Error en predicción compilada: {e}. Fallback a heurística.")
+        elif self._model is not None:
+            try:
+                Xs = self._scaler.transform(X) if self._scaler else X
+                scores = np.clip(self._model.predict(Xs), 0.0, 100.0)
+                return self._batch(scores, X, confidence=0.85)  # TODO: calibration
+            except Exception as e:
+                logger.error(f"Error en predicción con modelo: {e}. Fallback a heurística.")
+        return self._heuristic_many(X)
+
+    def _batch(self, scores: np.ndarray, X: np.ndarray, confidence: float) -> "BatchPrediction":
+        signals, reasons = self._interpret_many(scores, X)
+        return BatchPrediction(scores=np.round(scores, 1), signals=signals, reasons=reasons,
+                               confidence=confidence)
+
+    def _heuristic_many(self, X: np.ndarray) -> "BatchPrediction":
         """
-        Heurística basada en reglas cuando no hay modelo entrenado.
+        Heurística basada en reglas cuando no hay modelo entrenado, vectorizada.
         Sirve como baseline y como fallback de producción.
         """
-        score = 50.0  # base neutral
+        cut, days_since_min, price_ratio, _, _, _, month, days_since_sale, sale_freq, trend = X.T
 
-        cut = features.get("current_discount_pct", 0)
-        max_cut = features.get("max_historical_discount", 0)
-        price_ratio = features.get("price_vs_avg_ratio", 1.0)
-        days_since_min = features.get("days_since_min_price", 365)
-        days_since_sale = features.get("days_since_last_sale", 9999)
-        sale_freq = features.get("sale_frequency", 0)
-        month = features.get("current_month", 6)
-        trend = features.get("price_trend_slope", 0)
+        score = np.full(len(X), 50.0)  # base neutral
 
         # Descuento actual
-        if cut >= 75:
-            score += 35
-        elif cut >= 50:
-            score += 25
-        elif cut >= 25:
-            score += 12
-        elif cut > 0:
-            score += 5
+        score += np.select([cut >= 75, cut >= 50, cut >= 25, cut > 0], [35, 25, 12, 5], 0)
 
         # Precio actual vs promedio
-        if price_ratio < 0.6:
-            score += 15
-        elif price_ratio < 0.8:
-            score += 8
-        elif price_ratio > 1.1:
-            score -= 8
+        score += np.select([price_ratio < 0.6, price_ratio < 0.8, price_ratio > 1.1], [15, 8, -8], 0)
 
         # Proximidad al mínimo histórico
-        if days_since_min < 30:
-            score += 20
-        elif days_since_min < 90:
-            score += 10
+        score += np.select([days_since_min < 30, days_since_min < 90], [20, 10], 0)
 
         # Hace cuánto fue la última sale (si es inminente, esperar)
-        if days_since_sale < 14:
-            score -= 5   # acaba de estar en sale
-        elif days_since_sale > 300 and sale_freq > 0.2:
-            score += 10  # lleva mucho sin sale, pronto habrá una
+        score += np.select([days_since_sale < 14,                        # acaba de estar en sale
+                            (days_since_sale > 300) & (sale_freq > 0.2)],  # pronto habrá una
+                           [-5, 10], 0)
 
-        # Temporadas de ventas
-        if month in (11, 12):  # Q4 / Black Friday / Winter Sale
-            score += 8
-        elif month in (6, 7):  # Steam Summer Sale
-            score += 6
+        # Temporadas de ventas: Q4 / Black Friday / Winter Sale, Steam Summer Sale
+        score += np.select([np.isin(month, (11, 12)), np.isin(month, (6, 7))], [8, 6], 0)
 
         # Tendencia bajista
-        if trend < -0.01:
-            score += 5
-        elif trend > 0.01:
-            score -= 5
+        score += np.select([trend < -0.01, trend > 0.01], [5, -5], 0)
 
-        score = max(0.0, min(100.0, score))
-        signal, reason = self._interpret(score, features)
-
-        return PredictionResult(
-            score=round(score, 1),
-            signal=signal,
-            reason=reason,
-            confidence=0.6,  # heurística = menor confianza
-            features_used=features,
-        )
+        # heurística = menor confianza
+        return self._batch(np.clip(score, 0.0, 100.0), X, confidence=0.6)
 
     @staticmethod
-    def _interpret(score: float, features: dict) -> tuple[str, str]:
-        """Convierte el score numérico a señal + razón legible."""
-        cut = features.get("current_discount_pct", 0)
-        month = features.get("current_month", 6)
-
-        if score >= 75:
-            signal = "BUY"
-            if cut >= 50:
-                reason = f"Descuento del {cut}% — precio cercano a su mínimo histórico."
-            else:
-                reason = "Múltiples indicadores sugieren este es un buen momento de compra."
-        elif score >= 55:
-            signal = "BUY"
-            reason = "Las condiciones son favorables. Probablemente no habrá un mejor precio pronto."
-        elif score >= 40:
-            signal = "WAIT"
-            if month in (10, 11):
-                reason = "Espera unos días — la temporada de rebajas de fin de año está cerca."
-            else:
-                reason = "El precio está cerca del promedio. Podrías obtenerlo más barato."
-        else:
-            signal = "WAIT"
-            if cut == 0:
-                reason = "El juego no está en rebaja. Históricamente suele tener mejores descuentos."
-            else:
-                reason = "Este descuento es menor que los descuentos históricos típicos."
-
-        return signal, reason
-
-
-# ── Singleton ─────────────────────────────────────────────────────────────────
+    def _interpret_many(scores: np.ndarray, X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Convierte los scores a señal + razón legible (vectorizado)."""
+        cut = X[:, FEATURE_INDEX["current_discount_pct"]]
+        month = X[:, FEATURE_INDEX["current_month"]]
+
+        signals = np.where(scores >= 55, "BUY", "WAIT")
+        # De menor a mayor prioridad: cada regla pisa a las anteriores
+        reasons = np.full(len(scores), "Este descuento es menor que los descuentos históricos típicos.",
+                          dtype=object)
+        reasons[cut == 0] = "El juego no está en rebaja. Históricamente suele tener mejores descuentos."
+        reasons[scores >= 40] = "El precio está cerca del promedio. Podrías obtenerlo más barato."
+        reasons[(scores >= 40) & ((month == 10) | (month == 11))] = \
+            "Espera unos días — la temporada de rebajas de fin de año está cerca."
+        reasons[scores >= 55] = "Las condiciones son favorables. Probablemente no habrá un mejor precio pronto."
+        reasons[scores >= 75] = "Múltiples indicadores sugieren este es un buen momento de compra."
+        top = np.flatnonzero((scores >= 75) & (cut >= 50))
+        reasons[top] = [f"Descuento del {c}% — precio cercano a su mínimo histórico."
+                        for c in cut[top].astype(int)]
+        return signals, reasons
+
+
+# ── Versión activa ────────────────────────────────────────────────────────────
 
 _model_instance: Optional[SteamPriceModel] = None
+_swap_lock = threading.Lock()
+
+
+def _load_active() -> SteamPriceModel:
+    version = registry.current_version()
+    if version:
+        return SteamPriceModel(registry.version_path(version), version)
+    # Artefacto previo al versionado: compiled/ o model.joblib sueltos en la raíz
+    root = registry.artifacts_dir()
+    if os.path.exists(os.path.join(root, "model.joblib")) or os.path.isdir(os.path.join(root, "compiled")):
+        return SteamPriceModel(root)
+    logger.warning(
+        f"Modelo no encontrado en {root}. "
+        "Usando heurística de fallback. Ejecuta train.py para entrenar."
+    )
+    return SteamPriceModel()
 
 
 def get_model() -> SteamPriceModel:
     global _model_instance
     if _model_instance is None:
-        _model_instance = SteamPriceModel()
+        with _swap_lock:
+            if _model_instance is None:
+                _model_instance = _load_active()
     return _model_instance
+
+
+def activate_model(version: str) -> SteamPriceModel:
+    """
+    Carga `version` completa (bloqueante: llamar en un thread) y solo si
+    carga bien la marca en CURRENT y reemplaza la referencia activa.
+    Si falla, sigue activa la versión anterior.
+    """
+    global _model_instance
+    if version not in registry.list_versions():
+        raise ValueError(f"Versión de modelo desconocida: {version}")
+    with _swap_lock:
+        model = SteamPriceModel(registry.version_path(version), version, strict=True)
+        registry.set_current(version)
+        _model_instance = model
+    logger.info(f"Modelo {version} activo (carga en {model.load_seconds}s)")
+    return model
+
+
+def rollback_model(version: Optional[str] = None) -> SteamPriceModel:
+    """Activa `version` o, por defecto, la publicada antes de la activa."""
+    target = version or registry.previous_version()
+    if not target:
+        raise ValueError("No hay una versión anterior del modelo")
+    return activate_model(target)
+
+
+def model_status() -> dict:
+    model = get_model()
+    return {
+        "status":       "heuristic" if model.kind == "heuristic" else "trained",
+        "kind":         model.kind,
+        "version":      model.version,
+        "loaded_at":    model.loaded_at,
+        "load_seconds": model.load_seconds,
+        "metrics":      model.manifest.get("metrics"),
+        "versions":     registry.list_versions(),
+    }
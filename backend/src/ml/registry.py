@@ -0,0 +1,123 @@
+"""
+src/ml/registry.py
+==================
+Artefactos del modelo versionados en MODEL_ARTIFACTS_DIR:
+
+  versions/<UTC timestamp>/model.joblib     modelo sklearn (verificación / fallback)
+  versions/<UTC timestamp>/compiled/        arrays NumPy que usa la API (src/ml/compiled.py)
+  versions/<UTC timestamp>/manifest.json    métricas, FEATURE_ORDER, parámetros del dataset
+  CURRENT                                   nombre de la versión activa
+
+train.py escribe cada versión en un directorio temporal y la publica con
+os.replace; después reescribe CURRENT también con os.replace. Un crash a
+mitad de entrenamiento nunca deja una versión incompleta ni un CURRENT
+apuntando a ella. Rollback = apuntar CURRENT a una versión anterior.
+"""
+
+import datetime as dt
+import json
+import logging
+import os
+import shutil
+from typing import Optional
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+CURRENT = "CURRENT"
+
+
+def artifacts_dir(root: Optional[str] = None) -> str:
+    """MODEL_ARTIFACTS_DIR, salvo que se pase otra raíz."""
+    return root or get_settings().model_artifacts_dir
+
+
+def version_path(version: str, root: Optional[str] = None) -> str:
+    return os.path.join(artifacts_dir(root), "versions", version)
+
+
+def new_version(root: Optional[str] = None) -> tuple[str, str]:
+    """Nombre de una versión nueva y su directorio temporal (vacío) de trabajo."""
+    version = dt.datetime.now(dt.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    while os.path.exists(version_path(version, root)):
+        version += "_"
+    tmp = version_path(version, root) + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    return version, tmp
+
+
+def publish(version: str, tmp: str, manifest: dict, root: Optional[str] = None,
+            activate: bool = True) -> str:
+    """Escribe el manifest, renombra tmp → versions/<version> y opcionalmente la activa."""
+    manifest = {"version": version,
+                "created_at": dt.datetime.now(dt.timezone.utc).isoformat(), **manifest}
+    with open(os.path.join(tmp, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    final = version_path(version, root)
+    os.replace(tmp, final)
+    logger.info(f"Versión de modelo publicada: {version}")
+    if activate:
+        set_current(version, root)
+    prune(root)
+    return final
+
+
+def read_manifest(version: str, root: Optional[str] = None) -> Optional[dict]:
+    try:
+        with open(os.path.join(version_path(version, root), MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def list_versions(root: Optional[str] = None) -> list[str]:
+    """Versiones publicadas (con manifest), de la más vieja a la más nueva."""
+    base = os.path.join(artifacts_dir(root), "versions")
+    if not os.path.isdir(base):
+        return []
+    return sorted(v for v in os.listdir(base)
+                  if os.path.isfile(os.path.join(base, v, MANIFEST)))
+
+
+def current_version(root: Optional[str] = None) -> Optional[str]:
+    try:
+        with open(os.path.join(artifacts_dir(root), CURRENT)) as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    return version if version in list_versions(root) else None
+
+
+def set_current(version: str, root: Optional[str] = None):
+    """Activa una versión publicada: reescribe CURRENT de forma atómica."""
+    if version not in list_versions(root):
+        raise ValueError(f"Versión de modelo desconocida: {version}")
+    path = os.path.join(artifacts_dir(root), CURRENT)
+    with open(path + ".tmp", "w") as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+    logger.info(f"Versión de modelo activa: {version}")
+
+
+def previous_version(root: Optional[str] = None) -> Optional[str]:
+    """La versión publicada inmediatamente anterior a la activa."""
+    versions, current = list_versions(root), current_version(root)
+    if current not in versions:
+        return versions[-1] if versions else None
+    idx = versions.index(current)
+    return versions[idx - 1] if idx > 0 else None
+
+
+def prune(root: Optional[str] = None, keep: Optional[int] = None):
+    """Borra las versiones más viejas, conservando MODEL_KEEP_VERSIONS y la activa."""
+    keep = keep or get_settings().model_keep_versions
+    current = current_version(root)
+    for version in list_versions(root)[:-keep]:
+        if version != current:
+            shutil.rmtree(version_path(version, root), ignore_errors=True)
+            logger.info(f"Versión de modelo eliminada: {version}")
@@ -5,79 +5,77 @@ Script standalone para entrenar/reentrenar el modelo ML.
 
 Uso:
   python -m src.ml.train --db ./data/steamsense.duckdb
+  python -m src.ml.train --snapshot ./data/snapshots/<nombre> --progress
 
-Lee datos de DuckDB, construye features para todos los juegos,
-entrena un modelo de regresión y serializa en artifacts/model.joblib.
+Arma el dataset point-in-time (src/ml/dataset.py) desde DuckDB, entrena un
+modelo de regresión sobre el label forward-looking y lo publica como una
+versión nueva en MODEL_ARTIFACTS_DIR (src/ml/registry.py): model.joblib, la
+versión compilada a arrays NumPy que usa la API (src/ml/compiled.py) y un
+manifest con métricas y FEATURE_ORDER. Por defecto la activa (CURRENT).
+
+Con la API corriendo, el archivo DuckDB está lockeado: el job "train"
+(POST /sync/train) exporta un snapshot Parquet y lanza este script como
+proceso aparte con --snapshot --progress --no-activate. El avance sale por
+stdout como líneas JSON ({"stage", "done", "total"}, y al final {"result"} o
+{"error"}); la API carga la versión nueva y solo entonces la activa.
 
 Requiere scikit-learn y joblib (incluidos en requirements.txt).
 """
 
 import argparse
+import json
 import logging
 import os
+import shutil
 import sys
+from typing import Callable, Optional
+
+from src.ml.dataset import DEFAULT_HORIZON_DAYS, DEFAULT_INTERVAL_DAYS
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger("train")
 
+STAGES = ("dataset", "fit", "evaluate", "save")
 
-def train(db_path: str, output_path: str):
-    import duckdb
-    import numpy as np
+Progress = Callable[[str, int, int], None]
+
+
+def train_with_connection(con, artifacts_dir: Optional[str] = None,
+                          interval_days: int = DEFAULT_INTERVAL_DAYS,
+                          horizon_days: int = DEFAULT_HORIZON_DAYS,
+                          progress: Optional[Progress] = None,
+                          activate: bool = True) -> dict:
+    """
+    Entrena con una conexión DuckDB ya abierta (archivo o snapshot) y publica
+    el artefacto como una versión nueva (src/ml/registry.py), activándola si
+    activate=True. progress(stage, done, total) se llama al terminar cada
+    etapa de STAGES.
+    Lanza ValueError si no hay muestras suficientes.
+    """
     import joblib
     from sklearn.ensemble import GradientBoostingRegressor
     from sklearn.preprocessing import StandardScaler
     from sklearn.model_selection import train_test_split
     from sklearn.metrics import mean_absolute_error, r2_score
 
-    from src.ml.features import build_features, features_to_vector
-    from src.db import queries
-
-    logger.info(f"Conectando a DuckDB: {db_path}")
-    con = duckdb.connect(db_path)
-
-    # Obtener todos los game_ids que tienen historial
-    games = con.execute("""
-        SELECT DISTINCT game_id FROM price_history
-        GROUP BY game_id HAVING COUNT(*) >= 10
-    """).fetchdf()
-
-    logger.info(f"Juegos con historial suficiente: {len(games)}")
-
-    X_rows = []
-    y_rows = []
+    from src.ml import registry
+    from src.ml.compiled import export_compiled
+    from src.ml.dataset import build_dataset
+    from src.ml.features import FEATURE_ORDER
 
-    for game_id in games["game_id"]:
-        try:
-            stats = queries.get_price_stats(con, game_id)
-            history = queries.get_price_history(con, game_id)
-            seasonal = queries.get_seasonal_patterns(con, game_id)
+    def step(stage: str):
+        if progress:
+            progress(stage, STAGES.index(stage) + 1, len(STAGES))
 
-            if not stats or not history:
-                continue
+    # Muestras point-in-time con label forward-looking (ver src/ml/dataset.py)
+    data = build_dataset(con, interval_days, horizon_days)
+    step("dataset")
+    if len(data) < 20:
+        raise ValueError(f"Datos insuficientes para entrenar ({len(data)} muestras). "
+                         f"Necesitas más datos en DuckDB.")
 
-            # El "label" es el descuento máximo que tuvo el juego
-            # (proxy de qué tan bien le fue comprando en ese momento)
-            max_cut = float(stats.get("max_discount") or 0)
-
-            # Simular features en diferentes puntos del tiempo (data augmentation)
-            for i in range(len(history) - 1, max(len(history) - 10, 0), -2):
-                partial_history = history[:i+1]
-                feats = build_features(stats, partial_history, seasonal)
-                if feats:
-                    X_rows.append(features_to_vector(feats))
-                    y_rows.append(max_cut)
-
-        except Exception as e:
-            logger.warning(f"Error procesando {game_id}: {e}")
-            continue
-
-    if len(X_rows) < 20:
-        logger.error(f"Datos insuficientes para entrenar ({len(X_rows)} muestras). Necesitas más datos en DuckDB.")
-        sys.exit(1)
-
-    X = np.array(X_rows)
-    y = np.array(y_rows)
+    X = data[FEATURE_ORDER].to_numpy(dtype=float)
+    y = data["label"].to_numpy(dtype=float)
 
     logger.info(f"Dataset: {X.shape[0]} muestras, {X.shape[1]} features")
 
@@ -95,25 +93,80 @@ def train(db_path: str, output_path: str):
         random_state=42,
     )
     model.fit(X_train_scaled, y_train)
+    step("fit")
 
     preds = model.predict(X_test_scaled)
     mae = mean_absolute_error(y_test, preds)
     r2 = r2_score(y_test, preds)
 
     logger.info(f"MAE: {mae:.2f}  |  R²: {r2:.4f}")
+    step("evaluate")
+
+    metrics = {"samples": int(X.shape[0]), "mae": round(float(mae), 4), "r2": round(float(r2), 4)}
+    version, tmp = registry.new_version(artifacts_dir)
+    try:
+        joblib.dump({"model": model, "scaler": scaler}, os.path.join(tmp, "model.joblib"))
+        export_compiled(model, scaler, os.path.join(tmp, "compiled"))
+        path = registry.publish(version, tmp, {
+            "metrics":       metrics,
+            "feature_order": FEATURE_ORDER,
+            "dataset":       {"interval_days": interval_days, "horizon_days": horizon_days},
+            "params":        {k: model.get_params()[k]
+                              for k in ("n_estimators", "max_depth", "learning_rate", "random_state")},
+        }, artifacts_dir, activate=activate)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    logger.info(f"Modelo guardado en: {path}")
+    step("save")
+
+    return {"version": version, **metrics}
+
+
+def _emit(**msg):
+    """Una línea JSON por stdout para el proceso padre (--progress)."""
+    print(json.dumps(msg), flush=True)
+
+
+def train(db_path: Optional[str], artifacts_dir: Optional[str] = None,
+          interval_days: int = DEFAULT_INTERVAL_DAYS, horizon_days: int = DEFAULT_HORIZON_DAYS,
+          snapshot: Optional[str] = None, report: bool = False, activate: bool = True):
+    import duckdb
 
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    joblib.dump({"model": model, "scaler": scaler}, output_path)
-    logger.info(f"Modelo guardado en: {output_path}")
-
-    con.close()
+    if snapshot:
+        from src.tools.snapshot import open_snapshot
+        logger.info(f"Leyendo snapshot: {snapshot}")
+        con = open_snapshot(snapshot)
+    else:
+        logger.info(f"Conectando a DuckDB (solo lectura): {db_path}")
+        con = duckdb.connect(db_path, read_only=True)
+    progress = (lambda stage, done, total: _emit(stage=stage, done=done, total=total)) if report else None
+    try:
+        metrics = train_with_connection(con, artifacts_dir, interval_days, horizon_days,
+                                        progress, activate)
+    except ValueError as e:
+        logger.error(str(e))
+        if report:
+            _emit(error=str(e))
+        sys.exit(1)
+    finally:
+        con.close()
+    if report:
+        _emit(result=metrics)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--db", default="./data/steamsense.duckdb")
-    parser.add_argument("--output", default=os.path.join(
-        os.path.dirname(__file__), "artifacts", "model.joblib"
-    ))
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--db", default="./data/steamsense.duckdb")
+    source.add_argument("--snapshot", help="Directorio de un snapshot Parquet (src/tools/snapshot.py)")
+    parser.add_argument("--artifacts-dir", help="Raíz de versiones (default: MODEL_ARTIFACTS_DIR)")
+    parser.add_argument("--no-activate", action="store_true",
+                        help="Publica la versión sin apuntar CURRENT a ella")
+    parser.add_argument("--interval-days", type=int, default=DEFAULT_INTERVAL_DAYS)
+    parser.add_argument("--horizon-days", type=int, default=DEFAULT_HORIZON_DAYS)
+    parser.add_argument("--progress", action="store_true",
+                        help="Reporta el avance como líneas JSON por stdout")
     args = parser.parse_args()
-    train(args.db, args.output)
+    train(args.db, args.artifacts_dir, args.interval_days, args.horizon_days,
+          snapshot=args.snapshot, report=args.progress, activate=not args.no_activate)
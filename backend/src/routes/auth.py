@@ -8,6 +8,7 @@ import os
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import RedirectResponse
 from config import get_settings
+from src.api.circuit import CircuitOpenError
 from src.api.steam_auth import get_openid_redirect_url, verify_openid_response, create_jwt
 from src.api.steam_client import get_steam_client
 from src.db.connection import get_db
@@ -42,14 +43,20 @@ async def steam_callback(request: Request):
     Verificamos la identidad, obtenemos el perfil y emitimos un JWT.
     """
     params = dict(request.query_params)
-    steam_id = await verify_openid_response(params)
+    try:
+        steam_id = await verify_openid_response(params)
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="Steam no está disponible, intenta en unos minutos")
 
     if not steam_id:
         raise HTTPException(status_code=401, detail="Steam authentication failed")
 
-    # Obtener perfil de Steam
+    # Obtener perfil de Steam — si la Web API está caída seguimos con datos mínimos
     steam = get_steam_client()
-    profile = await steam.get_player_summary(steam_id)
+    try:
+        profile = await steam.get_player_summary(steam_id)
+    except CircuitOpenError:
+        profile = None
 
     display_name = profile.get("personaname", f"User {steam_id}") if profile else f"User {steam_id}"
     avatar_url   = profile.get("avatarfull", "") if profile else ""
@@ -5,7 +5,10 @@ import logging
 from fastapi import APIRouter, HTTPException, Query
 from src.db.connection import get_db
 from src.db import queries
+from src.api.circuit import CircuitOpenError
 from src.api.client import ITADClient
+from src.services import refresh_scheduler
+from src.services.current_price_service import get_current_price_service
 from config import get_settings
 
 logger = logging.getLogger(__name__)
@@ -43,6 +46,12 @@ async def search_games(q: str, limit: int = Query(20, ge=1, le=50)):
             })
         return enriched
 
+    except CircuitOpenError:
+        # ITAD caído: búsqueda degradada sobre los juegos que ya tenemos
+        logger.info(f"Search degradada (circuito ITAD abierto): {q!r}")
+        con = get_db()
+        return [{**g, "type": "game"} for g in queries.search_games_local(con, q.strip(), limit)]
+
     except Exception as e:
         logger.error(f"Search error: {e}")
         return []
@@ -54,12 +63,38 @@ def list_games(limit: int = Query(50, ge=1, le=200), offset: int = Query(0, ge=0
     return {"games": queries.list_games(con, limit=limit, offset=offset)}
 
 
+@router.get("/current-prices")
+async def get_current_prices_bulk(ids: str = Query(..., description="game_ids separados por coma")):
+    """
+    Precios actuales de varios juegos (p.ej. una página de wishlist) en una
+    sola llamada a prices/v3. Declarado antes de /{game_id} para no colisionar.
+    """
+    game_ids = [i.strip() for i in ids.split(",") if i.strip()]
+    if not game_ids:
+        return {"prices": {}}
+    if len(game_ids) > settings.current_price_batch_max:
+        raise HTTPException(status_code=400,
+                            detail=f"Máximo {settings.current_price_batch_max} ids por request")
+    try:
+        return {"prices": await get_current_price_service().get_many(game_ids)}
+
+    except CircuitOpenError:
+        logger.info(f"current-prices bulk degradado (circuito ITAD abierto), {len(game_ids)} ids")
+        return {"prices": {gid: _degraded_prices(gid)["prices"] for gid in game_ids},
+                "degraded": True}
+
+    except Exception as e:
+        logger.error(f"current-prices bulk error: {e}")
+        return {"prices": {gid: [] for gid in game_ids}}
+
+
 @router.get("/{game_id}")
 def get_game(game_id: str):
     con = get_db()
     game = queries.get_game(con, game_id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
+    refresh_scheduler.record_view(game_id)
     stats    = queries.get_price_stats(con, game_id)
     seasonal = queries.get_seasonal_patterns(con, game_id)
     return {
@@ -72,45 +107,34 @@ def get_game(game_id: str):
     }
 
 
+def _degraded_prices(game_id: str) -> dict:
+    """Último precio de Steam conocido en DB, para cuando ITAD no responde."""
+    latest = queries.get_latest_price(get_db(), game_id)
+    prices = []
+    if latest:
+        prices.append({
+            "shop_name":   latest["shop_name"],
+            "shop_id":     latest["shop_id"],
+            "price_usd":   latest["price_usd"],
+            "regular_usd": latest["regular_usd"],
+            "cut_pct":     latest["cut_pct"],
+            "url":         "",
+            "drm":         [],
+            "as_of":       latest["timestamp"],
+        })
+    return {"game_id": game_id, "prices": prices, "degraded": True}
+
+
 @router.get("/{game_id}/current-prices")
 async def get_current_prices(game_id: str):
-    """Precios actuales de todas las tiendas vía ITAD."""
+    """Precios actuales de todas las tiendas vía ITAD (cache corto + batching)."""
     try:
-        async with ITADClient(settings.itad_api_key) as client:
-            import httpx
-            async with httpx.AsyncClient(timeout=15) as http:
-                r = await http.post(
-                    f"{settings.itad_base_url}/games/prices/v3",
-                    params={"country": settings.itad_country},
-                    json=[game_id],
-                    headers={
-                        "Authorization": f"Bearer {settings.itad_api_key}",
-                        "Content-Type": "application/json",
-                    }
-                )
-                if r.status_code != 200:
-                    logger.warning(f"ITAD prices/v3 HTTP {r.status_code}: {r.text[:200]}")
-                    return {"game_id": game_id, "prices": []}
-                data = r.json()
-
-            prices = []
-            items = data if isinstance(data, list) else data.get("list", [])
-            for item in items:
-                for deal in item.get("deals", []):
-                    shop        = deal.get("shop", {})
-                    price_obj   = deal.get("price", {})
-                    regular_obj = deal.get("regular", {})
-                    prices.append({
-                        "shop_name":   shop.get("name", "Unknown"),
-                        "shop_id":     shop.get("id"),
-                        "price_usd":   price_obj.get("amount", 0),
-                        "regular_usd": regular_obj.get("amount", 0),
-                        "cut_pct":     deal.get("cut", 0),
-                        "url":         deal.get("url", ""),
-                        "drm":         deal.get("drm", []),
-                    })
-            prices.sort(key=lambda x: x["price_usd"])
-            return {"game_id": game_id, "prices": prices}
+        prices = await get_current_price_service().get(game_id)
+        return {"game_id": game_id, "prices": prices}
+
+    except CircuitOpenError:
+        logger.info(f"current-prices degradado (circuito ITAD abierto) para {game_id}")
+        return _degraded_prices(game_id)
 
     except Exception as e:
         logger.error(f"current-prices error para {game_id}: {e}")
@@ -5,12 +5,17 @@ Endpoints de predicción ML.
 """
 
 from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, Field
 
 from src.services import predict_service
 
 router = APIRouter(prefix="/predict", tags=["predict"])
 
 
+class PredictManyRequest(BaseModel):
+    game_ids: list[str] = Field(..., min_length=1, max_length=1000)
+
+
 @router.get("/{game_id}")
 def predict(
     game_id: str,
@@ -31,6 +36,15 @@ def predict(
         raise HTTPException(status_code=404, detail=str(e))
 
 
+@router.post("/many")
+def predict_many(body: PredictManyRequest):
+    """
+    Predicciones de varios juegos en una llamada: features en una query,
+    scoring vectorizado y un upsert en bloque al cache.
+    """
+    return predict_service.get_predictions_many(body.game_ids)
+
+
 @router.post("/batch")
 def predict_batch(limit: int = Query(100, ge=1, le=500)):
     """
@@ -42,17 +56,9 @@ def predict_batch(limit: int = Query(100, ge=1, le=500)):
 
     con = get_db()
     games = q.list_games(con, limit=limit, offset=0)
-    results = {"ok": 0, "skipped": 0, "errors": 0}
-
-    for game in games:
-        game_id = game["id"]
-        if not game.get("total_records") or game["total_records"] < 3:
-            results["skipped"] += 1
-            continue
-        try:
-            predict_service.get_prediction(game_id, force_refresh=False)
-            results["ok"] += 1
-        except Exception as e:
-            results["errors"] += 1
-
-    return {"status": "done", **results}
+    ids = [g["id"] for g in games if (g.get("total_records") or 0) >= 3]
+    try:
+        feats, _ = predict_service.predict_games(con, ids)
+    except Exception:
+        return {"status": "done", "ok": 0, "skipped": len(games) - len(ids), "errors": len(ids)}
+    return {"status": "done", "ok": len(feats), "skipped": len(games) - len(feats), "errors": 0}
@@ -2,181 +2,226 @@
 src/routes/sync.py
 ==================
 Endpoints para sincronizar datos de precios desde ITAD y SteamSpy.
+
+Las operaciones largas (top, bulk, repair, predictions, train, prices, catalog,
+snapshot) se encolan en la cola durable de jobs: retornan un job_id y el
+progreso se consulta en GET /sync/jobs/{job_id}.
 """
+import asyncio
 import logging
-from fastapi import APIRouter, HTTPException, Query, BackgroundTasks
-from src.services import sync_service
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from src.api.circuit import CircuitOpenError, get_breaker
+from src.db import queries
+from src.db.connection import get_db
+from src.ml.model import model_status, rollback_model
+from src.services import job_service, refresh_scheduler, sync_service
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/sync", tags=["sync"])
 
 
+def _enqueue(kind: str, params: dict, message: str) -> dict:
+    job, deduped = job_service.enqueue(kind, params)
+    return {
+        "status":  job["status"],
+        "job_id":  job["id"],
+        "deduped": deduped,
+        "message": message if not deduped else f"Ya hay un job idéntico activo ({job['id']})",
+        "progress_url": f"/sync/jobs/{job['id']}",
+    }
+
+
+def _unavailable(e: CircuitOpenError) -> HTTPException:
+    """Circuito abierto → 503 con Retry-After hasta el próximo probe."""
+    retry = get_breaker(e.name).retry_after() or 1
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(retry)})
+
+
 @router.post("/game/{appid}")
-async def sync_game_by_appid(appid: int):
+async def sync_game_by_appid(
+    appid: int,
+    full_refresh: bool = Query(False, description="Ignorar high-water mark y bajar todo el historial"),
+):
     """Sincroniza un juego por Steam appid."""
-    result = await sync_service.sync_by_appid(appid)
+    try:
+        result = await sync_service.sync_by_appid(appid, full_refresh=full_refresh)
+    except CircuitOpenError as e:
+        raise _unavailable(e)
     if result["status"] == "not_found":
         raise HTTPException(status_code=404, detail=f"appid {appid} no encontrado en ITAD")
     return result
 
 
 @router.post("/id/{game_id:path}")
-async def sync_game_by_id(game_id: str):
+async def sync_game_by_id(
+    game_id: str,
+    full_refresh: bool = Query(False, description="Ignorar high-water mark y bajar todo el historial"),
+):
     """Sincroniza un juego por ITAD game_id. Llamado desde GameSearch."""
-    result = await sync_service.sync_by_game_id(game_id)
-    return result
+    try:
+        return await sync_service.sync_by_game_id(game_id, full_refresh=full_refresh)
+    except CircuitOpenError as e:
+        raise _unavailable(e)
 
 
 @router.post("/top")
 async def sync_top_games(
-    background_tasks: BackgroundTasks,
     top_n: int = Query(100, ge=10, le=2000),
+    full_refresh: bool = Query(False, description="Backfill: bajar todo el historial de cada juego"),
 ):
     """
     Sincroniza los top N juegos de SteamSpy.
     Para top_n <= 100 usa top100forever.
     Para top_n > 100 combina multiples listas y paginas del catalogo (tarda mas).
+    Por defecto es incremental: solo pide a ITAD lo posterior al último registro de cada juego.
     """
-    background_tasks.add_task(sync_service.sync_top_games, top_n)
-    return {"status": "started", "message": f"Sincronizando hasta {top_n} juegos en segundo plano"}
+    return _enqueue("top", {"top_n": top_n, "full_refresh": full_refresh},
+                    f"Sincronizando hasta {top_n} juegos en segundo plano")
 
 
 @router.post("/bulk")
 async def sync_bulk_games(
-    background_tasks: BackgroundTasks,
     target: int = Query(1000, ge=100, le=2000),
+    full_refresh: bool = Query(False, description="Backfill: bajar todo el historial de cada juego"),
 ):
     """
     Sincroniza hasta `target` juegos usando multiples fuentes de SteamSpy.
     Combina top100forever + top100in2weeks + top100owned + paginas del catalogo completo.
-    Puede tardar 30-60 minutos para 1000 juegos. Ver progreso en los logs del servidor.
-    Despues de terminar, correr POST /sync/predictions para generar BUY/WAIT signals.
+    Puede tardar 30-60 minutos para 1000 juegos; si el proceso se reinicia, el
+    job retoma desde el último batch completado.
+    Al terminar encola el recálculo de predicciones de los juegos que cambiaron.
     """
-    background_tasks.add_task(sync_service.sync_top_games, target)
     return {
-        "status": "started",
+        **_enqueue("bulk", {"target": target, "full_refresh": full_refresh},
+                   f"Sincronizando hasta {target} juegos en background. Puede tardar 30-60 min."),
         "target": target,
-        "message": f"Sincronizando hasta {target} juegos en background. Puede tardar 30-60 min.",
-        "next_step": "Cuando termine: POST /sync/predictions?limit=2000",
+        "next_step": "Al terminar se encola POST /sync/predictions (solo juegos con datos nuevos)",
     }
 
 
+@router.post("/catalog")
+async def refresh_catalog(
+    max_pages: int = Query(10, ge=0, le=100, description="Páginas de `all` (~1000 apps c/u)"),
+):
+    """
+    Refresca catalog_apps desde SteamSpy (listas curadas + páginas del catálogo).
+    /sync/top y /sync/bulk leen de esta tabla en vez de crawlear SteamSpy.
+    """
+    return _enqueue("catalog", {"max_pages": max_pages},
+                    f"Refrescando catálogo SteamSpy ({max_pages} páginas)")
+
+
+@router.post("/prices")
+async def sweep_current_prices(
+    batch_size: int = Query(200, ge=10, le=200, description="ids por request a prices/v3"),
+):
+    """
+    Refresca el precio actual de Steam de todos los juegos trackeados con
+    llamadas batch a prices/v3. Solo agrega precios que cambiaron y marca esos
+    juegos para recalcular su predicción. Mucho más barato que /sync/top.
+    """
+    return _enqueue("prices", {"batch_size": batch_size},
+                    "Sweep de precios actuales en segundo plano")
+
+
 @router.post("/repair")
-async def repair_orphaned_games(background_tasks: BackgroundTasks):
+async def repair_orphaned_games():
     """
     Busca juegos sin titulo real o sin appid y los repara consultando ITAD.
     """
-    background_tasks.add_task(sync_service.repair_orphaned_games)
-    return {
-        "status": "started",
-        "message": "Repairing orphaned games in background. Check logs for progress.",
-    }
+    return _enqueue("repair", {}, "Repairing orphaned games in background.")
 
 
 @router.post("/predictions")
-async def generate_all_predictions(
-    background_tasks: BackgroundTasks,
-    limit: int = Query(200, ge=1, le=2000),
-):
-    """Genera predicciones ML para todos los juegos con historial suficiente."""
-    async def do_batch():
-        from src.db.connection import get_db
-        from src.db import queries
-        from src.services import predict_service
-        con = get_db()
-        games = queries.list_games(con, limit=limit, offset=0)
-        ok = skipped = errors = 0
-        for game in games:
-            if not game.get("total_records") or game["total_records"] < 3:
-                skipped += 1
-                continue
-            try:
-                predict_service.get_prediction(game["id"], force_refresh=False)
-                ok += 1
-            except Exception:
-                errors += 1
-        logger.info(f"Batch predictions done: {ok} ok / {skipped} skipped / {errors} errors")
-
-    background_tasks.add_task(do_batch)
-    return {"status": "started", "message": f"Generating predictions for up to {limit} games"}
+async def generate_all_predictions(limit: Optional[int] = Query(None, ge=1, le=100000)):
+    """
+    Recalcula las predicciones del dirty set: juegos con precios nuevos desde su
+    última predicción o más viejas que PREDICTION_MAX_AGE_HOURS.
+    Los syncs top/bulk ya lo encolan al terminar si insertaron datos.
+    """
+    params = {"limit": limit} if limit else {}
+    return _enqueue("predictions", params,
+                    f"Recalculando predicciones del dirty set (hasta {limit or 'todos'})")
+
+
+@router.post("/snapshot")
+async def export_snapshot():
+    """
+    Exporta un snapshot Parquet consistente de games, price_history,
+    predicciones y tablas de usuario a SNAPSHOT_DIR (ver src/tools/snapshot.py).
+    """
+    return _enqueue("snapshot", {}, "Exportando snapshot Parquet en background.")
 
 
 @router.post("/train")
-async def train_model(background_tasks: BackgroundTasks):
-    """
-    Entrena el modelo ML usando los datos actuales de DuckDB.
-    Usa la conexión existente del backend para evitar conflictos de lock.
-    """
-    async def do_train():
-        import numpy as np
-        import joblib
-        import os
-        from sklearn.ensemble import GradientBoostingRegressor
-        from sklearn.preprocessing import StandardScaler
-        from sklearn.model_selection import train_test_split
-        from sklearn.metrics import mean_absolute_error, r2_score
-        from src.db.connection import get_db
-        from src.db import queries
-        from src.ml.features import build_features, features_to_vector
-
-        con = get_db()
-
-        games = con.execute("""
-            SELECT DISTINCT game_id FROM price_history
-            GROUP BY game_id HAVING COUNT(*) >= 10
-        """).fetchdf()
-
-        logger.info(f"Juegos con historial suficiente: {len(games)}")
-
-        X_rows, y_rows = [], []
-
-        for game_id in games["game_id"]:
-            try:
-                stats    = queries.get_price_stats(con, game_id)
-                history  = queries.get_price_history(con, game_id)
-                seasonal = queries.get_seasonal_patterns(con, game_id)
-                if not stats or not history:
-                    continue
-                max_cut = float(stats.get("max_discount") or 0)
-                for i in range(len(history) - 1, max(len(history) - 10, 0), -2):
-                    feats = build_features(stats, history[:i+1], seasonal)
-                    if feats:
-                        X_rows.append(features_to_vector(feats))
-                        y_rows.append(max_cut)
-            except Exception as e:
-                logger.warning(f"Error procesando {game_id}: {e}")
-
-        if len(X_rows) < 20:
-            logger.error(f"Datos insuficientes: {len(X_rows)} muestras. Necesitas más juegos sincronizados.")
-            return
-
-        X = np.array(X_rows)
-        y = np.array(y_rows)
-
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-        scaler = StandardScaler()
-        X_train_s = scaler.fit_transform(X_train)
-        X_test_s  = scaler.transform(X_test)
-
-        model = GradientBoostingRegressor(n_estimators=200, max_depth=4,
-                                          learning_rate=0.05, random_state=42)
-        model.fit(X_train_s, y_train)
-
-        preds = model.predict(X_test_s)
-        mae = mean_absolute_error(y_test, preds)
-        r2  = r2_score(y_test, preds)
-        logger.info(f"Entrenamiento completo — MAE: {mae:.2f} | R²: {r2:.4f}")
-
-        output_path = os.path.join(os.path.dirname(__file__),
-                                   "..", "ml", "artifacts", "model.joblib")
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        joblib.dump({"model": model, "scaler": scaler}, output_path)
-        logger.info(f"Modelo guardado en {output_path}")
-
-        from src.ml.model import get_model
-        m = get_model()
-        m._load()
-        logger.info("Modelo recargado en memoria ✓")
-
-    background_tasks.add_task(do_train)
-    return {"status": "started", "message": "Entrenando modelo en background. Revisa los logs con: docker logs steamsense-final-backend-1 --follow"}
\ No newline at end of file
+async def train_model():
+    """
+    Entrena el modelo ML con los datos actuales de DuckDB en un proceso aparte
+    (sobre un snapshot Parquet, ver src/ml/train.py) y recarga el modelo al
+    terminar. El progreso por etapa se consulta en GET /sync/jobs/{id}.
+    """
+    return _enqueue("train", {}, "Entrenando modelo en background.")
+
+
+@router.get("/model")
+def model_info():
+    """Versión activa del modelo, cuándo y en cuánto se cargó, y versiones disponibles."""
+    return model_status()
+
+
+@router.post("/model/rollback")
+async def model_rollback(
+    version: Optional[str] = Query(None, description="Versión a activar (default: la anterior a la activa)"),
+):
+    """
+    Vuelve a una versión anterior del modelo: la carga aparte y, si carga
+    bien, la marca como CURRENT y reemplaza la activa sin cortar requests.
+    """
+    try:
+        await asyncio.to_thread(rollback_model, version)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        # La versión no cargó: sigue activa la anterior
+        raise HTTPException(status_code=409, detail=f"No se pudo cargar la versión: {e}")
+    return model_status()
+
+
+@router.get("/schedule")
+def refresh_schedule(
+    limit: int = Query(50, ge=1, le=500),
+    overdue_only: bool = Query(False),
+):
+    """Cola del scheduler de refresh: juegos ordenados por próximo refresh, con su demanda."""
+    return {"stats": refresh_scheduler.stats(),
+            "games": refresh_scheduler.get_schedule(limit, overdue_only)}
+
+
+# ── Jobs ──────────────────────────────────────────────────────────────────────
+
+@router.get("/jobs")
+def list_jobs(
+    limit: int = Query(20, ge=1, le=200),
+    status: Optional[str] = Query(None, description="queued|running|done|failed|cancelled"),
+):
+    return {"jobs": [job_service.describe(j) for j in queries.list_jobs(get_db(), limit, status)]}
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Estado, progreso, throughput y ETA de un job."""
+    job = queries.get_job(get_db(), job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_service.describe(job)
+
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """Cancela un job en cola, o pide a uno corriendo que pare en su próximo checkpoint."""
+    job = job_service.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_service.describe(job)
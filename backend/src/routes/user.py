@@ -6,6 +6,7 @@ Endpoints del usuario autenticado: librería, wishlist, recomendaciones.
 FIXES sobre el original:
   - Wishlist: detecta perfil privado y retorna sync_meta con feedback
   - Library sync background: genera predicciones post-sync
+  - Wishlist sync: precios de todos los items en un job (ver /me/wishlist/sync-status)
 """
 import logging
 from fastapi import APIRouter, HTTPException, Request, BackgroundTasks
@@ -13,7 +14,7 @@ from src.api.steam_auth import decode_jwt
 from src.api.steam_client import get_steam_client, _get_key
 from src.db.connection import get_db
 from src.db import user_queries
-from src.services import sync_service
+from src.services import job_service
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/me", tags=["user"])
@@ -44,9 +45,10 @@ async def get_library(request: Request, sync: bool = False):
     if sync:
         try:
             steam = get_steam_client()
-            games = await steam.get_owned_games(steam_id)
-            if games:
-                n = user_queries.sync_user_library(con, steam_id, games)
+            n = 0
+            async for chunk in steam.iter_owned_games(steam_id):
+                n += user_queries.sync_user_library(con, steam_id, chunk)
+            if n:
                 logger.info(f"Sync directo: {n} juegos para {steam_id}")
             else:
                 logger.warning(f"get_owned_games retornó 0 juegos para {steam_id}")
@@ -67,9 +69,10 @@ async def sync_library(request: Request, background_tasks: BackgroundTasks):
         try:
             con = get_db()
             steam = get_steam_client()
-            games = await steam.get_owned_games(steam_id)
-            if games:
-                n = user_queries.sync_user_library(con, steam_id, games)
+            n = 0
+            async for chunk in steam.iter_owned_games(steam_id):
+                n += user_queries.sync_user_library(con, steam_id, chunk)
+            if n:
                 logger.info(f"Background sync OK: {n} juegos para {steam_id}")
                 # FIX: generar predicciones para juegos del usuario que ya tienen historial
                 await _generate_predictions_for_user(con, steam_id)
@@ -87,15 +90,10 @@ async def _generate_predictions_for_user(con, steam_id: str):
     try:
         from src.services import predict_service
         library = user_queries.get_user_library(con, steam_id)
-        ok = 0
-        for g in library:
-            if g.get("game_id") and g.get("total_records", 0) >= 3:
-                try:
-                    predict_service.get_prediction(g["game_id"], force_refresh=False)
-                    ok += 1
-                except Exception:
-                    pass
-        logger.info(f"Predicciones generadas para {ok} juegos de {steam_id}")
+        ids = [g["game_id"] for g in library
+               if g.get("game_id") and g.get("total_records", 0) >= 3]
+        feats, _ = predict_service.predict_games(con, ids)
+        logger.info(f"Predicciones generadas para {len(feats)} juegos de {steam_id}")
     except Exception as e:
         logger.warning(f"Error generando predicciones post-sync: {e}")
 
@@ -144,23 +142,12 @@ async def get_wishlist(request: Request, sync: bool = False):
                 sync_meta["synced"] = True
                 logger.info(f"Wishlist Steam: {len(items)} items, {n_imported} importados para {steam_id}")
 
-                # Sync precio + predicción para top 15 items
-                synced = 0
-                for item in items[:15]:
-                    if item.get("appid"):
-                        try:
-                            result = await sync_service.sync_by_appid(item["appid"])
-                            if result.get("inserted", 0) > 0:
-                                synced += 1
-                                from src.services import predict_service
-                                if result.get("game_id"):
-                                    try:
-                                        predict_service.get_prediction(result["game_id"], force_refresh=True)
-                                    except Exception:
-                                        pass
-                        except Exception as e:
-                            logger.debug(f"Wishlist item sync error appid={item['appid']}: {e}")
-                logger.info(f"Wishlist ITAD sync: {synced} juegos con datos nuevos")
+                # Precio + predicción de toda la wishlist en un job en background
+                # (carril interactive: no espera detrás de top/bulk); la respuesta
+                # sale ya con lo que haya en DB
+                job, _ = job_service.enqueue("wishlist", {"steam_id": steam_id})
+                sync_meta["job_id"] = job["id"]
+                sync_meta["status_url"] = "/me/wishlist/sync-status"
 
         except Exception as e:
             logger.error(f"Error sync wishlist: {e}")
@@ -170,6 +157,16 @@ async def get_wishlist(request: Request, sync: bool = False):
     return {"steam_id": steam_id, "wishlist": wishlist, "sync_meta": sync_meta}
 
 
+@router.get("/wishlist/sync-status")
+def get_wishlist_sync_status(request: Request):
+    """Progreso del último sync de precios de la wishlist (GET /me/wishlist?sync=true)."""
+    steam_id = _get_steam_id(request)
+    job = job_service.latest("wishlist", {"steam_id": steam_id})
+    if not job:
+        return {"steam_id": steam_id, "status": "idle", "job": None}
+    return {"steam_id": steam_id, "status": job["status"], "job": job_service.describe(job)}
+
+
 @router.get("/recommendations")
 def get_recommendations(request: Request, limit: int = 12):
     steam_id = _get_steam_id(request)
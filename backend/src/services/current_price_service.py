@@ -0,0 +1,145 @@
+"""
+src/services/current_price_service.py
+======================================
+Precios actuales multi-tienda (ITAD prices/v3) con cache de TTL corto y
+micro-batching.
+
+  - Cada game_id se cachea en memoria CURRENT_PRICE_TTL_SECONDS: una página
+    popular cuesta una llamada al upstream por TTL, no una por visita
+  - Los ids pedidos dentro de una ventana corta (CURRENT_PRICE_BATCH_WINDOW_MS)
+    se juntan en un solo POST a prices/v3, hasta CURRENT_PRICE_BATCH_MAX ids
+  - Un id ya pendiente no se vuelve a pedir: los callers comparten el future
+
+Lo usan /games/{id}/current-prices y el endpoint bulk /games/current-prices.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from config import get_settings
+from src.api.client import get_client
+
+logger = logging.getLogger(__name__)
+
+
+class CurrentPriceService:
+    def __init__(self, ttl_seconds: float, window_seconds: float, max_batch: int):
+        self._ttl = ttl_seconds
+        self._window = window_seconds
+        self._max_batch = max_batch
+        self._cache: dict[str, tuple[float, list[dict]]] = {}   # id → (expires_at, deals)
+        self._pending: dict[str, asyncio.Future] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._requests = 0
+        self._hits = 0
+        self._upstream_calls = 0
+        self._upstream_ids = 0
+
+    async def get_many(self, game_ids: list[str]) -> dict[str, list[dict]]:
+        """
+        Precios actuales de varios juegos. Sirve desde cache lo vigente y
+        encola el resto en el próximo batch. Propaga CircuitOpenError si ITAD
+        está caído (el caller decide la respuesta degradada).
+        """
+        now = time.monotonic()
+        out: dict[str, list[dict]] = {}
+        waiting: dict[str, asyncio.Future] = {}
+        loop = asyncio.get_running_loop()
+
+        for gid in dict.fromkeys(game_ids):
+            self._requests += 1
+            cached = self._cache.get(gid)
+            if cached and cached[0] > now:
+                self._hits += 1
+                out[gid] = cached[1]
+                continue
+            fut = self._pending.get(gid)
+            if fut is None:
+                fut = loop.create_future()
+                self._pending[gid] = fut
+            waiting[gid] = fut
+
+        if waiting:
+            if len(self._pending) >= self._max_batch:
+                asyncio.create_task(self._flush())
+            elif self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self._flush_later())
+            results = await asyncio.gather(*(asyncio.shield(f) for f in waiting.values()))
+            out.update(zip(waiting.keys(), results))
+        return out
+
+    async def get(self, game_id: str) -> list[dict]:
+        return (await self.get_many([game_id]))[game_id]
+
+    async def _flush_later(self):
+        await asyncio.sleep(self._window)
+        await self._flush()
+
+    async def _flush(self):
+        """Envía los ids pendientes en POSTs de hasta max_batch ids."""
+        while self._pending:
+            batch = dict(list(self._pending.items())[:self._max_batch])
+            for gid in batch:
+                del self._pending[gid]
+            self._upstream_calls += 1
+            self._upstream_ids += len(batch)
+            try:
+                prices = await get_client().get_current_prices(list(batch))
+            except Exception as e:
+                for fut in batch.values():
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            expires = time.monotonic() + self._ttl
+            for gid, fut in batch.items():
+                deals = prices.get(gid, [])
+                # Respuesta vacía del upstream (error no-5xx): no se cachea
+                if prices:
+                    self._cache[gid] = (expires, deals)
+                if not fut.done():
+                    fut.set_result(deals)
+        self._prune()
+
+    def _prune(self):
+        now = time.monotonic()
+        for gid in [g for g, (exp, _) in self._cache.items() if exp <= now]:
+            del self._cache[gid]
+
+    def prime(self, prices: dict[str, list[dict]]):
+        """Carga precios obtenidos por otro camino (p.ej. el sweep) como entradas frescas."""
+        expires = time.monotonic() + self._ttl
+        for gid, deals in prices.items():
+            self._cache[gid] = (expires, deals)
+
+    def invalidate(self, game_ids: list[str]):
+        for gid in game_ids:
+            self._cache.pop(gid, None)
+
+    def stats(self) -> dict:
+        return {
+            "cached":         len(self._cache),
+            "requests":       self._requests,
+            "hit_rate":       round(self._hits / self._requests, 3) if self._requests else None,
+            "upstream_calls": self._upstream_calls,
+            "avg_batch":      round(self._upstream_ids / self._upstream_calls, 1)
+                              if self._upstream_calls else None,
+        }
+
+
+# ── Singleton ─────────────────────────────────────────────────────────────────
+
+_service: Optional[CurrentPriceService] = None
+
+
+def get_current_price_service() -> CurrentPriceService:
+    global _service
+    if _service is None:
+        s = get_settings()
+        _service = CurrentPriceService(
+            ttl_seconds=s.current_price_ttl_seconds,
+            window_seconds=s.current_price_batch_window_ms / 1000,
+            max_batch=s.current_price_batch_max,
+        )
+    return _service
@@ -0,0 +1,252 @@
+"""
+src/services/job_service.py
+===========================
+Cola durable de jobs (tabla sync_jobs) con un worker in-process.
+
+  - Cada job tiene id, progreso (done/total/errors) y un checkpoint JSON que
+    el handler actualiza por ítem/batch vía JobContext.progress()
+  - enqueue() deduplica: un job idéntico (mismo kind + params) en cola o
+    corriendo se reutiliza en vez de lanzar otro
+  - Al arrancar, los jobs que quedaron 'running' vuelven a la cola y el
+    handler retoma desde su checkpoint
+  - cancel() marca el job; el handler para en su próximo checkpoint
+
+Los handlers se registran con @register("kind") en el módulo donde vive el
+trabajo (sync_service, predict_service) y reciben un JobContext.
+
+Cada carril (lane) tiene su propio worker serial: dentro de un carril los
+jobs corren de a uno, en orden de llegada. Los jobs cortos que espera un
+usuario se registran con lane="interactive" para no quedar detrás de un
+/sync/bulk o un reentrenamiento en el carril "default".
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from typing import Awaitable, Callable, Optional
+
+from src.db import queries
+from src.db.connection import get_db
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """El job fue cancelado desde la API — se lanza en el próximo checkpoint."""
+
+
+class JobContext:
+    """Lo que ve un handler: params, checkpoint previo y el reporte de progreso."""
+
+    def __init__(self, job: dict):
+        self.id = job["id"]
+        self.kind = job["kind"]
+        self.params: dict = job.get("params") or {}
+        self.checkpoint: dict = job.get("checkpoint") or {}
+        self.done: int = job.get("done") or 0
+        self.total: Optional[int] = job.get("total")
+        self.errors: int = job.get("errors") or 0
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.checkpoint)
+
+    async def progress(self, done: int, total: Optional[int] = None,
+                       errors: Optional[int] = None, checkpoint: Optional[dict] = None):
+        """
+        Persiste progreso y checkpoint. Lanza JobCancelled si se pidió cancelar.
+        Cede el event loop para que el worker no acapare la app.
+        """
+        self.done = done
+        self.total = total if total is not None else self.total
+        self.errors = errors if errors is not None else self.errors
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+        cancel = queries.update_job_progress(get_db(), self.id, self.done, self.total,
+                                             self.errors, checkpoint)
+        if cancel:
+            raise JobCancelled(self.id)
+        await asyncio.sleep(0)
+
+
+Handler = Callable[[JobContext], Awaitable[Optional[dict]]]
+
+_handlers: dict[str, Handler] = {}
+_lanes: dict[str, str] = {}   # kind → carril
+DEFAULT_LANE = "default"
+
+
+def register(kind: str, lane: str = DEFAULT_LANE):
+    """Decorador: registra el handler de un tipo de job y su carril."""
+    def wrap(fn: Handler) -> Handler:
+        _handlers[kind] = fn
+        _lanes[kind] = lane
+        return fn
+    return wrap
+
+
+def _dedupe_key(kind: str, params: dict) -> str:
+    return f"{kind}:{json.dumps(params, sort_keys=True, default=str)}"
+
+
+def enqueue(kind: str, params: Optional[dict] = None) -> tuple[dict, bool]:
+    """
+    Encola un job. Retorna (job, deduped): si ya hay uno idéntico en cola o
+    corriendo se retorna ese con deduped=True.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Tipo de job desconocido: {kind}")
+    params = params or {}
+    con = get_db()
+    key = _dedupe_key(kind, params)
+    existing = queries.find_active_job(con, key)
+    if existing:
+        logger.info(f"Job {kind} ya activo ({existing['id']}) — deduplicado")
+        return existing, True
+    job = queries.insert_job(con, uuid.uuid4().hex[:12], kind, params, key)
+    logger.info(f"Job {kind} encolado: {job['id']} {params}")
+    _wake(_lanes[kind]).set()
+    return job, False
+
+
+def latest(kind: str, params: Optional[dict] = None) -> Optional[dict]:
+    """Último job de ese kind + params (el que enqueue() deduplicaría)."""
+    return queries.get_latest_job(get_db(), _dedupe_key(kind, params or {}))
+
+
+def cancel(job_id: str) -> Optional[dict]:
+    return queries.request_job_cancel(get_db(), job_id)
+
+
+def describe(job: dict) -> dict:
+    """Vista pública de un job: progreso, throughput y ETA del intento actual."""
+    done, total = job.get("done") or 0, job.get("total")
+    rate = eta = None
+    run_start, updated = job.get("run_started_at"), job.get("updated_at")
+    if run_start and updated and updated > run_start:
+        elapsed = (updated - run_start).total_seconds()
+        rate = (done - (job.get("run_start_done") or 0)) / elapsed
+        if total and rate > 0 and job["status"] == "running":
+            eta = round((total - done) / rate)
+    return {
+        "id":       job["id"],
+        "kind":     job["kind"],
+        "params":   job.get("params"),
+        "status":   job["status"],
+        "progress": {
+            "done":   done,
+            "total":  total,
+            "errors": job.get("errors") or 0,
+            "pct":    round(100 * done / total, 1) if total else None,
+        },
+        "throughput_per_min": round(rate * 60, 2) if rate is not None else None,
+        "eta_seconds":        eta,
+        "attempts":           job.get("attempts"),
+        "cancel_requested":   job.get("cancel_requested"),
+        "created_at":         job.get("created_at"),
+        "started_at":         job.get("started_at"),
+        "updated_at":         job.get("updated_at"),
+        "finished_at":        job.get("finished_at"),
+        "result":             job.get("result"),
+        "error":              job.get("error"),
+    }
+
+
+# ── Worker ────────────────────────────────────────────────────────────────────
+
+_wakes: dict[str, asyncio.Event] = {}
+_worker_tasks: list[asyncio.Task] = []
+POLL_SECONDS = 30
+ERROR_BACKOFF_MAX = 60
+
+
+def _wake(lane: str) -> asyncio.Event:
+    if lane not in _wakes:
+        _wakes[lane] = asyncio.Event()
+    return _wakes[lane]
+
+
+async def _run(job: dict):
+    ctx = JobContext(job)
+    con = get_db()
+    if ctx.resumed:
+        logger.info(f"Job {ctx.kind} {ctx.id} retomado desde checkpoint ({ctx.done}/{ctx.total})")
+    try:
+        result = await _handlers[ctx.kind](ctx)
+    except JobCancelled:
+        queries.finish_job(con, ctx.id, "cancelled")
+        logger.info(f"Job {ctx.kind} {ctx.id} cancelado en {ctx.done}/{ctx.total}")
+    except asyncio.CancelledError:
+        # Apagado ordenado: vuelve a la cola y se retoma al próximo arranque
+        queries.finish_job(con, ctx.id, "queued")
+        raise
+    except Exception as e:
+        logger.error(f"Job {ctx.kind} {ctx.id} falló: {e}")
+        queries.finish_job(con, ctx.id, "failed", error=str(e)[:500])
+    else:
+        queries.finish_job(con, ctx.id, "done", result=result)
+        logger.info(f"Job {ctx.kind} {ctx.id} completado")
+
+
+async def _worker(lane: str):
+    """
+    Loop de un carril. El carril default reclama todo kind que no sea de
+    otro carril (incluidos los desconocidos, que se marcan failed).
+    Un error de DuckDB al reclamar/cerrar un job no mata el worker:
+    se loguea y se reintenta con backoff.
+    """
+    wake = _wake(lane)
+    backoff = 1
+    while True:
+        try:
+            if lane == DEFAULT_LANE:
+                job = queries.claim_next_job(
+                    get_db(), exclude=[k for k, kl in _lanes.items() if kl != lane])
+            else:
+                job = queries.claim_next_job(
+                    get_db(), kinds=[k for k, kl in _lanes.items() if kl == lane])
+            if job is None:
+                wake.clear()
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout=POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            if job["kind"] not in _handlers:
+                queries.finish_job(get_db(), job["id"], "failed",
+                                   error=f"kind desconocido: {job['kind']}")
+                continue
+            await _run(job)
+            backoff = 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Worker {lane}: error inesperado ({e}); reintento en {backoff}s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, ERROR_BACKOFF_MAX)
+
+
+def start_worker():
+    """
+    Lanza un worker por carril (desde el lifespan). Reencola los jobs que
+    quedaron a medias.
+    """
+    # Importa los módulos que registran handlers
+    from src.services import predict_service, sync_service  # noqa: F401
+    resumed = queries.requeue_running_jobs(get_db())
+    if resumed:
+        logger.info(f"{resumed} job(s) interrumpidos vuelven a la cola")
+    for lane in sorted({DEFAULT_LANE, *_lanes.values()}):
+        _worker_tasks.append(asyncio.create_task(_worker(lane)))
+
+
+async def stop_worker():
+    for task in _worker_tasks:
+        task.cancel()
+    for task in _worker_tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    _worker_tasks.clear()
@@ -1,17 +1,32 @@
 """
 src/services/predict_service.py
 """
+import asyncio
+import datetime as dt
+import json
 import logging
 import math
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
 from typing import Optional
 
+import pandas as pd
+
+from config import get_settings
 from src.db import queries
 from src.db.connection import get_db
-from src.ml.features import build_features
-from src.ml.model import get_model, PredictionResult
+from src.ml.features import FEATURE_ORDER, features_from_anchors
+from src.ml.model import SteamPriceModel, get_model
+from src.services.job_service import JobContext, register
 
 logger = logging.getLogger(__name__)
-CACHE_MAX_AGE_HOURS = 6
+settings = get_settings()
+
+# Directorio desde el que corre `python -m src.ml.train` (el que contiene src/)
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 def _san(v):
@@ -20,70 +35,166 @@ def _san(v):
     return v
 
 
+class PredictionLRU:
+    """
+    Tier en memoria delante de predictions_cache: game_id → respuesta ya
+    formateada, acotado a `max_size` entradas (se descarta la menos usada).
+
+    Una entrada vale mientras su data_version sea la actual del juego (un
+    lookup por PK en game_data_versions), la haya calculado el modelo activo
+    y no supere PREDICTION_MAX_AGE_HOURS. Un hit no lee
+    games, predictions_cache ni price_history.
+    """
+
+    def __init__(self, max_size: int, max_age_hours: float):
+        self._max_size = max_size
+        self._max_age = dt.timedelta(hours=max_age_hours)
+        self._entries: OrderedDict[str, tuple[dict, int, Optional[str], dt.datetime]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._hits = 0
+        self._db_hits = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, game_id: str, data_version: int) -> Optional[dict]:
+        """Respuesta cacheada si sigue vigente para data_version y el modelo activo."""
+        model_version = get_model().version
+        cutoff = _utcnow() - self._max_age
+        with self._lock:
+            self._requests += 1
+            entry = self._entries.get(game_id)
+            if entry is None:
+                return None
+            response, version, model, computed_at = entry
+            if version < data_version or model != model_version or computed_at <= cutoff:
+                del self._entries[game_id]
+                self._invalidations += 1
+                return None
+            self._entries.move_to_end(game_id)
+            self._hits += 1
+            return response
+
+    def put(self, game_id: str, response: dict, data_version: int,
+            model_version: Optional[str], computed_at: dt.datetime):
+        if self._max_size <= 0:
+            return
+        with self._lock:
+            self._entries[game_id] = (response, data_version, model_version, computed_at)
+            self._entries.move_to_end(game_id)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def record_db_hit(self):
+        with self._lock:
+            self._db_hits += 1
+
+    def invalidate(self, game_ids: Optional[list[str]] = None):
+        """Descarta las entradas de game_ids (o todas)."""
+        with self._lock:
+            if game_ids is None:
+                self._entries.clear()
+            for gid in game_ids or ():
+                self._entries.pop(gid, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            misses = self._requests - self._hits - self._db_hits
+            return {
+                "size":          len(self._entries),
+                "max_size":      self._max_size,
+                "requests":      self._requests,
+                "hit_rate":      round(self._hits / self._requests, 3) if self._requests else None,
+                "db_hit_rate":   round(self._db_hits / self._requests, 3) if self._requests else None,
+                "misses":        misses,
+                "evictions":     self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+
+_lru: Optional[PredictionLRU] = None
+
+
+def get_prediction_lru() -> PredictionLRU:
+    global _lru
+    if _lru is None:
+        _lru = PredictionLRU(settings.prediction_lru_size, settings.prediction_max_age_hours)
+    return _lru
+
+
+def _utcnow() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)
+
+
 def get_prediction(game_id: str, force_refresh: bool = False) -> dict:
+    """
+    Tres niveles: LRU en memoria (un lookup de data_version), predictions_cache
+    (una query, con el price_context guardado) y recálculo desde game_features.
+    Ninguno lee price_history.
+    """
     con = get_db()
+    lru = get_prediction_lru()
+
+    if not force_refresh:
+        response = lru.get(game_id, queries.get_data_version(con, game_id))
+        if response is not None:
+            return {**response, "from_cache": True}
+
+        cached = queries.get_cached_prediction(con, game_id, settings.prediction_max_age_hours,
+                                               model_version=get_model().version)
+        if cached:
+            logger.debug(f"Cache hit para game_id={game_id}")
+            lru.record_db_hit()
+            response = _format_from_cache(game_id, cached)
+            lru.put(game_id, response, cached["data_version"], cached["model_version"],
+                    cached["computed_at"])
+            return response
 
     game = queries.get_game(con, game_id)
     if not game:
         raise ValueError(f"Juego no encontrado: {game_id}")
 
-    # Try cache first
-    if not force_refresh:
-        cached = queries.get_cached_prediction(con, game_id, CACHE_MAX_AGE_HOURS)
-        if cached:
-            logger.debug(f"Cache hit para game_id={game_id}")
-            # Still need price context — fetch it fresh
-            stats = queries.get_price_stats(con, game_id)
-            history = queries.get_price_history(con, game_id)
-            last = history[-1] if history else {}
-            return _format_from_cache(game, cached, stats, last)
-
-    # Full recalculation
-    stats    = queries.get_price_stats(con, game_id)
-    history  = queries.get_price_history(con, game_id)
-    seasonal = queries.get_seasonal_patterns(con, game_id)
-
-    if not history or len(history) < 3:
-        raise ValueError(f"Historial insuficiente ({len(history or [])} registros). Mínimo 3.")
-
-    features = build_features(stats, history, seasonal)
-    if not features:
-        raise ValueError("No se pudieron construir features de predicción")
-
-    model  = get_model()
-    result: PredictionResult = model.predict(features)
-
-    queries.upsert_prediction(
-        con, game_id=game_id, score=result.score, signal=result.signal,
-        reason=result.reason,
-        features={k: v for k, v in features.items() if not k.startswith("_")},
-    )
-
-    return _format_response(game, result.score, result.signal, result.reason,
-                            result.confidence, features, from_cache=False)
-
-
-def _format_from_cache(game: dict, cached: dict, stats: Optional[dict], last_record: dict) -> dict:
-    current_price = _san(float(last_record.get("price_usd", 0) or 0)) or 0
-    cut_pct       = int(last_record.get("cut_pct", 0) or 0)
-    min_price     = _san(stats.get("min_price", 0) if stats else 0) or 0
-    avg_price     = _san(stats.get("avg_price", 0) if stats else 0) or 0
+    # Full recalculation desde game_features: costo independiente del largo
+    # del historial. Si entra un ingest mientras calculamos, la predicción
+    # queda con la versión vieja de las features y vuelve al dirty set
+    anchors = queries.get_feature_anchors(con, [game_id], min_records=0)
+    total = int(anchors["total"].iloc[0]) if not anchors.empty else 0
+    if total < 3:
+        raise ValueError(f"Historial insuficiente ({total} registros). Mínimo 3.")
+
+    computed_at = _utcnow()
+    model = get_model()
+    feats, batch = _predict_anchors(con, anchors, model)
+    features = feats.to_dict(orient="records")[0]
+    response = _format_response(game, float(batch.scores[0]), str(batch.signals[0]),
+                                str(batch.reasons[0]), batch.confidence, features, from_cache=False)
+    lru.put(game_id, response, int(anchors["data_version"].iloc[0]), model.version, computed_at)
+    return response
+
+
+def _price_context(features: dict) -> dict:
+    """Contexto de precio de la respuesta, desde las META_COLUMNS de las features."""
     return {
-        "game_id": game["id"],
-        "title":   game["title"],
-        "appid":   game.get("appid"),
+        "current_price":        _san(float(features.get("_current_price", 0) or 0)) or 0,
+        "min_price_ever":       _san(float(features.get("_min_price", 0) or 0)) or 0,
+        "avg_price":            _san(float(features.get("_avg_price", 0) or 0)) or 0,
+        "current_discount_pct": int(_san(float(features.get("current_discount_pct", 0) or 0)) or 0),
+    }
+
+
+def _format_from_cache(game_id: str, cached: dict) -> dict:
+    return {
+        "game_id": game_id,
+        "title":   cached["title"],
+        "appid":   cached.get("appid"),
         "prediction": {
             "score":      _san(float(cached.get("score") or 0)) or 0,
             "signal":     cached.get("signal", "WAIT"),
             "reason":     cached.get("reason", ""),
             "confidence": 0.0,
         },
-        "price_context": {
-            "current_price":        current_price,
-            "min_price_ever":       min_price,
-            "avg_price":            avg_price,
-            "current_discount_pct": cut_pct,
-        },
+        "price_context": cached["price_context"],
         "from_cache": True,
     }
 
@@ -100,11 +211,157 @@ def _format_response(game: dict, score: float, signal: str, reason: str,
             "reason":     reason,
             "confidence": round(_san(confidence) or 0, 2),
         },
-        "price_context": {
-            "current_price":        _san(features.get("_current_price", 0)) or 0,
-            "min_price_ever":       _san(features.get("_min_price", 0)) or 0,
-            "avg_price":            _san(features.get("_avg_price", 0)) or 0,
-            "current_discount_pct": _san(features.get("current_discount_pct", 0)) or 0,
-        },
+        "price_context": _price_context(features),
         "from_cache": from_cache,
     }
+
+
+# ── Batch ─────────────────────────────────────────────────────────────────────
+
+def _predict_anchors(con, anchors, model: Optional[SteamPriceModel] = None) -> tuple:
+    """
+    Features (derivadas de filas de game_features), predicciones (una llamada
+    al modelo) y upsert en bloque. Cada predicción queda con la data_version
+    con que se calcularon sus features, su price_context (lo que sirve un hit)
+    y la versión del modelo que la produjo.
+    """
+    model = model or get_model()
+    feats = features_from_anchors(anchors)
+    batch = model.predict_many(feats[FEATURE_ORDER].to_numpy(dtype=float))
+    feature_json = [json.dumps(r) for r in feats[FEATURE_ORDER].to_dict(orient="records")]
+    context_json = [json.dumps(_price_context(r)) for r in feats.to_dict(orient="records")]
+    queries.upsert_predictions(con, pd.DataFrame({
+        "game_id":       feats.index,
+        "score":         batch.scores,
+        "signal":        batch.signals,
+        "reason":        batch.reasons,
+        "features":      feature_json,
+        "price_context": context_json,
+        "data_version":  anchors["data_version"].to_numpy(),
+        "model_version": model.version,
+    }))
+    return feats, batch
+
+
+def predict_games(con, game_ids: list[str]) -> tuple:
+    """
+    Recalcula y guarda las predicciones de muchos juegos desde el feature
+    store, sin tocar price_history.
+    Retorna (features, BatchPrediction) de los juegos con historial suficiente.
+    """
+    return _predict_anchors(con, queries.get_feature_anchors(con, game_ids))
+
+
+def get_predictions_many(game_ids: list[str]) -> dict:
+    """Predicciones frescas de una lista de juegos (POST /predict/many)."""
+    con = get_db()
+    games = queries.get_games_by_ids(con, game_ids)
+    known = [g for g in dict.fromkeys(game_ids) if g in games]
+    feats, batch = predict_games(con, known) if known else (None, None)
+    results = []
+    if feats is not None:
+        for i, (game_id, row) in enumerate(zip(feats.index, feats.to_dict(orient="records"))):
+            results.append(_format_response(
+                games[game_id], float(batch.scores[i]), str(batch.signals[i]),
+                str(batch.reasons[i]), batch.confidence, row, from_cache=False))
+    order = {g: i for i, g in enumerate(known)}
+    results.sort(key=lambda r: order[r["game_id"]])
+    scored = {r["game_id"] for r in results}
+    return {
+        "predictions":  results,
+        "not_found":    [g for g in game_ids if g not in games],
+        "insufficient": [g for g in known if g not in scored],
+    }
+
+
+async def generate_predictions(limit: Optional[int] = None,
+                               job: Optional[JobContext] = None) -> dict:
+    """
+    Recalcula solo el dirty set: juegos con precios nuevos desde su última
+    predicción, los calculados por otro modelo que el activo y los que
+    superan PREDICTION_MAX_AGE_HOURS. El costo es
+    proporcional a lo que cambió, no al tamaño del catálogo.
+    Todo el dirty set se puntúa en una llamada y se escribe en un upsert.
+    """
+    con = get_db()
+    game_ids = queries.get_dirty_prediction_games(con, settings.prediction_max_age_hours, limit,
+                                                  model_version=get_model().version)
+    if job:
+        await job.progress(0, total=len(game_ids))
+    # En un thread (con su conexión DuckDB) para no bloquear el event loop
+    feats, _ = await asyncio.to_thread(lambda: predict_games(get_db(), game_ids))
+    counts = {"ok": len(feats), "skipped": len(game_ids) - len(feats), "dirty": len(game_ids)}
+    if job:
+        await job.progress(len(game_ids), total=len(game_ids))
+    logger.info(f"Batch predictions done: {counts['ok']} ok / {counts['skipped']} skipped "
+                f"(dirty set: {len(game_ids)})")
+    return counts
+
+
+async def retrain_model(job: Optional[JobContext] = None) -> dict:
+    """
+    Reentrena el modelo fuera del proceso de la API y lo recarga en memoria.
+
+    El archivo DuckDB está lockeado por este proceso, así que se exporta
+    price_history a un snapshot Parquet temporal y src.ml.train corre como
+    subproceso sobre él (el fit no compite por el GIL ni el event loop).
+    Las etapas que reporta por stdout se vuelcan al progreso del job.
+    La versión nueva se publica sin activar; se activa solo si carga bien.
+    """
+    from src.ml.model import activate_model
+    from src.ml.train import STAGES
+    from src.tools.snapshot import export_snapshot
+
+    total = len(STAGES) + 2   # snapshot + etapas de train.py + recarga
+    result, error = None, None
+    os.makedirs(settings.snapshot_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix=".train-", dir=settings.snapshot_dir) as tmp:
+        snap = await asyncio.to_thread(
+            lambda: export_snapshot(get_db(), tmp, tables=["price_history"]))
+        if job:
+            await job.progress(1, total=total, checkpoint={"stage": "snapshot"})
+
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "src.ml.train", "--snapshot", snap["path"],
+            "--progress", "--no-activate",
+            cwd=_BACKEND_DIR, stdout=asyncio.subprocess.PIPE,
+        )
+        try:
+            async for line in proc.stdout:
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                if "stage" in msg:
+                    logger.info(f"Entrenamiento: {msg['stage']} ({msg['done']}/{msg['total']})")
+                    if job:
+                        await job.progress(1 + msg["done"], total=total,
+                                           checkpoint={"stage": msg["stage"]})
+                result = msg.get("result", result)
+                error = msg.get("error", error)
+            await proc.wait()
+        except BaseException:
+            # Cancelado o apagado: no dejar el subproceso huérfano
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            raise
+
+    if proc.returncode != 0 or result is None:
+        raise RuntimeError(error or f"src.ml.train terminó con código {proc.returncode}")
+    # Carga la versión nueva fuera del event loop y recién ahí la activa
+    await asyncio.to_thread(activate_model, result["version"])
+    logger.info(f"Modelo {result['version']} recargado en memoria ✓")
+    if job:
+        await job.progress(total, total=total, checkpoint={"stage": "reload"})
+    return result
+
+
+@register("predictions")
+async def _job_predictions(job: JobContext) -> dict:
+    return await generate_predictions(job.params.get("limit"), job=job)
+
+
+@register("train")
+async def _job_train(job: JobContext) -> dict:
+    return await retrain_model(job)
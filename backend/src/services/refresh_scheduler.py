@@ -0,0 +1,92 @@
+"""
+src/services/refresh_scheduler.py
+=================================
+Scheduler de refresh por prioridad.
+
+Cada juego trackeado tiene un intervalo de refresh que se acorta con la
+demanda (wishlists y librerías de usuarios, vistas de su página) y con la
+volatilidad de su precio, y se alarga para juegos que nadie mira.
+El loop toma en cada tick los juegos más atrasados respecto a su próximo
+refresh, dentro de un presupuesto fijo de requests por hora
+(SCHEDULER_BUDGET_PER_HOUR): la frescura va donde los usuarios miran, a costo
+de API constante.
+
+Las vistas se cuentan en memoria (record_view) y se vuelcan a
+game_refresh_state en cada tick.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+
+from config import get_settings
+from src.db import queries
+from src.db.connection import get_db
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+_views: Counter = Counter()
+_stats = {"ticks": 0, "refreshed": 0, "errors": 0, "last_tick_overdue": 0}
+
+
+def record_view(game_id: str):
+    """Cuenta una vista de la página del juego (barato: solo memoria)."""
+    _views[game_id] += 1
+
+
+def flush_views():
+    if not _views:
+        return
+    counts = dict(_views)
+    _views.clear()
+    queries.add_game_views(get_db(), counts)
+
+
+def get_schedule(limit: int = 50, overdue_only: bool = False) -> list[dict]:
+    flush_views()
+    return queries.get_refresh_schedule(
+        get_db(), limit,
+        min_hours=settings.refresh_min_hours,
+        max_hours=settings.refresh_max_hours,
+        overdue_only=overdue_only,
+    )
+
+
+async def tick() -> dict:
+    """Refresca los juegos más atrasados que entran en el presupuesto de este tick."""
+    from src.services.sync_service import sync_by_game_id
+
+    budget = max(1, round(settings.scheduler_budget_per_hour * settings.scheduler_tick_seconds / 3600))
+    due = get_schedule(limit=budget, overdue_only=True)
+    result = {"budget": budget, "due": len(due), "refreshed": 0, "errors": 0}
+    for game in due:
+        try:
+            await sync_by_game_id(game["game_id"])
+            result["refreshed"] += 1
+        except Exception as e:
+            logger.warning(f"Scheduler: refresh de {game['game_id']} falló: {e}")
+            queries.mark_games_synced(get_db(), [game["game_id"]], "error")
+            result["errors"] += 1
+    _stats["ticks"] += 1
+    _stats["refreshed"] += result["refreshed"]
+    _stats["errors"] += result["errors"]
+    _stats["last_tick_overdue"] = len(due)
+    if due:
+        logger.info(f"Scheduler tick: {result}")
+    return result
+
+
+async def run_scheduler_loop():
+    """Loop continuo (lanzado desde el lifespan si SCHEDULER_ENABLED=1)."""
+    logger.info(f"Scheduler de refresh activo: {settings.scheduler_budget_per_hour} juegos/hora")
+    while True:
+        try:
+            await tick()
+        except Exception as e:
+            logger.error(f"Scheduler tick falló: {e}")
+        await asyncio.sleep(settings.scheduler_tick_seconds)
+
+
+def stats() -> dict:
+    return {**_stats, "pending_views": sum(_views.values())}
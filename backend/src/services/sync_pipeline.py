@@ -0,0 +1,344 @@
+"""
+src/services/sync_pipeline.py
+=============================
+Motor de sync por etapas conectadas con colas asyncio acotadas:
+
+  appids → lookup → history (fetch) → parse → write (DuckDB, en batch)
+
+  - Cada etapa tiene su propia concurrencia (SYNC_*_CONCURRENCY): un history
+    lento no frena los lookups ni las escrituras de otros juegos
+  - El parseo y las escrituras corren en threads (cada thread con su conexión
+    DuckDB), así red y DB se solapan
+  - Las colas acotadas (SYNC_QUEUE_SIZE) dan backpressure: si la DB se atrasa,
+    los fetchers esperan en vez de acumular memoria
+  - Métricas por etapa (procesados, errores, backlog, throughput, utilización)
+    expuestas en /health mientras corre y al terminar en el resumen del job
+
+Los juegos terminan fuera de orden: el checkpoint guarda el prefijo de appids
+ya completos (escritos en DB); al retomar se rehace lo posterior, que es
+idempotente (ON CONFLICT DO NOTHING + since incremental).
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+import pandas as pd
+
+from config import get_settings
+from src.api.client import ITADClient
+from src.api.history_parser import parse_history
+from src.db import queries
+from src.db.connection import get_db
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()   # sentinel de fin de etapa
+
+
+@dataclass
+class StageMetrics:
+    name: str
+    workers: int
+    queue: Optional[asyncio.Queue] = None
+    processed: int = 0
+    errors: int = 0
+    busy: float = 0.0
+
+    def snapshot(self, elapsed: float) -> dict:
+        return {
+            "workers":     self.workers,
+            "processed":   self.processed,
+            "errors":      self.errors,
+            "backlog":     self.queue.qsize() if self.queue else 0,
+            "capacity":    self.queue.maxsize if self.queue else 0,
+            "per_sec":     round(self.processed / elapsed, 2) if elapsed else None,
+            "utilization": round(self.busy / (elapsed * self.workers), 3) if elapsed else None,
+        }
+
+
+@dataclass
+class _Game:
+    idx: int
+    appid: int
+    game_id: str = ""
+    title: str = ""
+    since: Optional[str] = None
+    pending: int = 0          # chunks parseados aún no escritos
+    steam_rows: int = 0
+    fetched: bool = False
+    failed: bool = False
+
+
+@dataclass
+class _Batch:
+    frames: list = field(default_factory=list)
+    games: list = field(default_factory=list)
+    rows: int = 0
+
+
+Checkpoint = Callable[[int, dict], Awaitable[None]]
+
+
+class SyncPipeline:
+    def __init__(self, itad: ITADClient, appids: list[int], full_refresh: bool = False,
+                 start: int = 0, summary: Optional[dict] = None,
+                 checkpoint: Optional[Checkpoint] = None):
+        from src.services.sync_service import _history_since
+        s = get_settings()
+        self._itad = itad
+        self._appids = appids
+        self._full_refresh = full_refresh
+        self._since_for = _history_since
+        self._start = start
+        self._cursor = start
+        self._completed: set[int] = set()   # fuera de orden, aún detrás del cursor
+        self._finalized: set[int] = set()   # todos los cerrados (no se poda)
+        self._marks: dict = {}              # game_id → high-water mark, precargado por batch
+        self._synced_ids: list[str] = []
+        self._checkpoint = checkpoint
+        self._write_rows = s.sync_write_batch_rows
+        self.summary = summary or {"total_games": 0, "total_inserted": 0, "errors": 0, "synced": []}
+
+        size = s.sync_queue_size
+        self._q_lookup:  asyncio.Queue = asyncio.Queue(size)
+        self._q_history: asyncio.Queue = asyncio.Queue(size)
+        self._q_parse:   asyncio.Queue = asyncio.Queue(size)
+        self._q_write:   asyncio.Queue = asyncio.Queue(size)
+        self.stages = {
+            "lookup":  StageMetrics("lookup",  s.sync_lookup_concurrency,  self._q_lookup),
+            "history": StageMetrics("history", s.sync_history_concurrency, self._q_history),
+            "parse":   StageMetrics("parse",   s.sync_parse_concurrency,   self._q_parse),
+            "write":   StageMetrics("write",   1,                          self._q_write),
+        }
+        self._writer_done = asyncio.Event()
+        self._started = 0.0
+        self._finished = False
+
+    # ── API ───────────────────────────────────────────────────────────────────
+
+    async def run(self) -> dict:
+        global _current
+        _current = self
+        self._started = time.monotonic()
+        st = self.stages
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(self._source())
+                tg.create_task(self._stage(st["lookup"],  self._q_lookup,  self._q_history,
+                                           st["history"].workers, self._lookup))
+                tg.create_task(self._stage(st["history"], self._q_history, self._q_parse,
+                                           st["parse"].workers, self._fetch))
+                tg.create_task(self._stage(st["parse"],   self._q_parse,   self._q_write,
+                                           1, self._parse))
+                tg.create_task(self._writer())
+                monitor = tg.create_task(self._monitor())
+                # El monitor corre hasta que el writer termina
+                await self._writer_done.wait()
+                monitor.cancel()
+        except* Exception as eg:
+            raise eg.exceptions[0]
+        finally:
+            self._finished = True
+            global _last
+            _last = self.metrics()
+        await self._save_checkpoint()
+        self.summary["stages"] = self.metrics()["stages"]
+        return self.summary
+
+    def metrics(self) -> dict:
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        return {
+            "running":   not self._finished,
+            "elapsed_s": round(elapsed, 1),
+            "games":     {"total": len(self._appids), "completed_prefix": self._cursor},
+            "stages":    {name: m.snapshot(elapsed) for name, m in self.stages.items()},
+        }
+
+    # ── Etapas ────────────────────────────────────────────────────────────────
+
+    async def _source(self):
+        # High-water marks en una query por batch de appids (no una por juego)
+        step = self._q_lookup.maxsize or 50
+        for i in range(self._start, len(self._appids), step):
+            chunk = self._appids[i:i + step]
+            self._marks.update(queries.get_latest_timestamps_by_appid(get_db(), chunk))
+            for idx, appid in enumerate(chunk, start=i):
+                await self._q_lookup.put(_Game(idx=idx, appid=appid))
+        for _ in range(self.stages["lookup"].workers):
+            await self._q_lookup.put(_DONE)
+
+    async def _stage(self, metrics: StageMetrics, in_q: asyncio.Queue, out_q: asyncio.Queue,
+                     next_workers: int, fn: Callable[[object, asyncio.Queue], Awaitable[None]]):
+        async def worker():
+            while True:
+                item = await in_q.get()
+                if item is _DONE:
+                    return
+                t0 = time.monotonic()
+                try:
+                    await fn(item, out_q)
+                    metrics.processed += 1
+                except Exception as e:
+                    metrics.errors += 1
+                    game = item[0] if isinstance(item, tuple) else item
+                    logger.warning(f"[{metrics.name}] appid={game.appid}: {e}")
+                    game.failed = True
+                    if metrics.name == "parse":
+                        game.pending -= 1
+                    await self._finalize(game)
+                finally:
+                    metrics.busy += time.monotonic() - t0
+
+        await asyncio.gather(*(worker() for _ in range(metrics.workers)))
+        for _ in range(next_workers):
+            await out_q.put(_DONE)
+
+    async def _lookup(self, game: _Game, out_q: asyncio.Queue):
+        lookup = await self._itad.lookup_game(game.appid)
+        if not lookup:
+            game.failed = True
+            await self._finalize(game)
+            return
+        game.game_id, slug, game.title = lookup
+        con = get_db()
+        try:
+            queries.upsert_game(con, game_id=game.game_id, slug=slug,
+                                title=game.title, appid=game.appid)
+        except Exception as e:
+            logger.debug(f"upsert_game skip {game.appid}: {e}")
+        last_ts = self._marks.get(game.game_id)
+        game.since = self._since_for(game.game_id, last_ts, self._full_refresh)
+        await out_q.put(game)
+
+    async def _fetch(self, game: _Game, out_q: asyncio.Queue):
+        async for items in self._itad.iter_history_entries(game.game_id, since=game.since):
+            game.pending += 1
+            await out_q.put((game, items))
+        game.fetched = True
+        await self._finalize(game)
+
+    async def _parse(self, item: tuple, out_q: asyncio.Queue):
+        game, items = item
+        if game.failed:
+            # Ya falló otro chunk del juego: el resto se descarta
+            game.pending -= 1
+            await self._finalize(game)
+            return
+        df = await asyncio.to_thread(parse_history, items, game.game_id, game.appid)
+        game.steam_rows += len(df)
+        if df.empty:
+            game.pending -= 1
+            await self._finalize(game)
+            return
+        await out_q.put((game, df))
+
+    async def _writer(self):
+        """Único escritor: junta DataFrames hasta SYNC_WRITE_BATCH_ROWS y escribe en un thread."""
+        metrics = self.stages["write"]
+        try:
+            finished = False
+            while not finished:
+                batch = _Batch()
+                item = await self._q_write.get()
+                while True:
+                    if item is _DONE:
+                        finished = True
+                        break
+                    game, df = item
+                    if game.failed:
+                        game.pending -= 1
+                        await self._finalize(game)
+                    else:
+                        batch.frames.append(df)
+                        batch.games.append(game)
+                        batch.rows += len(df)
+                    if batch.rows >= self._write_rows or self._q_write.empty():
+                        break
+                    item = self._q_write.get_nowait()
+                if not batch.frames:
+                    continue
+                t0 = time.monotonic()
+                try:
+                    frame = pd.concat(batch.frames, ignore_index=True)
+                    inserted = await asyncio.to_thread(_write, frame)
+                    self.summary["total_inserted"] += inserted
+                    metrics.processed += len(batch.frames)
+                except Exception as e:
+                    metrics.errors += 1
+                    logger.error(f"[write] batch de {batch.rows} filas falló: {e}")
+                    for game in batch.games:
+                        game.failed = True
+                finally:
+                    metrics.busy += time.monotonic() - t0
+                for game in batch.games:
+                    game.pending -= 1
+                    await self._finalize(game)
+        finally:
+            self._writer_done.set()
+
+    async def _monitor(self, every: float = 5.0):
+        """Persiste el checkpoint periódicamente (puede lanzar JobCancelled)."""
+        last = self._cursor
+        while True:
+            await asyncio.sleep(every)
+            if self._cursor != last:
+                last = self._cursor
+                await self._save_checkpoint()
+
+    # ── Contabilidad ──────────────────────────────────────────────────────────
+
+    async def _finalize(self, game: _Game):
+        if game.idx in self._finalized:
+            return
+        if not game.failed and (not game.fetched or game.pending > 0):
+            return
+        if game.failed and game.pending > 0:
+            return   # quedan chunks en vuelo; se cierra cuando se escriban
+        s = self.summary
+        if game.failed:
+            s["errors"] += 1
+        elif game.steam_rows:
+            s["total_games"] += 1
+            s["synced"].append(game.appid)
+            self._synced_ids.append(game.game_id)
+            logger.info(f"  ✓ {game.title} ({game.appid}): {game.steam_rows} registros Steam")
+        elif game.since:
+            # Incremental sin entradas nuevas: el juego ya está al día
+            s["total_games"] += 1
+            s["synced"].append(game.appid)
+            self._synced_ids.append(game.game_id)
+        else:
+            s["errors"] += 1
+        self._finalized.add(game.idx)
+        self._completed.add(game.idx)
+        while self._cursor in self._completed:
+            self._completed.discard(self._cursor)
+            self._cursor += 1
+
+    async def _save_checkpoint(self):
+        if self._synced_ids:
+            queries.mark_games_synced(get_db(), self._synced_ids)
+            self._synced_ids = []
+        if self._checkpoint:
+            await self._checkpoint(self._cursor, self.summary)
+
+
+def _write(frame: pd.DataFrame) -> int:
+    """Corre en un thread del pool, con la conexión DuckDB de ese thread."""
+    return queries.upsert_price_records(get_db(), frame)
+
+
+# ── Métricas ──────────────────────────────────────────────────────────────────
+
+_current: Optional[SyncPipeline] = None
+_last: Optional[dict] = None
+
+
+def pipeline_status() -> Optional[dict]:
+    """Métricas del pipeline en curso, o las del último que corrió."""
+    if _current is not None and not _current._finished:
+        return _current.metrics()
+    return _last
@@ -3,120 +3,276 @@ src/services/sync_service.py
 """
 import asyncio
 import logging
-from typing import Optional
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Optional
 import httpx
 from config import get_settings
-from src.api.client import ITADClient
+from src.api.client import STEAM_SHOP_ID, STEAM_SHOP_NAME, ITADClient
+from src.api.http_cache import cached_fetch, make_key
+from src.api.json_stream import iter_json_items
+from src.api.singleflight import get_group
 from src.db import queries
 from src.db.connection import get_db
+from src.services.job_service import JobContext, enqueue, register
+from src.services.sync_pipeline import SyncPipeline
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+STEAMSPY_URL = "https://steamspy.com/api.php"
 
-async def get_top_appids(client: httpx.AsyncClient, top_n: int) -> list[int]:
+_sync_flights = get_group("sync")
+
+
+def _history_since(game_id: str, last_ts: Optional[datetime],
+                   full_refresh: bool = False) -> Optional[str]:
+    """
+    Calcula el `since` de history/v2 a partir del high-water mark del juego.
+    Retorna None (historial completo desde ITAD_HISTORY_SINCE) si el juego no
+    tiene registros, si se pidió full_refresh, o si hoy le toca su refresh
+    periódico (un día de cada SYNC_FULL_REFRESH_DAYS, repartido por hash).
+    """
+    if full_refresh or last_ts is None:
+        return None
+    days = settings.sync_full_refresh_days
+    if days > 0 and zlib.crc32(game_id.encode()) % days == date.today().toordinal() % days:
+        return None
+    return last_ts.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+async def _ingest_history(con, client: ITADClient, game_id: str,
+                          appid: Optional[int], since: Optional[str]) -> tuple[int, int]:
+    """
+    Descarga history/v2 en streaming y escribe cada chunk apenas se parsea,
+    así la memoria queda acotada al chunk aunque el juego tenga años de historial.
+    game_features se recalcula una sola vez al final (en un thread), no por chunk.
+    Retorna (registros Steam recibidos, registros insertados).
+    """
+    received = inserted = 0
+    try:
+        async for chunk in client.iter_price_history(game_id, appid=appid, since=since):
+            received += len(chunk)
+            inserted += queries.upsert_price_records(con, chunk, refresh_features=False)
+    finally:
+        # También si el stream se corta: lo ya escrito tiene que quedar en el store
+        if inserted:
+            await asyncio.to_thread(lambda: queries.refresh_game_features(get_db(), [game_id]))
+    return received, inserted
+
+
+CURATED_LISTS = ["top100forever", "top100in2weeks", "top100owned"]
+
+
+class _RateLimiter:
+    """Espacia el inicio de los requests al menos `interval` segundos (pueden solaparse)."""
+
+    def __init__(self, interval: float):
+        self._interval = interval
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next = loop.time() + self._interval
+
+
+def _owners_estimate(raw) -> Optional[int]:
+    """'20,000,000 .. 50,000,000' → punto medio del rango."""
+    try:
+        bounds = [int(p.replace(",", "").strip()) for p in str(raw).split("..")]
+        return sum(bounds) // len(bounds)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+async def _steamspy_apps(params: dict, timeout: float = 30,
+                         limiters: tuple = ()) -> Optional[list[dict]]:
+    """
+    Descarga una lista de SteamSpy ({appid: {...}}) parseándola en streaming:
+    de cada app solo se conservan appid, nombre, owners y ccu.
+    El resultado pasa por el cache HTTP en disco; `limiters` se respetan solo
+    cuando hay que ir a SteamSpy (un hit del cache no espera).
+    Retorna None si SteamSpy no respondió 200.
+    """
+    async def fetch() -> Optional[list[dict]]:
+        for limiter in limiters:
+            await limiter.wait()
+        apps: list[dict] = []
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            async with client.stream("GET", STEAMSPY_URL, params=params) as r:
+                if r.status_code != 200:
+                    return None
+                async for pairs in iter_json_items(r, (), settings.stream_chunk_size):
+                    for k, v in pairs:
+                        v = v if isinstance(v, dict) else {}
+                        apps.append({
+                            "appid":           int(k),
+                            "name":            v.get("name"),
+                            "owners_estimate": _owners_estimate(v.get("owners")),
+                            "ccu":             v.get("ccu"),
+                        })
+        return apps
+
+    endpoint = f"steamspy:{params.get('request')}"
+    # `fields` en la clave: describe la proyección cacheada (no se envía a SteamSpy)
+    key = make_key(endpoint, STEAMSPY_URL, {**params, "fields": "appid,name,owners,ccu"})
+    return await cached_fetch(endpoint, key, fetch)
+
+
+async def refresh_catalog(max_pages: Optional[int] = None) -> dict:
+    """
+    Rellena catalog_apps desde SteamSpy: las tres listas curadas y hasta
+    `max_pages` páginas de `all`, pedidas en paralelo respetando
+    STEAMSPY_MIN_INTERVAL entre requests y STEAMSPY_ALL_MIN_INTERVAL entre
+    páginas de `all`. Refreshes concurrentes se coalescen.
+    """
+    return await _sync_flights.do("catalog", lambda: _refresh_catalog(max_pages))
+
+
+async def _refresh_catalog(max_pages: Optional[int]) -> dict:
+    max_pages = settings.catalog_max_pages if max_pages is None else max_pages
+    limiter = _RateLimiter(settings.steamspy_min_interval)
+    all_limiter = _RateLimiter(settings.steamspy_all_min_interval)
+
+    async def fetch(params: dict, timeout: float) -> Optional[list[dict]]:
+        limiters = (all_limiter, limiter) if params["request"] == "all" else (limiter,)
+        try:
+            return await _steamspy_apps(params, timeout=timeout, limiters=limiters)
+        except Exception as e:
+            logger.warning(f"SteamSpy {params} error: {e}")
+            return None
+
+    sources = [(name, {"request": name}, 30) for name in CURATED_LISTS]
+    sources += [(f"all:{page}", {"request": "all", "page": page}, 60) for page in range(max_pages)]
+    started = datetime.now(timezone.utc).replace(tzinfo=None)
+    results = await asyncio.gather(*(fetch(params, timeout) for _, params, timeout in sources))
+
+    # Orden de prioridad: listas curadas primero, luego páginas; primera aparición gana
+    seen: set[int] = set()
+    rows: list[dict] = []
+    failed = []
+    for (source, _, _), apps in zip(sources, results):
+        if apps is None:
+            failed.append(source)
+            continue
+        for app in apps:
+            if app["appid"] in seen:
+                continue
+            seen.add(app["appid"])
+            rows.append({**app, "source": source.split(":")[0], "rank": len(rows)})
+
+    summary = {"apps": len(rows), "requests": len(sources), "failed": failed}
+    if not rows:
+        logger.error(f"Refresh de catálogo sin datos: {summary}")
+        return summary
+    # Con fuentes caídas no se despriorizan las apps que no vinieron esta vez
+    queries.upsert_catalog_apps(get_db(), rows, started, prune=not failed)
+    logger.info(f"Catálogo SteamSpy actualizado: {summary}")
+    return summary
+
+
+async def _catalog_appids(limit: int, source: Optional[str] = None) -> list[int]:
+    """
+    Appids desde catalog_apps. Catálogo vacío → refresh bloqueante (solo la
+    primera vez); catálogo viejo → refresh en background y se usa lo que hay.
+    """
+    con = get_db()
+    status = queries.get_catalog_status(con)
+    if not status["ranked"]:
+        await refresh_catalog()
+    elif status["fetched_at"] is None or (
+            datetime.now(timezone.utc).replace(tzinfo=None) - status["fetched_at"]
+            > timedelta(hours=settings.catalog_max_age_hours)):
+        asyncio.create_task(refresh_catalog())
+    return queries.get_catalog_appids(con, limit, source=source)
+
+
+async def get_top_appids(top_n: int) -> list[int]:
     """Para top_n <= 100 usa top100forever. Para mas usa get_bulk_appids."""
     if top_n <= 100:
         try:
-            r = await client.get("https://steamspy.com/api.php",
-                                 params={"request": "top100forever"}, timeout=30)
-            if r.status_code == 200:
-                appids = [int(k) for k in r.json().keys()][:top_n]
-                logger.info(f"SteamSpy top100forever: {len(appids)} appids")
-                return appids
+            appids = await _catalog_appids(top_n, source="top100forever")
+            logger.info(f"Catálogo top100forever: {len(appids)} appids")
+            return appids
         except Exception as e:
-            logger.error(f"Error en SteamSpy: {e}")
+            logger.error(f"Error leyendo catálogo: {e}")
         return []
-    return await get_bulk_appids(client, top_n)
+    return await get_bulk_appids(top_n)
 
 
-async def get_bulk_appids(client: httpx.AsyncClient, target: int = 1000) -> list[int]:
+async def get_bulk_appids(target: int = 1000) -> list[int]:
     """
-    Obtiene hasta `target` appids combinando:
+    Hasta `target` appids del catálogo persistido, en orden de prioridad:
     1. top100forever, top100in2weeks, top100owned (~300 unicos)
     2. Paginas del catalogo completo (all&page=N, ~1000 juegos/pagina)
     """
-    seen: set[int] = set()
-    appids: list[int] = []
+    result = await _catalog_appids(target)
+    logger.info(f"get_bulk_appids: {len(result)} appids para sincronizar")
+    return result
 
-    curated_lists = ["top100forever", "top100in2weeks", "top100owned"]
-    for request_type in curated_lists:
-        if len(appids) >= target:
-            break
-        try:
-            r = await client.get("https://steamspy.com/api.php",
-                                 params={"request": request_type}, timeout=30)
-            if r.status_code == 200:
-                for k in r.json().keys():
-                    appid = int(k)
-                    if appid not in seen:
-                        seen.add(appid)
-                        appids.append(appid)
-            await asyncio.sleep(1)
-        except Exception as e:
-            logger.warning(f"SteamSpy {request_type} error: {e}")
 
-    logger.info(f"Listas curadas: {len(appids)} appids unicos")
+async def _tracked(work: Awaitable[dict]) -> dict:
+    """Registra el sync en game_refresh_state (lo usa el scheduler de refresh)."""
+    result = await work
+    if result.get("game_id"):
+        queries.mark_games_synced(get_db(), [result["game_id"]], result["status"])
+    return result
 
-    page = 0
-    max_pages = 10
-    while len(appids) < target and page < max_pages:
-        try:
-            r = await client.get("https://steamspy.com/api.php",
-                                 params={"request": "all", "page": page}, timeout=60)
-            if r.status_code != 200:
-                break
-            data = r.json()
-            if not data:
-                break
-            added = 0
-            for k in data.keys():
-                appid = int(k)
-                if appid not in seen:
-                    seen.add(appid)
-                    appids.append(appid)
-                    added += 1
-            logger.info(f"SteamSpy page {page}: +{added} appids (total {len(appids)})")
-            if added == 0:
-                break
-            page += 1
-            await asyncio.sleep(2)
-        except Exception as e:
-            logger.warning(f"SteamSpy page {page} error: {e}")
-            break
 
-    result = appids[:target]
-    logger.info(f"get_bulk_appids: {len(result)} appids para sincronizar")
-    return result
+async def sync_by_appid(appid: int, full_refresh: bool = False,
+                        client: Optional[ITADClient] = None) -> dict:
+    """
+    Sincroniza un juego por Steam appid. Usado por POST /sync/game/{appid}.
+    Llamadas concurrentes para el mismo appid comparten un solo sync.
+    `client` permite reusar un ITADClient abierto (fan-out de muchos juegos).
+    """
+    return await _sync_flights.do(("appid", appid, full_refresh),
+                                  lambda: _tracked(_sync_by_appid(appid, full_refresh, client)))
 
 
-async def sync_by_appid(appid: int) -> dict:
-    """Sincroniza un juego por Steam appid. Usado por POST /sync/game/{appid}."""
+async def _sync_by_appid(appid: int, full_refresh: bool,
+                         shared: Optional[ITADClient] = None) -> dict:
+    if shared is None:
+        async with ITADClient(settings.itad_api_key) as client:
+            return await _sync_by_appid(appid, full_refresh, client)
+    client = shared
     con = get_db()
-    async with ITADClient(settings.itad_api_key) as client:
-        lookup = await client.lookup_game(appid)
-        if not lookup:
-            return {"appid": appid, "status": "not_found", "inserted": 0}
-        game_id, slug, title = lookup
-        try:
-            queries.upsert_game(con, game_id=game_id, slug=slug, title=title, appid=appid)
-        except Exception as e:
-            logger.debug(f"upsert_game skip appid={appid}: {e}")
-        records = await client.get_price_history(game_id, appid=appid)
-        if not records:
-            return {"game_id": game_id, "title": title, "appid": appid,
-                    "status": "no_history", "inserted": 0}
-        inserted = queries.upsert_price_records(con, [r.model_dump() for r in records])
-        logger.info(f"✓ {title} ({appid}): {inserted} registros")
+    lookup = await client.lookup_game(appid)
+    if not lookup:
+        return {"appid": appid, "status": "not_found", "inserted": 0}
+    game_id, slug, title = lookup
+    try:
+        queries.upsert_game(con, game_id=game_id, slug=slug, title=title, appid=appid)
+    except Exception as e:
+        logger.debug(f"upsert_game skip appid={appid}: {e}")
+    last_ts = queries.get_latest_timestamps(con, [game_id]).get(game_id)
+    since = _history_since(game_id, last_ts, full_refresh)
+    received, inserted = await _ingest_history(con, client, game_id, appid, since)
+    if not received:
         return {"game_id": game_id, "title": title, "appid": appid,
-                "status": "ok", "inserted": inserted}
+                "status": "up_to_date" if since else "no_history", "inserted": 0}
+    logger.info(f"✓ {title} ({appid}): {inserted} registros")
+    return {"game_id": game_id, "title": title, "appid": appid,
+            "status": "ok", "inserted": inserted}
 
 
-async def sync_by_game_id(game_id: str) -> dict:
+async def sync_by_game_id(game_id: str, full_refresh: bool = False) -> dict:
     """
     Sincroniza un juego por ITAD game_id.
     FIX: resuelve titulo y appid via get_game_info antes de guardar.
+    Llamadas concurrentes para el mismo game_id (doble click en GameSearch)
+    comparten un solo sync.
     """
+    return await _sync_flights.do(("game_id", game_id, full_refresh),
+                                  lambda: _tracked(_sync_by_game_id(game_id, full_refresh)))
+
+
+async def _sync_by_game_id(game_id: str, full_refresh: bool) -> dict:
     con = get_db()
 
     existing = queries.get_game(con, game_id)
@@ -142,19 +298,12 @@ async def sync_by_game_id(game_id: str) -> dict:
         except Exception as e:
             logger.warning(f"get_game_info failed for {game_id}: {e}")
 
-        records = await client.get_price_history(game_id)
-        if not records:
-            return {"game_id": game_id, "status": "no_history", "inserted": 0}
-
-        try:
-            first_appid = records[0].appid if hasattr(records[0], 'appid') else None
-            if first_appid:
-                queries.upsert_game(con, game_id=game_id, slug=game_id,
-                                    title=game_id, appid=first_appid)
-        except Exception:
-            pass
-
-        inserted = queries.upsert_price_records(con, [r.model_dump() for r in records])
+        last_ts = queries.get_latest_timestamps(con, [game_id]).get(game_id)
+        since = _history_since(game_id, last_ts, full_refresh)
+        received, inserted = await _ingest_history(con, client, game_id, None, since)
+        if not received:
+            return {"game_id": game_id,
+                    "status": "up_to_date" if since else "no_history", "inserted": 0}
         logger.info(f"✓ game_id={game_id}: {inserted} registros")
 
         final = queries.get_game(con, game_id)
@@ -165,70 +314,85 @@ async def sync_by_game_id(game_id: str) -> dict:
                 "status": "ok", "inserted": inserted}
 
 
-async def repair_orphaned_games(batch_size: int = 10) -> dict:
-    """Repara juegos sin titulo o appid consultando ITAD."""
-    con = get_db()
+REPAIR_CHUNK = 500
+
+
+async def _resolve_orphan(client: ITADClient, game: dict,
+                          sem: asyncio.Semaphore) -> Optional[dict]:
+    """Título/slug/appid para un huérfano, o None si no se pudo resolver lo que falta."""
+    fix = {"id": game["id"], "title": None, "slug": None,
+           "appid": game["appid"] if game["needs_appid"] else None}
+    if game["needs_title"]:
+        async with sem:
+            lookup = await client.lookup_game(game["appid"]) if game["appid"] else None
+            if not lookup:
+                lookup = await client.get_game_info(game["id"])
+        if not lookup or not lookup[2] or lookup[2] == game["id"]:
+            return None
+        _, fix["slug"], fix["title"] = lookup
+        fix["slug"] = fix["slug"] or game["id"]
+    elif fix["appid"] is None:
+        return None
+    return fix
 
-    rows = con.execute("""
-        SELECT id, title, appid FROM games
-        WHERE title = id OR appid IS NULL
-        ORDER BY id LIMIT 200
-    """).fetchdf()
 
-    if rows.empty:
+async def repair_orphaned_games(limit: Optional[int] = None,
+                                job: Optional[JobContext] = None) -> dict:
+    """
+    Repara juegos sin titulo o appid consultando ITAD, en una pasada:
+      - candidatos y appids de price_history en una sola query
+      - appids faltantes en bulk (lookup de shop ids de Steam)
+      - títulos con concurrencia acotada (REPAIR_CONCURRENCY)
+      - un UPDATE batch por chunk de REPAIR_CHUNK juegos
+    """
+    con = get_db()
+    orphans = queries.get_orphaned_games(con, limit)
+    if not orphans:
         return {"status": "ok", "repaired": 0, "failed": 0, "message": "No orphaned games found"}
 
-    orphans = rows.to_dict(orient="records")
     logger.info(f"Found {len(orphans)} orphaned games to repair")
     repaired = 0
     failed   = 0
-
+    start    = 0
+    # Retomar: los ya reparados salen solos de la query; los fallidos se saltean por id
+    if job and job.resumed:
+        repaired, failed = job.checkpoint["repaired"], job.checkpoint["failed"]
+        orphans = [g for g in orphans if g["id"] > job.checkpoint["after"]]
+        start = job.done
+
+    sem = asyncio.Semaphore(settings.repair_concurrency)
     async with ITADClient(settings.itad_api_key) as client:
-        for i in range(0, len(orphans), batch_size):
-            batch = orphans[i:i + batch_size]
-            for game in batch:
-                game_id = game["id"]
-                try:
-                    resolved_title = None
-                    resolved_slug  = None
-                    resolved_appid = game.get("appid")
-
-                    if not resolved_appid:
-                        ph_row = con.execute("""
-                            SELECT appid FROM price_history
-                            WHERE game_id = ? AND appid IS NOT NULL LIMIT 1
-                        """, [game_id]).fetchone()
-                        if ph_row:
-                            resolved_appid = int(ph_row[0])
-
-                    if resolved_appid:
-                        lookup = await client.lookup_game(resolved_appid)
-                        if lookup:
-                            _, resolved_slug, resolved_title = lookup
-
-                    if not resolved_title:
-                        info = await client.get_game_info(game_id)
-                        if info:
-                            _, resolved_slug, resolved_title = info
-
-                    if not resolved_title or resolved_title == game_id:
-                        failed += 1
-                        continue
-
-                    con.execute("UPDATE games SET title=?, slug=? WHERE id=?",
-                                [resolved_title, resolved_slug or game_id, game_id])
-                    if resolved_appid:
-                        con.execute("UPDATE games SET appid=? WHERE id=? AND appid IS NULL",
-                                    [resolved_appid, game_id])
-
-                    repaired += 1
-                    logger.info(f"Repaired: {game_id} -> '{resolved_title}' appid={resolved_appid}")
+        for i in range(0, len(orphans), REPAIR_CHUNK):
+            chunk = orphans[i:i + REPAIR_CHUNK]
 
+            missing = [g["id"] for g in chunk if not g["appid"]]
+            if missing:
+                try:
+                    found = await client.lookup_steam_appids(missing)
                 except Exception as e:
-                    logger.warning(f"Failed to repair {game_id}: {e}")
+                    logger.warning(f"Bulk lookup de appids falló: {e}")
+                    found = {}
+                for g in chunk:
+                    g["appid"] = g["appid"] or found.get(g["id"])
+
+            results = await asyncio.gather(*(_resolve_orphan(client, g, sem) for g in chunk),
+                                           return_exceptions=True)
+            fixes = []
+            for game, fix in zip(chunk, results):
+                if isinstance(fix, Exception):
+                    logger.warning(f"Failed to repair {game['id']}: {fix}")
+                if isinstance(fix, dict):
+                    fixes.append(fix)
+                else:
                     failed += 1
-
-            await asyncio.sleep(settings.request_delay)
+            queries.apply_game_repairs(con, fixes)
+            repaired += len(fixes)
+            logger.info(f"Repair: {start + i + len(chunk)}/{start + len(orphans)} | "
+                        f"reparados {repaired} | fallidos {failed}")
+            if job:
+                await job.progress(start + i + len(chunk), total=start + len(orphans), errors=failed,
+                                   checkpoint={"after": chunk[-1]["id"],
+                                               "repaired": repaired, "failed": failed})
 
     return {
         "status": "ok",
@@ -239,50 +403,275 @@ async def repair_orphaned_games(batch_size: int = 10) -> dict:
     }
 
 
-async def sync_top_games(top_n: int = 100) -> dict:
+async def sync_top_games(top_n: int = 100, full_refresh: bool = False,
+                         job: Optional[JobContext] = None) -> dict:
+    """
+    Sincroniza los top N appids del catálogo con el pipeline por etapas
+    (lookup → history → parse → write). Corriendo como job guarda un
+    checkpoint periódico (lista de appids + prefijo completo + resumen) y al
+    retomar sigue desde ahí.
+    """
     if not settings.itad_api_key:
         raise ValueError("ITAD_API_KEY no configurada")
-    summary = {"total_games": 0, "total_inserted": 0, "errors": 0, "synced": []}
-    async with httpx.AsyncClient(timeout=30) as http_client:
-        appids = await get_top_appids(http_client, top_n)
+    if job and job.resumed:
+        appids  = job.checkpoint["appids"]
+        summary = job.checkpoint["summary"]
+        start   = job.checkpoint["cursor"]
+    else:
+        summary = {"total_games": 0, "total_inserted": 0, "errors": 0, "synced": []}
+        appids = await get_top_appids(top_n)
+        start = 0
     if not appids:
         return summary
-    logger.info(f"Iniciando sync de {len(appids)} juegos...")
-    con = get_db()
+    logger.info(f"Iniciando sync de {len(appids) - start} juegos...")
+
+    async def checkpoint(cursor: int, summary: dict):
+        logger.info(f"Progreso: {cursor}/{len(appids)} | Insertados: {summary['total_inserted']}")
+        if job:
+            await job.progress(cursor, total=len(appids), errors=summary["errors"],
+                               checkpoint={"appids": appids, "cursor": cursor, "summary": summary})
+
     async with ITADClient(settings.itad_api_key) as itad:
-        batch_size = settings.request_batch_size
-        for i in range(0, len(appids), batch_size):
-            batch = appids[i:i + batch_size]
-            lookup_results = await asyncio.gather(
-                *[itad.lookup_game(appid) for appid in batch],
-                return_exceptions=True
-            )
-            for appid, lookup in zip(batch, lookup_results):
-                if isinstance(lookup, Exception) or not lookup:
-                    summary["errors"] += 1
-                    continue
-                game_id, slug, title = lookup
-                try:
+        pipeline = SyncPipeline(itad, appids, full_refresh, start=start,
+                                summary=summary, checkpoint=checkpoint)
+        summary = await pipeline.run()
+    logger.info(f"Sync completado: { {k: v for k, v in summary.items() if k != 'stages'} }")
+    return summary
+
+
+# ── Wishlist de un usuario ────────────────────────────────────────────────────
+
+# El checkpoint (appids ya procesados) se persiste cada N juegos; el progreso, en cada uno
+WISHLIST_CHECKPOINT_EVERY = 10
+
+async def sync_wishlist_prices(steam_id: str, job: Optional[JobContext] = None) -> dict:
+    """
+    Sincroniza precio (y predicción si hubo datos nuevos) de toda la wishlist
+    de un usuario, con un ITADClient compartido y WISHLIST_SYNC_CONCURRENCY
+    juegos en paralelo. El checkpoint guarda los appids ya procesados (cada
+    WISHLIST_CHECKPOINT_EVERY juegos: al retomar se repiten a lo sumo esos).
+    """
+    from src.db import user_queries
+    from src.services import predict_service
+
+    appids = user_queries.get_user_wishlist_appids(get_db(), steam_id)
+    cp = job.checkpoint if job and job.resumed else {}
+    done_appids: list[int] = cp.get("done_appids", [])
+    summary = {"total": len(appids), "synced": cp.get("synced", 0),
+               "predicted": cp.get("predicted", 0), "errors": cp.get("errors", 0)}
+    skip = set(done_appids)
+    pending = [a for a in appids if a not in skip]
+
+    async def one(appid: int):
+        async with sem:
+            try:
+                result = await sync_by_appid(appid, client=client)
+                if result.get("inserted", 0) > 0 and result.get("game_id"):
+                    summary["synced"] += 1
                     try:
-                        queries.upsert_game(con, game_id=game_id, slug=slug,
-                                            title=title, appid=appid)
+                        await asyncio.to_thread(predict_service.get_prediction,
+                                                result["game_id"], True)
+                        summary["predicted"] += 1
                     except Exception as e:
-                        logger.debug(f"upsert_game skip {appid}: {e}")
-                    records = await itad.get_price_history(game_id, appid=appid)
-                    if records:
-                        inserted = queries.upsert_price_records(
-                            con, [r.model_dump() for r in records])
-                        summary["total_inserted"] += inserted
-                        summary["total_games"] += 1
-                        summary["synced"].append(appid)
-                        logger.info(f"  ✓ {title} ({appid}): {inserted} registros")
-                    else:
-                        summary["errors"] += 1
-                except Exception as e:
-                    logger.warning(f"Error appid={appid}: {e}")
-                    summary["errors"] += 1
+                        logger.debug(f"Predicción wishlist {result['game_id']}: {e}")
+            except Exception as e:
+                summary["errors"] += 1
+                logger.debug(f"Wishlist item sync error appid={appid}: {e}")
+            done_appids.append(appid)
+            if job:
+                checkpoint = None
+                if len(done_appids) % WISHLIST_CHECKPOINT_EVERY == 0:
+                    checkpoint = {"done_appids": done_appids, **summary}
+                await job.progress(len(done_appids), total=len(appids), errors=summary["errors"],
+                                   checkpoint=checkpoint)
+
+    sem = asyncio.Semaphore(settings.wishlist_sync_concurrency)
+    async with ITADClient(settings.itad_api_key) as client:
+        try:
+            async with asyncio.TaskGroup() as tg:
+                for appid in pending:
+                    tg.create_task(one(appid))
+        except* Exception as eg:
+            raise eg.exceptions[0]
+
+    logger.info(f"Wishlist ITAD sync {steam_id}: {summary['synced']}/{len(appids)} "
+                f"juegos con datos nuevos")
+    return {"status": "ok", **summary}
+
+
+# ── Sweep de precios actuales ─────────────────────────────────────────────────
+
+def _steam_deal(deals: list[dict]) -> Optional[dict]:
+    for d in deals:
+        if d.get("shop_id") == STEAM_SHOP_ID or STEAM_SHOP_NAME in str(d.get("shop_name", "")).lower():
+            return d
+    return None
+
+
+def _price_changed(deal: dict, last: Optional[dict]) -> bool:
+    if last is None:
+        return True
+    return (round(float(deal["price_usd"] or 0), 2) != round(last["price_usd"] or 0, 2)
+            or int(deal["cut_pct"] or 0) != int(last["cut_pct"] or 0))
+
+
+def _deal_timestamp(raw) -> Optional[datetime]:
+    """Timestamp ISO del deal → datetime naive UTC (como se guarda en price_history)."""
+    if not raw:
+        return None
+    try:
+        ts = datetime.fromisoformat(str(raw).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+async def sweep_current_prices(batch_size: Optional[int] = None,
+                               job: Optional[JobContext] = None) -> dict:
+    """
+    Refresca el precio actual de Steam de todos los juegos trackeados con
+    llamadas batch a prices/v3 (cientos de ids por request), en vez de
+    re-bajar el historial de cada juego.
+    Solo agrega a price_history los precios que cambiaron respecto al último
+    registro; los juegos afectados quedan marcados para recalcular predicción.
+    Sweeps concurrentes se coalescen en uno.
+    """
+    return await _sync_flights.do("price_sweep", lambda: _sweep_current_prices(batch_size, job))
+
+
+async def _sweep_batch(itad: ITADClient, con, batch: dict[str, Optional[int]], summary: dict):
+    from src.services.current_price_service import get_current_price_service
+
+    try:
+        prices = await itad.get_current_prices(list(batch))
+    except Exception as e:
+        logger.warning(f"Sweep batch falló: {e}")
+        summary["errors"] += 1
+        return
+    summary["requests"] += 1
+    if not prices:
+        summary["errors"] += 1
+        return
+    get_current_price_service().prime(prices)
+
+    latest = queries.get_latest_steam_prices(con, list(batch))
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    rows = []
+    for game_id, deals in prices.items():
+        deal = _steam_deal(deals)
+        if deal is None:
+            continue
+        summary["priced"] += 1
+        last = latest.get(game_id)
+        if not _price_changed(deal, last):
+            continue
+        ts = _deal_timestamp(deal.get("timestamp")) or now
+        if last and last["timestamp"] and ts <= last["timestamp"]:
+            ts = now
+        rows.append({
+            "game_id":     game_id,
+            "appid":       batch.get(game_id),
+            "timestamp":   ts,
+            "price_usd":   float(deal["price_usd"] or 0),
+            "regular_usd": float(deal["regular_usd"] or 0),
+            "cut_pct":     int(deal["cut_pct"] or 0),
+            "shop_id":     STEAM_SHOP_ID,
+            "shop_name":   "Steam",
+        })
+    if rows:
+        summary["changed"]  += len(rows)
+        summary["inserted"] += queries.upsert_price_records(con, rows)
+
+
+async def _sweep_current_prices(batch_size: Optional[int], job: Optional[JobContext]) -> dict:
+    if not settings.itad_api_key:
+        raise ValueError("ITAD_API_KEY no configurada")
+
+    batch_size = batch_size or settings.price_sweep_batch_size
+    con = get_db()
+    games = queries.list_tracked_games(con)
+    summary = {"games": len(games), "requests": 0, "priced": 0,
+               "changed": 0, "inserted": 0, "errors": 0}
+    done = 0
+    # Retomar: los juegos vienen ordenados por id, el checkpoint guarda el último procesado
+    if job and job.resumed:
+        summary, after = job.checkpoint["summary"], job.checkpoint["after"]
+        done = sum(1 for gid, _ in games if gid <= after)
+        games = [g for g in games if g[0] > after]
+    logger.info(f"Sweep de precios actuales: {len(games)} juegos, batches de {batch_size}")
+
+    async with ITADClient(settings.itad_api_key) as itad:
+        for i in range(0, len(games), batch_size):
+            batch = dict(games[i:i + batch_size])
+            await _sweep_batch(itad, con, batch, summary)
+            done += len(batch)
+            if job:
+                await job.progress(done, total=summary["games"], errors=summary["errors"],
+                                   checkpoint={"after": games[i + len(batch) - 1][0],
+                                               "summary": summary})
             await asyncio.sleep(settings.request_delay)
-            logger.info(f"Progreso: {min(i+batch_size,len(appids))}/{len(appids)} | "
-                        f"Insertados: {summary['total_inserted']}")
-    logger.info(f"Sync completado: {summary}")
-    return summary
\ No newline at end of file
+
+    logger.info(f"Sweep completado: {summary}")
+    return summary
+
+
+async def run_price_sweep_loop():
+    """Repite el sweep cada PRICE_SWEEP_INTERVAL_MINUTES (lanzado desde el lifespan)."""
+    interval = settings.price_sweep_interval_minutes * 60
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await sweep_current_prices()
+        except Exception as e:
+            logger.error(f"Sweep periódico falló: {e}")
+
+
+# ── Handlers de la cola de jobs ───────────────────────────────────────────────
+
+def _refresh_predictions_after(summary: dict) -> dict:
+    """Encola el recálculo del dirty set si el sync trajo precios nuevos."""
+    if summary.get("total_inserted"):
+        enqueue("predictions")
+    return summary
+
+
+@register("top")
+async def _job_top(job: JobContext) -> dict:
+    return _refresh_predictions_after(await sync_top_games(
+        job.params["top_n"], job.params.get("full_refresh", False), job=job))
+
+
+@register("bulk")
+async def _job_bulk(job: JobContext) -> dict:
+    return _refresh_predictions_after(await sync_top_games(
+        job.params["target"], job.params.get("full_refresh", False), job=job))
+
+
+@register("repair")
+async def _job_repair(job: JobContext) -> dict:
+    return await repair_orphaned_games(job=job)
+
+
+@register("prices")
+async def _job_prices(job: JobContext) -> dict:
+    return await sweep_current_prices(job.params.get("batch_size"), job=job)
+
+
+@register("catalog")
+async def _job_catalog(job: JobContext) -> dict:
+    return await refresh_catalog(job.params.get("max_pages"))
+
+
+# Lo espera un usuario en /me/wishlist/sync-status: no va detrás de top/bulk
+@register("wishlist", lane="interactive")
+async def _job_wishlist(job: JobContext) -> dict:
+    return await sync_wishlist_prices(job.params["steam_id"], job=job)
+
+
+@register("snapshot")
+async def _job_snapshot(job: JobContext) -> dict:
+    from src.tools.snapshot import export_snapshot
+    # En un thread (con su conexión DuckDB): el COPY no bloquea el event loop
+    return await asyncio.to_thread(lambda: export_snapshot(get_db(), settings.snapshot_dir))
@@ -0,0 +1,170 @@
+"""
+src/tools/import.py
+===================
+Importa dumps de historial de precios directo a DuckDB, sin red.
+
+Uso:
+  python -m src.tools.import dumps/prices.parquet
+  python -m src.tools.import "dumps/*.ndjson" --db ./data/steamsense.duckdb
+
+Formatos (por extensión, admite globs): .ndjson/.jsonl, .json, .csv, .parquet.
+Cada fila es un registro de precio con las columnas de price_history:
+  game_id, timestamp, price_usd, regular_usd  (obligatorias)
+  appid, cut_pct, shop_id, shop_name, title, slug  (opcionales)
+Se aceptan también los nombres de ITAD: price, regular, cut.
+
+Se aplica el mismo filtro y normalización que ITADClient.get_price_history
+(history_parser): solo Steam (shop_id=61, nombre con "steam" o sin tienda),
+timestamps a UTC naive, filas sin timestamp o montos inválidos descartadas.
+Todo corre dentro de DuckDB (read_json/read_csv/read_parquet + INSERT set-based).
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger("import")
+
+STAGING = "_price_import"
+
+_READERS = {
+    ".ndjson":  "read_json('{path}', format = 'newline_delimited', union_by_name = true)",
+    ".jsonl":   "read_json('{path}', format = 'newline_delimited', union_by_name = true)",
+    ".json":    "read_json('{path}', format = 'auto', union_by_name = true)",
+    ".csv":     "read_csv('{path}', header = true, union_by_name = true)",
+    ".parquet": "read_parquet('{path}', union_by_name = true)",
+}
+
+# Columna destino → nombres aceptados en el dump (el primero que exista)
+_ALIASES = {
+    "game_id":     ["game_id", "id"],
+    "appid":       ["appid"],
+    "timestamp":   ["timestamp"],
+    "price_usd":   ["price_usd", "price"],
+    "regular_usd": ["regular_usd", "regular"],
+    "cut_pct":     ["cut_pct", "cut"],
+    "shop_id":     ["shop_id"],
+    "shop_name":   ["shop_name"],
+    "title":       ["title"],
+    "slug":        ["slug"],
+}
+_REQUIRED = ("game_id", "timestamp", "price_usd", "regular_usd")
+
+
+def _reader(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in _READERS:
+        raise ValueError(f"Formato no soportado: {path} (usa {', '.join(_READERS)})")
+    return _READERS[ext].format(path=path.replace("'", "''"))
+
+
+def _normalized_select(con, source: str) -> str:
+    """SELECT que lleva el dump al esquema de price_history con el filtro Steam."""
+    present = {r[0].lower(): r[0] for r in con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()}
+    cols = {}
+    for target, names in _ALIASES.items():
+        found = next((present[n] for n in names if n in present), None)
+        cols[target] = f'"{found}"' if found else "NULL"
+    missing = [c for c in _REQUIRED if cols[c] == "NULL"]
+    if missing:
+        raise ValueError(f"Faltan columnas obligatorias en el dump: {', '.join(missing)}")
+
+    shop_id, shop_name = cols["shop_id"], cols["shop_name"]
+    # Sin info de tienda se asume Steam (igual que history_parser)
+    no_shop = f"({shop_id} IS NULL AND {shop_name} IS NULL)"
+    return f"""
+        SELECT
+            CAST({cols['game_id']} AS VARCHAR)                        AS game_id,
+            TRY_CAST({cols['appid']} AS INTEGER)                      AS appid,
+            TRY_CAST({cols['timestamp']} AS TIMESTAMPTZ)::TIMESTAMP   AS timestamp,
+            TRY_CAST({cols['price_usd']} AS DOUBLE)                   AS price_usd,
+            TRY_CAST({cols['regular_usd']} AS DOUBLE)                 AS regular_usd,
+            COALESCE(TRY_CAST({cols['cut_pct']} AS INTEGER), 0)       AS cut_pct,
+            CASE WHEN {no_shop} THEN 61
+                 ELSE COALESCE(TRY_CAST({shop_id} AS INTEGER), -1) END AS shop_id,
+            COALESCE(CAST({shop_name} AS VARCHAR), 'Steam')           AS shop_name,
+            NULLIF(CAST({cols['title']} AS VARCHAR), '')              AS title,
+            NULLIF(CAST({cols['slug']} AS VARCHAR), '')               AS slug
+        FROM {source}
+        WHERE {no_shop}
+           OR TRY_CAST({shop_id} AS INTEGER) = 61
+           OR LOWER(CAST({shop_name} AS VARCHAR)) LIKE '%steam%'
+    """
+
+
+def import_dump(con, path: str) -> dict:
+    """Importa un dump (o glob) con una conexión ya abierta. Retorna conteos y tiempos."""
+    from src.db import queries
+
+    t0 = time.perf_counter()
+    con.execute("SET TimeZone = 'UTC'")
+    source = _reader(path)
+    read = con.execute(f"SELECT COUNT(*) FROM {source}").fetchone()[0]
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE {STAGING} AS
+        SELECT * FROM ({_normalized_select(con, source)})
+        WHERE game_id IS NOT NULL AND timestamp IS NOT NULL
+          AND price_usd IS NOT NULL AND regular_usd IS NOT NULL
+    """)
+    staged = con.execute(f"SELECT COUNT(*) FROM {STAGING}").fetchone()[0]
+    t_stage = time.perf_counter() - t0
+
+    try:
+        con.execute("BEGIN TRANSACTION")
+        result = queries.import_staged_prices(con, STAGING)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    finally:
+        con.execute(f"DROP TABLE IF EXISTS {STAGING}")
+
+    elapsed = time.perf_counter() - t0
+    return {
+        "read":      read,
+        "steam":     staged,
+        "discarded": read - staged,
+        "games":     result["games"],
+        "inserted":  result["inserted"],
+        "stage_s":   round(t_stage, 2),
+        "elapsed_s": round(elapsed, 2),
+        "rows_per_s": round(read / elapsed) if elapsed else None,
+    }
+
+
+def main(paths: list[str], db_path: str):
+    import duckdb
+    from src.db.models import create_all_tables, create_user_tables
+
+    logger.info(f"Conectando a DuckDB: {db_path}")
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    con = duckdb.connect(db_path)
+    try:
+        create_all_tables(con)
+        create_user_tables(con)
+        for path in paths:
+            try:
+                r = import_dump(con, path)
+            except Exception as e:
+                logger.error(f"{path}: {e}")
+                sys.exit(1)
+            logger.info(
+                f"{path}: {r['read']:,} filas leídas, {r['steam']:,} Steam "
+                f"({r['discarded']:,} descartadas), {r['inserted']:,} nuevas en "
+                f"{r['games']:,} juegos — {r['elapsed_s']}s ({r['rows_per_s']:,} filas/s)"
+            )
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    from config import get_settings
+
+    parser = argparse.ArgumentParser(description="Importa dumps de historial de precios")
+    parser.add_argument("paths", nargs="+", help="Archivos o globs (.ndjson/.jsonl/.json/.csv/.parquet)")
+    parser.add_argument("--db", default=get_settings().duckdb_path)
+    args = parser.parse_args()
+    main(args.paths, args.db)
@@ -0,0 +1,211 @@
+"""
+src/tools/snapshot.py
+=====================
+Snapshots Parquet de la DB: backup consistente sin copiar el archivo DuckDB
+(que la API tiene lockeado) y restore rápido en volúmenes nuevos.
+
+Uso:
+  python -m src.tools.snapshot export [--db PATH] [--dir SNAPSHOT_DIR]
+  python -m src.tools.snapshot restore [--db PATH] [--dir SNAPSHOT_DIR] [--from NOMBRE]
+
+Con la API corriendo, exportar con POST /sync/snapshot (usa la conexión del
+proceso dueño del lock). Con SNAPSHOT_RESTORE_ON_START=1 la API reconstruye
+una DB vacía desde el último snapshot al arrancar.
+
+open_snapshot() abre un snapshot como DB de solo lectura (vistas sobre los
+Parquet) para procesos que no pueden abrir el archivo lockeado, como el
+entrenamiento fuera de proceso (src/ml/train.py --snapshot).
+
+Cada snapshot es un directorio <SNAPSHOT_DIR>/<UTC timestamp>/ con un
+<tabla>.parquet por tabla y un manifest.json con los conteos; se escribe en
+un directorio temporal y se renombra al final, así un snapshot a medias
+nunca es "el último".
+"""
+
+import argparse
+import datetime as dt
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from typing import Optional
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger("snapshot")
+
+# Orden de restore; price_history se restaura sin `id` (lo genera su secuencia)
+TABLES = ["games", "price_history", "game_data_versions", "game_features", "predictions_cache",
+          "users", "user_games", "user_wishlist"]
+MANIFEST = "manifest.json"
+
+
+def _quote(path: str) -> str:
+    return path.replace("'", "''")
+
+
+def export_snapshot(con, root: str, tables: Optional[list[str]] = None) -> dict:
+    """
+    Exporta TABLES (o el subconjunto `tables`) a Parquet dentro de una sola
+    transacción (vista consistente aunque la API siga escribiendo).
+    Retorna el manifest.
+    """
+    now = dt.datetime.now(dt.timezone.utc)
+    name = now.strftime("%Y%m%dT%H%M%SZ")
+    os.makedirs(root, exist_ok=True)
+    # Dos exports en el mismo segundo: el segundo toma <nombre>_ (mkdir es atómico)
+    while True:
+        final = os.path.join(root, name)
+        tmp = final + ".tmp"
+        try:
+            if not os.path.exists(final):
+                os.mkdir(tmp)
+                break
+        except FileExistsError:
+            pass
+        name += "_"
+
+    t0 = time.perf_counter()
+    exported = {}
+    try:
+        con.execute("BEGIN TRANSACTION")
+        try:
+            for table in tables or TABLES:
+                t = time.perf_counter()
+                path = os.path.join(tmp, f"{table}.parquet")
+                con.execute(f"COPY {table} TO '{_quote(path)}' (FORMAT parquet, COMPRESSION zstd)")
+                rows = con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                exported[table] = {"rows": rows, "seconds": round(time.perf_counter() - t, 2)}
+                logger.info(f"  {table}: {rows:,} filas en {exported[table]['seconds']}s")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+        manifest = {"name": name, "created_at": now.isoformat(), "tables": exported,
+                    "seconds": round(time.perf_counter() - t0, 2)}
+        with open(os.path.join(tmp, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, final)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    logger.info(f"Snapshot {name} exportado en {manifest['seconds']}s → {final}")
+    return {**manifest, "path": final}
+
+
+def latest_snapshot(root: str) -> Optional[str]:
+    """Directorio del snapshot completo más reciente (con manifest), o None."""
+    if not os.path.isdir(root):
+        return None
+    names = sorted(n for n in os.listdir(root)
+                   if os.path.isfile(os.path.join(root, n, MANIFEST)))
+    return os.path.join(root, names[-1]) if names else None
+
+
+def open_snapshot(snap_dir: str):
+    """Conexión DuckDB en memoria con una vista por tabla del snapshot (solo lectura)."""
+    import duckdb
+
+    with open(os.path.join(snap_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+    con = duckdb.connect()
+    for table in manifest["tables"]:
+        path = os.path.join(snap_dir, f"{table}.parquet")
+        con.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{_quote(path)}')")
+    return con
+
+
+def restore_snapshot(con, snap_dir: str) -> dict:
+    """
+    Carga un snapshot en una DB con las tablas ya creadas y vacías, con un
+    INSERT en bloque por tabla. Las columnas se emparejan por nombre: un
+    snapshot anterior a un ADD COLUMN deja esa columna en su default.
+    Todo en una transacción: o queda completo o no queda nada.
+    """
+    with open(os.path.join(snap_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+
+    t0 = time.perf_counter()
+    tables = {}
+    con.execute("BEGIN TRANSACTION")
+    try:
+        for table in TABLES:
+            path = os.path.join(snap_dir, f"{table}.parquet")
+            if table not in manifest["tables"] or not os.path.exists(path):
+                continue
+            t = time.perf_counter()
+            if table == "price_history":
+                con.execute(f"""
+                    INSERT INTO price_history BY NAME
+                    SELECT * EXCLUDE (id) FROM read_parquet('{_quote(path)}') ORDER BY id
+                """)
+            else:
+                con.execute(f"""
+                    INSERT INTO {table} BY NAME SELECT * FROM read_parquet('{_quote(path)}')
+                """)
+            rows = con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            tables[table] = {"rows": rows, "seconds": round(time.perf_counter() - t, 2)}
+            logger.info(f"  {table}: {rows:,} filas en {tables[table]['seconds']}s")
+        if "game_features" not in manifest["tables"]:
+            # Snapshot previo al feature store: se recalcula desde price_history
+            from src.db.queries import refresh_game_features
+            refresh_game_features(con)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    elapsed = round(time.perf_counter() - t0, 2)
+    logger.info(f"Snapshot {manifest['name']} restaurado en {elapsed}s")
+    return {"name": manifest["name"], "tables": tables, "seconds": elapsed}
+
+
+def restore_if_empty(con, root: str) -> Optional[dict]:
+    """Restore al arrancar: solo si la DB no tiene juegos y hay un snapshot."""
+    if con.execute("SELECT COUNT(*) FROM games").fetchone()[0]:
+        return None
+    snap = latest_snapshot(root)
+    if not snap:
+        logger.info(f"DB vacía y sin snapshots en {root}")
+        return None
+    logger.info(f"DB vacía — restaurando snapshot {os.path.basename(snap)}")
+    return restore_snapshot(con, snap)
+
+
+def main(command: str, db_path: str, root: str, name: Optional[str] = None):
+    import duckdb
+    from src.db.models import create_all_tables, create_user_tables
+
+    logger.info(f"Conectando a DuckDB: {db_path}")
+    if command == "restore":
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    con = duckdb.connect(db_path)
+    try:
+        if command == "export":
+            export_snapshot(con, root)
+            return
+        create_all_tables(con)
+        create_user_tables(con)
+        if con.execute("SELECT COUNT(*) FROM games").fetchone()[0]:
+            logger.error("La DB destino no está vacía — restore solo sobre una DB nueva")
+            sys.exit(1)
+        snap = os.path.join(root, name) if name else latest_snapshot(root)
+        if not snap or not os.path.isfile(os.path.join(snap, MANIFEST)):
+            logger.error(f"No hay snapshot para restaurar en {root}")
+            sys.exit(1)
+        restore_snapshot(con, snap)
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    from config import get_settings
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Snapshots Parquet de la DB")
+    parser.add_argument("command", choices=["export", "restore"])
+    parser.add_argument("--db", default=settings.duckdb_path)
+    parser.add_argument("--dir", default=settings.snapshot_dir)
+    parser.add_argument("--from", dest="name", help="Nombre del snapshot (default: el último)")
+    args = parser.parse_args()
+    main(args.command, args.db, args.dir, args.name)